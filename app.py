@@ -1,728 +1,1627 @@
+import hashlib
+import html
+import importlib.util
+import io
+import itertools
+import os
+import sys
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
 import streamlit as st
 import pandas as pd
-import geopandas as gpd
-import matplotlib.pyplot as plt
-from shapely.geometry import Point
-import streamlit.components.v1 as components
-
-try:
-    import folium
-    from streamlit_folium import st_folium
-    FOLIUM_AVAILABLE = True
-except ImportError:
-    FOLIUM_AVAILABLE = False
+
+from conversion import (
+    COLUMN_TYPES,
+    CRS_SAMPLE_ROWS,
+    PARALLEL_MIN_POINTS,
+    epsgs,
+    check_coordinate_system,
+    coerce_columns,
+    convert_coordinates_from_data,
+    convert_datasets_from_data,
+    iter_text_chunks,
+    load_triangle_model,
+    parse_data_with_headers,
+    parse_number_array,
+    sample_rows,
+    sniff_delimiter,
+    split_header_line,
+    transform_coordinates,
+)
+from attribute_index import RANGE_OPERATORS, TEXT_OPERATORS, build_column_index, intersect_positions
+from diagnostics import Diagnostics
+from export import EXPORT_FORMATS, export_bytes
+from comparison import (
+    COMPARISON_EPSG,
+    DEFAULT_PAIR_DISTANCE,
+    compare_points,
+    displacement_statistics,
+    mean_bearing,
+)
+from point_store import PointStore, is_typed_column
+from workspace import Workspace, save_workspace
+from spatial_index import STACK_TOLERANCE, GridIndex
+
+# Folium in streamlit-folium se uvozita šele ob prvem prikazu zemljevida (glej prikaz na zemljevidu)
+FOLIUM_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ("folium", "streamlit_folium"))
+if not FOLIUM_AVAILABLE:
     st.warning("Folium ni na voljo. Namestite ga z: pip install folium streamlit-folium")
 
-epsgs = {
-    "WGS 84 (EPSG:4326)": {
-        "code": 4326, 
-        "x_label": "Lon", 
-        "y_label": "Lat",
-        "x_name": "Longitude",
-        "y_name": "Latitude"
-    },
-    "Gauss (EPSG:3912)": {
-        "code": 3912, 
-        "x_label": "GKX", 
-        "y_label": "GKY",
-        "x_name": "GKX (sever)",
-        "y_name": "GKY (vzhod)"
-    },
-    "D96 (EPSG:3794)": {
-        "code": 3794, 
-        "x_label": "E", 
-        "y_label": "N",
-        "x_name": "E (east)",
-        "y_name": "N (north)"
-    },
-}
-
-def parse_data_with_headers(text):
-    """Parse podatkov z glavami stolpcev - prva vrstica so imena stolpcev"""
-    lines = text.strip().split('\n')
-    if not lines:
-        return None, []
-    
-    # Prva vrstica so imena stolpcev
-    header_line = lines[0].strip()
-    if '\t' in header_line:
-        headers = header_line.split('\t')
-    elif ';' in header_line:
-        headers = header_line.split(';')
-    else:
-        headers = header_line.split()
+def show_coercion_failures(failures):
+    """Prikaži eno skupno opozorilo za vse vrednosti, ki jih ni bilo mogoče pretvoriti v tip stolpca"""
+    if not failures:
+        return
+    total = sum(count for columns in failures.values() for count, _ in columns.values())
+    st.warning(f"{total} vrednosti ni bilo mogoče pretvoriti v tip stolpca in so prazne")
+    with st.expander("Neuspele pretvorbe tipov"):
+        listed = [
+            f"{name}, stolpec '{col}': {count} vrednosti, npr. {', '.join(repr(value) for value in examples)}"
+            for name, columns in failures.items() for col, (count, examples) in columns.items()
+        ]
+        st.text("\n".join(listed))
+
+def show_bad_rows(bad_rows, max_listed=100):
+    """Prikaži eno skupno opozorilo za vse vrstice s premalo stolpci"""
+    if not bad_rows:
+        return
+    st.warning(f"{len(bad_rows)} vrstic ima premalo stolpcev in so bile izpuščene")
+    with st.expander("Izpuščene vrstice"):
+        listed = [f"Vrstica {line_no}: '{line}'" for line_no, line in bad_rows[:max_listed]]
+        if len(bad_rows) > max_listed:
+            listed.append(f"... in še {len(bad_rows) - max_listed} vrstic")
+        st.text("\n".join(listed))
+
+# Dnevnik diagnostike (ena vrstica JSON na zagon), pot lahko nastavite s spremenljivko okolja
+DIAGNOSTICS_LOG_PATH = os.environ.get("KOORDINATOR_DIAGNOSTICS_LOG", "koordinator_diagnostics.jsonl")
+# Privzeta pot delovnega prostora (datoteka Arrow IPC)
+WORKSPACE_PATH = os.environ.get("KOORDINATOR_WORKSPACE", "koordinator_workspace.arrow")
+
+# Predpomnilnik rezultatov med ponovnimi zagoni skripte (skupen vsem sejam v procesu)
+RESULT_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+def content_hash(content):
+    """Zgoščena vrednost vsebine vnosa (besedilo ali bajti), ki se uporablja kot ključ predpomnilnika"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    return hashlib.blake2b(content, digest_size=16).hexdigest()
+
+def estimate_size(value):
+    """Približna velikost vrednosti v bajtih za omejevanje porabe pomnilnika"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    return sys.getsizeof(value)
+
+class ResultCache:
+    """LRU predpomnilnik z omejitvijo skupne velikosti vnosov v bajtih"""
+    
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
     
-    data_rows = []
-    for i, line in enumerate(lines[1:], start=2):
-        line = line.strip()
-        if not line:
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+    
+    def put(self, key, value):
+        size = estimate_size(value)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            # Odstrani najdlje neuporabljene vnose, dokler ne pridemo pod omejitev
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+@st.cache_resource
+def get_result_cache():
+    """Vrne en predpomnilnik rezultatov na proces - deljen med vsemi sejami"""
+    return ResultCache(RESULT_CACHE_MAX_BYTES)
+
+def cached_parse_data_with_headers(text):
+    """parse_data_with_headers s predpomnjenjem po vsebini vnosa"""
+    cache = get_result_cache()
+    key = ('parse', content_hash(text))
+    result = cache.get(key)
+    if result is None:
+        with diagnostics.stage("parse") as record:
+            headers, data, bad_rows = parse_data_with_headers(text)
+            record['rows'] = 0 if data is None else len(data)
+        if data is not None:
+            data.attrs['content_hash'] = key[1]
+        result = (headers, data, bad_rows)
+        cache.put(key, result)
+    return result
+
+def data_content_key(data_rows):
+    """Ključ vsebine podatkov - zgoščena vrednost vnosa, če je znana, sicer zgoščena vrednost tabele"""
+    data_key = data_rows.attrs.get('content_hash')
+    if data_key is None:
+        data_key = int(pd.util.hash_pandas_object(data_rows).sum())
+    return data_key
+
+# Način pretvorbe med D48/GK in D96/TM
+TRANSFORMATION_MODES = ["Parametri EPSG (pyproj)", "Trikotniški model iz datoteke"]
+
+def get_transformation_model():
+    """Trikotniški model iz naprednih nastavitev ali None, če se uporablja pretvorba s parametri EPSG
+
+    Model se naloži in indeksira enkrat na datoteko (load_triangle_model); napake pri nalaganju
+    se prikažejo v naprednih nastavitvah, tukaj pa se uporabi pretvorba s parametri EPSG.
+    """
+    if st.session_state.get("transformation_mode") != TRANSFORMATION_MODES[1]:
+        return None
+    path = (st.session_state.get("triangle_model_path") or "").strip()
+    if not path:
+        return None
+    try:
+        return load_triangle_model(path)
+    except (OSError, ValueError):
+        return None
+
+def transformation_cache_key(model):
+    """Del ključa predpomnilnika, ki loči rezultate pretvorbe z modelom od pretvorbe s parametri EPSG"""
+    return None if model is None else ('triangle_model',) + model.source
+
+def cached_convert_datasets(datasets, from_epsg, to_epsg):
+    """convert_datasets_from_data s predpomnjenjem in inkrementalno pretvorbo
+
+    datasets je seznam (data_rows, x_col, y_col) z istim izvornim EPSG. Ključ vsakega
+    niza je zgoščena vrednost vnosa, izbrana stolpca in par EPSG; nizi, ki jih ni v
+    predpomnilniku, se pretvorijo skupaj z enim klicem. Ob spremembi vnosa se ponovno
+    pretvorijo samo točke, ki jih zadnja pretvorba za isti par EPSG še ni vsebovala.
+    Število procesov in velikost kosa za vzporedno pretvorbo se prebereta iz naprednih
+    nastavitev v session_state.
+    """
+    cache = get_result_cache()
+    model = get_transformation_model()
+    model_key = transformation_cache_key(model)
+    results = [pd.DataFrame() for _ in datasets]
+    pending = []
+    for i, (data_rows, x_col, y_col) in enumerate(datasets):
+        if data_rows is None or not len(data_rows):
             continue
-            
-        # Ločitev podatkov
-        if '\t' in line:
-            parts = line.split('\t')
-        elif ';' in line:
-            parts = line.split(';')
-        else:
-            parts = line.split()
-            
-        if len(parts) >= len(headers):
-            row_data = {'row_id': i-1}
-            for j, header in enumerate(headers):
-                if j < len(parts):
-                    row_data[header] = parts[j]
-            data_rows.append(row_data)
+        key = ('convert', data_content_key(data_rows), x_col, y_col, from_epsg, to_epsg, model_key)
+        converted = cache.get(key)
+        if converted is None:
+            pending.append((i, key))
         else:
-            st.warning(f"Vrstica {i}: '{line}' - premalo stolpcev")
+            results[i] = converted
+    if not pending:
+        return results
+    
+    known_key = ('known', from_epsg, to_epsg, model_key)
+    try:
+        with diagnostics.stage("convert", rows=sum(len(datasets[i][0]) for i, _ in pending),
+                               epsg=f"{from_epsg}->{to_epsg}"):
+            converted_batch = convert_datasets_from_data(
+                [datasets[i] for i, _ in pending], from_epsg, to_epsg, known=cache.get(known_key),
+                workers=st.session_state.get("conversion_workers", 1),
+                chunk_points=st.session_state.get("conversion_chunk_points") or None,
+                model=model
+            )
+    except Exception as e:
+        st.error(f"Napaka pri pretvorbi koordinat: {e}")
+        return results
+    
+    for (i, key), converted in zip(pending, converted_batch):
+        results[i] = converted
+        if len(converted):
+            cache.put(key, converted)
+    converted_all = [converted for converted in results if len(converted)]
+    if converted_all:
+        cache.put(known_key, tuple(
+            np.concatenate([converted[col].to_numpy() for converted in converted_all])
+            for col in ('source_x', 'source_y', 'converted_x', 'converted_y')
+        ))
+    return results
+
+# Nalaganje datotek (CSV, TXT, XLSX) po kosih
+INPUT_MODES = ["Prilepi besedilo", "Naloži datoteko"]
+# Način vnosa za nize iz odprtega delovnega prostora
+WORKSPACE_INPUT_MODE = "Iz delovnega prostora"
+UPLOAD_TYPES = ["csv", "txt", "xlsx"]
+UPLOAD_CHUNK_ROWS = 50_000
+
+def is_excel_upload(uploaded_file):
+    """Ali je naložena datoteka Excel (XLSX)"""
+    return uploaded_file.name.lower().endswith('.xlsx')
+
+def upload_hash(uploaded_file):
+    """Zgoščena vrednost vsebine naložene datoteke brez kopiranja bajtov"""
+    buffer = uploaded_file.getbuffer()
+    try:
+        return content_hash(buffer)
+    finally:
+        buffer.release()
+
+def _excel_cell_text(value):
+    """Vrednost celice Excel kot besedilo, kot bi jo prebrali iz CSV"""
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+def iter_upload_chunks(uploaded_file, chunk_rows=UPLOAD_CHUNK_ROWS):
+    """Bere naloženo datoteko po kosih največ chunk_rows vrstic
+
+    Vrača četvorke (headers, chunk, bad_rows, progress), kjer je chunk DataFrame v
+    enaki obliki kot ga vrne parse_data_with_headers, progress pa delež prebrane
+    datoteke med 0 in 1.
+    """
+    uploaded_file.seek(0)
+    
+    if is_excel_upload(uploaded_file):
+        import openpyxl
+        workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            sheet = workbook.active
+            total_rows = max((sheet.max_row or 1) - 1, 1)
+            rows = sheet.iter_rows(values_only=True)
+            headers = [_excel_cell_text(value) for value in next(rows, ())]
+            row_offset = 0
+            while True:
+                batch = list(itertools.islice(rows, chunk_rows))
+                if not batch:
+                    break
+                cells = [
+                    [_excel_cell_text(value) for value in row[:len(headers)]] + [''] * (len(headers) - len(row))
+                    for row in batch
+                ]
+                chunk = pd.DataFrame(cells, columns=headers)
+                chunk.insert(0, 'row_id', np.arange(row_offset + 1, row_offset + len(batch) + 1))
+                # Povsem prazne vrstice preskočimo, tako kot prazne vrstice v besedilu
+                chunk = chunk[(chunk[headers] != '').any(axis=1)].reset_index(drop=True)
+                row_offset += len(batch)
+                yield headers, chunk, [], min(row_offset / total_rows, 1.0)
+        finally:
+            workbook.close()
+        return
     
-    return headers, data_rows
+    stream = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        for headers, chunk, bad_rows in iter_text_chunks(stream, chunk_rows):
+            yield headers, chunk, bad_rows, min(uploaded_file.tell() / max(uploaded_file.size, 1), 1.0)
+    finally:
+        # Ovoj ne sme ob sprostitvi zapreti naložene datoteke
+        stream.detach()
 
-def convert_coordinates_from_data(data_rows, x_col, y_col, from_epsg, to_epsg):
-    """Pretvori koordinate iz podatkov z določenimi stolpci"""
-    if from_epsg == to_epsg:
-        return data_rows
+def read_upload_headers(uploaded_file):
+    """Prebere samo imena stolpcev iz prve vrstice naložene datoteke"""
+    uploaded_file.seek(0)
+    if is_excel_upload(uploaded_file):
+        import openpyxl
+        workbook = openpyxl.load_workbook(uploaded_file, read_only=True, data_only=True)
+        try:
+            first_row = next(workbook.active.iter_rows(max_row=1, values_only=True), ())
+            return [_excel_cell_text(value) for value in first_row]
+        finally:
+            workbook.close()
     
-    if not data_rows:
+    stream = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        header_line = stream.readline().strip()
+    finally:
+        stream.detach()
+    if not header_line:
         return []
+    return split_header_line(header_line, sniff_delimiter(header_line))
+
+def convert_upload(uploaded_file, x_col, y_col, from_epsg, to_epsg, on_progress=None):
+    """Pretvarja naloženo datoteko kos za kosom, vrne (converted, bad_rows)
+
+    V pomnilniku je hkrati le en neobdelan kos vhodne datoteke; on_progress(delež, vrstice)
+    se pokliče po vsakem kosu.
+    """
+    converted_chunks = []
+    bad_rows = []
+    rows_read = 0
+    for _, chunk, chunk_bad_rows, progress in iter_upload_chunks(uploaded_file):
+        bad_rows.extend(chunk_bad_rows)
+        rows_read += len(chunk)
+        converted_chunk = convert_coordinates_from_data(
+            chunk, x_col, y_col, from_epsg, to_epsg, model=get_transformation_model()
+        )
+        if len(converted_chunk):
+            converted_chunks.append(converted_chunk)
+        if on_progress:
+            on_progress(progress, rows_read)
+    
+    if not converted_chunks:
+        return pd.DataFrame(), bad_rows
+    return pd.concat(converted_chunks, ignore_index=True), bad_rows
+
+def load_uploaded_dataset(uploaded_file, x_col, y_col, from_epsg):
+    """Naloži in pretvori datoteko v WGS84 s prikazom napredka - rezultat se predpomni"""
+    cache = get_result_cache()
+    file_key = upload_hash(uploaded_file)
+    # Isti ključ kot v cached_convert_datasets, zato nadaljnja pretvorba v WGS84 zadane predpomnilnik
+    key = ('convert', file_key, x_col, y_col, from_epsg, 4326, transformation_cache_key(get_transformation_model()))
+    bad_rows_key = ('upload_bad_rows', file_key)
+    
+    converted = cache.get(key)
+    if converted is None:
+        progress_bar = st.progress(0.0, text=f"Branje datoteke {uploaded_file.name} ...")
+        try:
+            with diagnostics.stage("upload", epsg=f"{from_epsg}->4326") as record:
+                converted, bad_rows = convert_upload(
+                    uploaded_file, x_col, y_col, from_epsg, 4326,
+                    on_progress=lambda fraction, rows: progress_bar.progress(
+                        fraction, text=f"Prebranih in pretvorjenih {rows} vrstic ..."
+                    )
+                )
+                record['rows'] = len(converted)
+        except Exception as e:
+            st.error(f"Napaka pri pretvorbi koordinat: {e}")
+            converted, bad_rows = pd.DataFrame(), []
+        finally:
+            progress_bar.empty()
+        converted.attrs['content_hash'] = file_key
+        if len(converted):
+            cache.put(key, converted)
+        cache.put(bad_rows_key, bad_rows)
+    
+    show_bad_rows(cache.get(bad_rows_key))
+    return converted
+
+# Nizi podatkov: največje število, privzeta imena in barve na zemljevidu (po vrsti)
+MAX_DATASETS = 10
+DATASET_NAMES = ["Prvi niz", "Drugi niz", "Tretji niz", "Četrti niz", "Peti niz",
+                 "Šesti niz", "Sedmi niz", "Osmi niz", "Deveti niz", "Deseti niz"]
+DATASET_COLORS = ["#ff0000", "#0000ff", "#008000", "#ffa500", "#800080",
+                  "#00ced1", "#8b4513", "#ff1493", "#808000", "#696969"]
+
+# Največja razdalja (m) med klikom in točko, da velja za klik na točko
+CLICK_MAX_DISTANCE_M = 100
+
+def get_point_index(point_store):
+    """Prostorski indeks nad točkami zemljevida - zgradi se enkrat na nabor točk in se predpomni"""
+    cache = get_result_cache()
+    key = ('point_index', content_hash(point_store.lon.tobytes() + point_store.lat.tobytes()))
+    point_index = cache.get(key)
+    if point_index is None:
+        point_index = GridIndex.from_lonlat(point_store.lon, point_store.lat)
+        cache.put(key, point_index)
+    return point_index
+
+# Prikaz vidnega dela zemljevida: največ točk pri zoomu 10 in manj, z vsakim nadaljnjim zoomom dvakrat več
+VIEWPORT_BASE_POINTS = 2_000
+VIEWPORT_MAX_POINTS = 20_000
+# Pri redčenju ostane ena točka na kvadrat s to stranico (v pikslih zaslona)
+VIEWPORT_LOD_PIXELS = 4
+
+def viewport_point_cap(zoom):
+    """Največje število točk, poslanih v brskalnik pri danem zoomu"""
+    return int(min(VIEWPORT_BASE_POINTS * 2 ** max(zoom - 10, 0), VIEWPORT_MAX_POINTS))
+
+def viewport_bounds(bounds):
+    """(south, west, north, east) iz bounds, ki jih vrne st_folium, ali None, če meje še niso znane"""
+    if not bounds:
+        return None
+    south_west, north_east = bounds.get('_southWest') or {}, bounds.get('_northEast') or {}
+    values = (south_west.get('lat'), south_west.get('lng'), north_east.get('lat'), north_east.get('lng'))
+    if any(value is None for value in values):
+        return None
+    return values
+
+def snap_viewport(south, west, north, east):
+    """Razširi vidni del na mrežo velikosti pogleda, da manjši premiki vrnejo enak pravokotnik (in iste točke)"""
+    lat_step = 2.0 ** np.floor(np.log2(max(north - south, 1e-6)))
+    lon_step = 2.0 ** np.floor(np.log2(max(east - west, 1e-6)))
+    return (
+        (np.floor(south / lat_step) - 1) * lat_step,
+        (np.floor(west / lon_step) - 1) * lon_step,
+        (np.ceil(north / lat_step) + 1) * lat_step,
+        (np.ceil(east / lon_step) + 1) * lon_step,
+    )
+
+def visible_point_indices(point_index, bounds, zoom, default_lat, subset=None):
+    """Indeksi točk v vidnem delu zemljevida, redčeni glede na zoom (ena točka na nekaj pikslov)
+
+    Če je podan subset (naraščajoči položaji filtriranih točk), se prikažejo samo te točke.
+    """
+    view = viewport_bounds(bounds)
+    if view is None:
+        indices = np.arange(len(point_index)) if subset is None else subset
+        latitude = default_lat
+    else:
+        indices = point_index.query_bbox_lonlat(*snap_viewport(*view))
+        if subset is not None:
+            indices = np.intersect1d(indices, subset, assume_unique=True)
+        latitude = (view[0] + view[2]) / 2
+    # Metri na piksel v spletni Mercatorjevi projekciji pri dani širini
+    metres_per_pixel = 156543.03392 * np.cos(np.radians(latitude)) / 2 ** zoom
+    return point_index.thin(indices, metres_per_pixel * VIEWPORT_LOD_PIXELS, viewport_point_cap(zoom))
+
+# Največ pogojev atributov v filtru točk
+MAX_FILTER_CONDITIONS = 5
+FILTER_VALUE_EXAMPLES = {"besedilo": "npr. Ljubljana", "številka": "npr. 12,5", "datum": "npr. 31.12.2023"}
+
+def get_column_index(point_store, point_store_key, col):
+    """Indeks stolpca atributov za filtriranje - zgradi se enkrat na shrambo točk in stolpec"""
+    cache = get_result_cache()
+    key = ('attribute_index',) + point_store_key[1:] + (col,)
+    column_index = cache.get(key)
+    if column_index is None:
+        column_index = build_column_index(point_store.attributes[col])
+        cache.put(key, column_index)
+    return column_index
+
+def drawn_polygons(drawings):
+    """Oglišča (lon, lat) mnogokotnikov in pravokotnikov, narisanih na zemljevidu (GeoJSON iz st_folium)"""
+    polygons = []
+    for feature in drawings or []:
+        geometry = (feature or {}).get('geometry') or {}
+        if geometry.get('type') == 'Polygon' and geometry.get('coordinates'):
+            ring = np.asarray(geometry['coordinates'][0], dtype='float64')
+            polygons.append((ring[:, 0], ring[:, 1]))
+    return polygons
+
+# Število zadetkov iskanja, ki se ponudijo v izbiro naenkrat
+POINT_PAGE_SIZE = 200
+# Obseg izvoza točk
+EXPORT_SCOPES = ["Vsi nizi", "Izbrani nizi", "Izbrane točke"]
+
+def get_point_labels(point_store):
+    """Oznake točk za iskanje in izbiro (predpomnjeno na nabor točk)"""
+    cache = get_result_cache()
+    key = ('point_labels', content_hash(point_store.dataset.tobytes() + point_store.row_id.tobytes()),
+           tuple((dataset['name'], dataset['prefix']) for dataset in point_store.datasets))
+    labels = cache.get(key)
+    if labels is None:
+        labels = point_store.labels()
+        cache.put(key, labels)
+    return labels
+
+def search_point_labels(labels, query):
+    """Položaji oznak, ki vsebujejo iskalni niz (brez razlikovanja velikih in malih črk)"""
+    if not query:
+        return np.arange(len(labels))
+    return np.flatnonzero(labels.str.contains(query.strip(), case=False, regex=False).to_numpy())
+
+def popup_point_id(popup_text):
+    """ID točke iz besedila kliknjenega popup-a (kot ga vrne st_folium)"""
+    if not popup_text:
+        return None
+    first_line = popup_text.strip().split('\n')[0]
+    return first_line.removeprefix('ID:').strip()
+
+def build_popup_html(point_store, index, display_columns):
+    """HTML s podrobnostmi točke in izbranimi stolpci - sestavi se šele ob kliku na točko"""
+    attributes = point_store.attributes_of(index)
+    popup_parts = [f"<b>ID: {html.escape(point_store.point_ids([index]).iat[0])}</b>"]
+    popup_parts.append(f"<b>Dataset:</b> {html.escape(point_store.dataset_names([index]).iat[0])}")
+    popup_parts.append(f"<b>Lat:</b> {point_store.lat[index]:.6f}")
+    popup_parts.append(f"<b>Lon:</b> {point_store.lon[index]:.6f}")
+    
+    for col in display_columns:
+        value = attributes.get(col)
+        if value is not None:
+            popup_parts.append(f"<b>{html.escape(str(col))}:</b> {html.escape(str(value))}")
+    return "<br>".join(popup_parts)
+
+def get_point_layer_data(point_store, indices):
+    """Polje točk na danih položajih za PointLayer - predpomni se, zato ga sprememba sloga ali klik ne sestavi znova"""
+    cache = get_result_cache()
+    indices = np.asarray(indices, dtype=np.int64)
+    key = ('point_layer',
+           content_hash(point_store.lon.tobytes() + point_store.lat.tobytes()
+                        + point_store.dataset.tobytes() + point_store.row_id.tobytes()),
+           tuple((dataset['prefix'], dataset['color']) for dataset in point_store.datasets),
+           content_hash(indices.tobytes()))
+    data = cache.get(key)
+    if data is None:
+        data = encode_points(
+            point_store.lat[indices], point_store.lon[indices], point_store.dataset[indices],
+            [dataset['color'] for dataset in point_store.datasets], point_store.point_ids(indices)
+        )
+        cache.put(key, data)
+    return data
+
+def add_point_markers(parent, point_store, indices, marker_size, enable_clustering):
+    """Doda točke na danih položajih kot en sloj - nad CANVAS_RENDER_THRESHOLD risan na platno, sicer kot SVG"""
+    PointLayer(
+        get_point_layer_data(point_store, indices),
+        n_points=len(indices),
+        radius=marker_size,
+        cluster=enable_clustering
+    ).add_to(parent)
+
+def point_store_cache_key(datasets):
+    """Ključ shrambe točk v predpomnilniku - imena, barve, vsebina in mapiranje koordinat nizov"""
+    return ('points', transformation_cache_key(get_transformation_model())) + tuple(
+        (dataset['name'], dataset['color'], data_content_key(dataset['data']),
+         dataset['x_col'], dataset['y_col'], dataset['from_epsg'], tuple(dataset['column_mapping'].items()))
+        for dataset in datasets
+    )
+
+def prepare_point_store(datasets):
+    """Pripravi stolpčno shrambo točk vseh nizov - nizi z istim izvornim EPSG se pretvorijo v enem klicu
+
+    Ostali stolpci se pretvorijo v tipe iz mapiranja stolpcev (coerce_columns), vrednosti,
+    ki jih ni bilo mogoče pretvoriti, pa se prikažejo v enem opozorilu.
+    Vsebina popup-ov se sestavi šele ob kliku (build_popup_html).
+    """
+    cache = get_result_cache()
+    key = point_store_cache_key(datasets)
+    failures_key = ('coercion_failures',) + key[1:]
+    point_store = cache.get(key)
+    if point_store is None:
+        converted = {}
+        for from_epsg in dict.fromkeys(dataset['from_epsg'] for dataset in datasets):
+            group = [dataset for dataset in datasets if dataset['from_epsg'] == from_epsg]
+            frames = cached_convert_datasets(
+                [(dataset['data'], dataset['x_col'], dataset['y_col']) for dataset in group], from_epsg, 4326
+            )
+            for dataset, frame in zip(group, frames):
+                converted[dataset['prefix']] = frame
+        failures = {}
+        with diagnostics.stage("coerce", rows=sum(len(frame) for frame in converted.values())):
+            for dataset in datasets:
+                converted[dataset['prefix']], dataset_failures = coerce_columns(
+                    converted[dataset['prefix']], dataset['column_mapping']
+                )
+                if dataset_failures:
+                    failures[dataset['name']] = dataset_failures
+        point_store = PointStore.from_frames([
+            (dataset['name'], dataset['color'], dataset['prefix'], dataset['from_epsg'], converted[dataset['prefix']])
+            for dataset in datasets
+        ])
+        if len(point_store):
+            cache.put(key, point_store)
+        cache.put(failures_key, failures)
     
+    show_coercion_failures(cache.get(failures_key))
+    return point_store
+
+def workspace_dataset_index(n):
+    """Položaj n-tega niza v odprtem delovnem prostoru ali None"""
+    workspace = st.session_state.get("workspace")
+    if workspace is None:
+        return None
+    prefixes = [dataset['prefix'] for dataset in workspace.datasets]
+    return prefixes.index(f"P{n}-") if f"P{n}-" in prefixes else None
+
+def workspace_settings():
+    """Nastavitve aplikacije, ki se shranijo v delovni prostor"""
+    return {
+        'dataset_count': st.session_state.get("dataset_count", 2),
+        'transformation_mode': st.session_state.get("transformation_mode", TRANSFORMATION_MODES[0]),
+        'triangle_model_path': st.session_state.get("triangle_model_path", ""),
+        'transformation_key': transformation_cache_key(get_transformation_model()),
+    }
+
+def save_current_workspace(status, datasets, point_store, display_columns):
+    """Shrani aktivne nize, njihove točke in nastavitve v delovni prostor - koordinate se ne pretvarjajo znova"""
+    path = st.session_state.get("workspace_path", "").strip() or WORKSPACE_PATH
     try:
-        points = []
-        for row in data_rows:
-            try:
-                x_val = float(row[x_col])
-                y_val = float(row[y_col])
-                
-                # Za Gauss (3912) zamenjaj X in Y, ker je Y vodoravna os, X pa navpična
-                if from_epsg == 3912:
-                    # GKY je vodoravno (vzhod), GKX je navpično (sever)
-                    # V geopandas Point(x, y) pomeni Point(vzhod, sever)
-                    points.append(Point(x_val, y_val))  # GKY je že vzhod, GKX je že sever
-                else:
-                    points.append(Point(x_val, y_val))
-                    
-            except (ValueError, KeyError):
-                points.append(None)
+        with diagnostics.stage("workspace_save", rows=len(point_store)):
+            save_workspace(path, datasets, point_store, display_columns, settings=workspace_settings())
+    except (OSError, ValueError) as e:
+        status.error(f"Delovnega prostora ni mogoče shraniti: {e}")
+        return
+    status.success(f"Delovni prostor shranjen v {path} ({len(datasets)} nizov, {len(point_store)} točk)")
+
+def open_workspace():
+    """Odpre delovni prostor (ob kliku na gumb, pred zagonom skripte)
+
+    Nastavi vnos, ime, koordinatni sistem, stolpce in prikaz nizov ter nastavitve pretvorbe.
+    Če je pretvorba enaka kot ob shranjevanju, se pretvorjeni nizi in shramba točk vstavijo
+    v predpomnilnik, zato se podatki ob zagonu ne razčlenjujejo in ne pretvarjajo.
+    """
+    path = st.session_state.get("workspace_path", "").strip() or WORKSPACE_PATH
+    try:
+        workspace = Workspace.open(path)
+    except (OSError, ValueError) as e:
+        st.session_state["workspace_message"] = ("error", f"Delovnega prostora ni mogoče odpreti: {e}")
+        return
+    
+    settings = workspace.settings
+    st.session_state["workspace"] = workspace
+    st.session_state["transformation_mode"] = settings.get('transformation_mode', TRANSFORMATION_MODES[0])
+    st.session_state["triangle_model_path"] = settings.get('triangle_model_path', "")
+    slots = {int(dataset['prefix'][1:-1]): dataset for dataset in workspace.datasets}
+    st.session_state["dataset_count"] = max([settings.get('dataset_count', 1), *slots])
+    for n in range(1, MAX_DATASETS + 1):
+        dataset = slots.get(n)
+        if dataset is None:
+            # Nizi, ki niso v delovnem prostoru, ostanejo prazni
+            st.session_state[f"input_mode_{n}"] = INPUT_MODES[0]
+            st.session_state[f"data{n}"] = ""
+            continue
+        st.session_state[f"input_mode_{n}"] = WORKSPACE_INPUT_MODE
+        st.session_state[f"name_{n}"] = dataset['name']
+        st.session_state[f"coord_sys_{n}"] = dataset['coord_system']
+        st.session_state[f"x_col_{n}"] = dataset['x_col']
+        st.session_state[f"y_col_{n}"] = dataset['y_col']
+        for header, col_type in dataset['column_mapping'].items():
+            st.session_state[f"type_{header}_{n}"] = col_type
+        st.session_state[f"display_cols_{n}"] = dataset['display_columns']
+    
+    model_key = transformation_cache_key(get_transformation_model())
+    saved_key = settings.get('transformation_key')
+    if (model_key is None and saved_key is None) or (model_key is not None and list(model_key) == saved_key):
+        cache = get_result_cache()
+        for i, dataset in enumerate(workspace.datasets):
+            if dataset['points']:
+                cache.put(('convert', dataset['content_hash'], dataset['x_col'], dataset['y_col'],
+                           dataset['from_epsg'], 4326, model_key), workspace.converted_frame(i))
+        point_store = workspace.point_store()
+        if len(point_store):
+            cache.put(point_store_cache_key([
+                {**dataset, 'data': workspace.dataset_frame(i)} for i, dataset in enumerate(workspace.datasets)
+                if dataset['points']
+            ]), point_store)
+        message = ("success", f"Odprt delovni prostor {path} ({len(workspace)} nizov, {workspace.n_points} točk)")
+    else:
+        message = ("warning", f"Odprt delovni prostor {path} - trikotniški model se je od shranjevanja "
+                              "spremenil, zato se koordinate ponovno pretvorijo")
+    st.session_state["workspace_message"] = message
+
+# Na zemljevidu se prikaže največ toliko vektorjev premikov (največji premiki)
+COMPARISON_MAX_VECTORS = 5_000
+COMPARISON_PAIRING_MODES = ["Po ID stolpcu", "Najbližja točka"]
+
+def cached_compare_points(dataset_a, dataset_b, id_col_a=None, id_col_b=None, max_distance=DEFAULT_PAIR_DISTANCE):
+    """Pari točk dveh nizov s premiki v COMPARISON_EPSG (predpomnjeno)"""
+    cache = get_result_cache()
+    key = ('compare', transformation_cache_key(get_transformation_model())) + tuple(
+        (data_content_key(dataset['data']), dataset['x_col'], dataset['y_col'], dataset['from_epsg'])
+        for dataset in (dataset_a, dataset_b)
+    ) + (id_col_a, id_col_b, max_distance)
+    pairs = cache.get(key)
+    if pairs is None:
+        items = [(dataset['data'], dataset['x_col'], dataset['y_col']) for dataset in (dataset_a, dataset_b)]
+        if dataset_a['from_epsg'] == dataset_b['from_epsg']:
+            frame_a, frame_b = cached_convert_datasets(items, dataset_a['from_epsg'], COMPARISON_EPSG)
+        else:
+            frame_a = cached_convert_datasets(items[:1], dataset_a['from_epsg'], COMPARISON_EPSG)[0]
+            frame_b = cached_convert_datasets(items[1:], dataset_b['from_epsg'], COMPARISON_EPSG)[0]
+        pairs = compare_points(frame_a, frame_b, id_col_a, id_col_b, max_distance)
+        cache.put(key, pairs)
+    return pairs
+
+def add_displacement_vectors(parent, pairs, scale):
+    """Vektorji premikov (povečani za scale) kot en sloj črt - največ COMPARISON_MAX_VECTORS največjih premikov"""
+    if len(pairs) > COMPARISON_MAX_VECTORS:
+        largest = np.argpartition(-pairs['distance'].to_numpy(), COMPARISON_MAX_VECTORS)[:COMPARISON_MAX_VECTORS]
+        pairs = pairs.iloc[largest]
+    start_lon, start_lat = transform_coordinates(pairs['x_a'], pairs['y_a'], COMPARISON_EPSG, 4326)
+    end_lon, end_lat = transform_coordinates(
+        pairs['x_a'] + scale * pairs['delta_x'], pairs['y_a'] + scale * pairs['delta_y'], COMPARISON_EPSG, 4326
+    )
+    lines = np.stack([
+        np.column_stack([start_lat, start_lon]), np.column_stack([end_lat, end_lon])
+    ], axis=1).round(7).tolist()
+    folium.PolyLine(lines, color="black", weight=2, opacity=0.8, tooltip="Vektor premika").add_to(parent)
+
+def show_legend(point_store, filtered_indices=None):
+    """Legenda z barvo, imenom in številom točk vsakega niza na zemljevidu (pri filtru število prikazanih)"""
+    st.write("**Legenda:**")
+    n_datasets = len(point_store.datasets)
+    totals = np.bincount(point_store.dataset, minlength=n_datasets)
+    shown = totals if filtered_indices is None else np.bincount(point_store.dataset[filtered_indices],
+                                                                 minlength=n_datasets)
+    legend_columns = st.columns(min(n_datasets, 4))
+    for i, dataset in enumerate(point_store.datasets):
+        count = f"{shown[i]}" if filtered_indices is None else f"{shown[i]} od {totals[i]}"
+        with legend_columns[i % len(legend_columns)]:
+            st.markdown(
+                f'<span style="color:{dataset["color"]}">●</span> {html.escape(dataset["name"])} ({count})',
+                unsafe_allow_html=True
+            )
+
+def show_filters(point_store, point_store_key):
+    """Filter točk po atributih in narisanih območjih - vrne naraščajoče položaje ustreznih točk ali None
+
+    Pogoji se izvedejo nad indeksi (razvrščen indeks za številke in datume, obrnjen indeks
+    za besedilo, prostorski indeks za območja), ki se zgradijo enkrat na shrambo točk.
+    Filtrirane točke se prikažejo na zemljevidu in v legendi ter ponudijo za iskanje in izvoz.
+    """
+    st.subheader("Filtriranje točk")
+    columns = list(point_store.attributes.columns)
+    col1, col2 = st.columns(2)
+    with col1:
+        n_conditions = st.number_input(
+            "Število pogojev atributov:",
+            min_value=0,
+            max_value=MAX_FILTER_CONDITIONS if columns else 0,
+            value=0,
+            help="Točka mora izpolniti vse pogoje; prazna vrednost pogoja se ne upošteva",
+            key="filter_count"
+        )
+    with col2:
+        use_drawings = st.checkbox(
+            "Samo točke v območjih, narisanih na zemljevidu",
+            value=False,
+            disabled=not FOLIUM_AVAILABLE,
+            help="Mnogokotnik ali pravokotnik narišete z orodji v levem zgornjem kotu zemljevida",
+            key="filter_drawn"
+        )
+    
+    parts = []
+    for i in range(n_conditions):
+        col1, col2, col3 = st.columns([2, 1, 2])
+        with col1:
+            col = st.selectbox("Stolpec:", options=columns, key=f"filter_col_{i}")
+        values = point_store.attributes[col]
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            col_type = "datum"
+        else:
+            col_type = "številka" if is_typed_column(values) else "besedilo"
+        with col2:
+            operator = st.selectbox(
+                "Pogoj:",
+                options=RANGE_OPERATORS if col_type != "besedilo" else TEXT_OPERATORS,
+                key=f"filter_op_{i}"
+            )
+        with col3:
+            value = st.text_input("Vrednost:", placeholder=FILTER_VALUE_EXAMPLES[col_type], key=f"filter_value_{i}")
+        if not value.strip():
+            continue
+        with diagnostics.stage("filter") as record:
+            positions = get_column_index(point_store, point_store_key, col).query(operator, value)
+            record['rows'] = len(point_store)
+        if positions is None:
+            st.warning(f"Vrednosti '{value}' ni mogoče prebrati kot {col_type} - pogoj se ne upošteva")
+        else:
+            parts.append(positions)
+    
+    drawings = None
+    if use_drawings and FOLIUM_AVAILABLE:
+        # Narisana območja vrne zemljevid (st_folium) iz prejšnjega prikaza
+        drawings = (st.session_state.get("main_map") or {}).get('all_drawings') or []
+        polygons = drawn_polygons(drawings)
+        if polygons:
+            point_index = get_point_index(point_store)
+            parts.append(np.unique(np.concatenate([
+                point_index.query_polygon_lonlat(lon, lat) for lon, lat in polygons
+            ])))
+        else:
+            st.caption("Na zemljevidu še ni narisanih območij - filter območij se ne upošteva")
+    # Zemljevid ob spremembi risb ponovno zažene stran, če se razlikujejo od uporabljenih tukaj
+    st.session_state["filter_drawings"] = drawings
+    
+    if not parts:
+        return None
+    filtered_indices = intersect_positions(parts, len(point_store))
+    st.caption(f"Filtru ustreza {len(filtered_indices)} od {len(point_store)} točk")
+    return filtered_indices
+
+def coordinate_sample(data, uploaded_file):
+    """Vzorec vrstic za preverjanje koordinatnega sistema - pri naloženi datoteki prvi kos (predpomnjeno)"""
+    if uploaded_file is None:
+        return sample_rows(data)
+    cache = get_result_cache()
+    key = ('crs_sample', upload_hash(uploaded_file))
+    sample = cache.get(key)
+    if sample is None:
+        chunks = iter_upload_chunks(uploaded_file, chunk_rows=CRS_SAMPLE_ROWS)
+        try:
+            first_chunk = next(chunks, None)
+        finally:
+            chunks.close()
+        sample = first_chunk[1] if first_chunk is not None else pd.DataFrame()
+        cache.put(key, sample)
+    return sample
+
+def coordinate_system_name(epsg):
+    return next(name for name, definition in epsgs.items() if definition["code"] == epsg)
+
+def apply_coordinate_suggestion(n, epsg, swapped):
+    """Nastavi predlagani koordinatni sistem (in zamenja koordinatna stolpca) n-tega niza - klic ob kliku gumba"""
+    st.session_state[f"coord_sys_{n}"] = coordinate_system_name(epsg)
+    if swapped:
+        st.session_state[f"x_col_{n}"], st.session_state[f"y_col_{n}"] = (
+            st.session_state[f"y_col_{n}"], st.session_state[f"x_col_{n}"]
+        )
+
+def keep_coordinate_system(n, check_key, from_epsg):
+    """Pretvori niz z izbranim sistemom kljub opozorilu - klic ob kliku gumba"""
+    st.session_state[f"crs_confirmed_{n}"] = (check_key, from_epsg)
+
+def precheck_coordinate_system(n, headers, sample, source_key):
+    """Preveri koordinatni sistem in stolpca n-tega niza na vzorcu, preden se izrišejo izbire in začne pretvorba
+
+    Izbrani stolpci so iz prejšnjega zagona. Ob novih podatkih ali stolpcih se nedvoumen
+    predlog sistema (brez zamenjave stolpcev) izbere samodejno. Vrne None, če izbira ustreza,
+    sicer (ključ preverjanja, delež v obsegu, predlogi) za opozorilo pod izbiro.
+    """
+    x_col, y_col = st.session_state.get(f"x_col_{n}"), st.session_state.get(f"y_col_{n}")
+    if x_col not in headers or y_col not in headers or sample is None or not len(sample):
+        return None
+    from_epsg = epsgs[st.session_state.get(f"coord_sys_{n}", next(iter(epsgs)))]["code"]
+    share, suggestions = check_coordinate_system(
+        parse_number_array(sample[x_col]), parse_number_array(sample[y_col]), from_epsg, columns=(x_col, y_col)
+    )
+    check_key = (source_key, x_col, y_col)
+    first_check = st.session_state.get(f"crs_checked_{n}") != check_key
+    st.session_state[f"crs_checked_{n}"] = check_key
+    if not suggestions:
+        return None
+    
+    best = suggestions[0]
+    runner_up = suggestions[1] if len(suggestions) > 1 else None
+    decisive = runner_up is None or best[2] > runner_up[2] or (best[3] and not runner_up[3])
+    if first_check and decisive and not best[1]:
+        st.session_state[f"coord_sys_{n}"] = coordinate_system_name(best[0])
+        st.session_state[f"crs_message_{n}"] = (
+            f"Koordinatni sistem je samodejno nastavljen na {coordinate_system_name(best[0])} "
+            f"({best[2]:.0%} vzorca je v obsegu Slovenije)"
+        )
+        return None
+    if st.session_state.get(f"crs_confirmed_{n}") == (check_key, from_epsg):
+        return None
+    return check_key, share, suggestions
+
+def show_coordinate_warning(n, coord_system, check, from_epsg):
+    """Opozorilo ob neustreznem sistemu ali zamenjanih stolpcih s predlogi - niz se do odločitve ne pretvori"""
+    check_key, share, suggestions = check
+    st.warning(
+        f"Le {share:.0%} vzorca koordinat je v obsegu Slovenije za {coord_system}. "
+        "Niz se ne pretvori, dokler ne izberete predloga ali potrdite izbire."
+    )
+    for i, (epsg, swapped, suggested_share, _) in enumerate(suggestions):
+        label = f"Uporabi {coordinate_system_name(epsg)}"
+        if swapped:
+            label += " z zamenjanima stolpcema"
+        st.button(f"{label} ({suggested_share:.0%} v obsegu)", on_click=apply_coordinate_suggestion,
+                  args=(n, epsg, swapped), key=f"crs_apply_{n}_{i}")
+    st.button("Obdrži izbiro in pretvori", on_click=keep_coordinate_system,
+              args=(n, check_key, from_epsg), key=f"crs_keep_{n}")
+
+def dataset_input(n):
+    """Vnos, branje in mapiranje stolpcev n-tega niza podatkov (n od 1 naprej)
+
+    Vrne slovar z imenom, barvo, predpono ID, glavami, podatki, izbranim
+    koordinatnim sistemom in stolpcema ter tipi ostalih stolpcev.
+    """
+    default_name = DATASET_NAMES[n - 1] if n <= len(DATASET_NAMES) else f"{n}. niz"
+    dataset = {
+        'name': default_name,
+        'color': DATASET_COLORS[(n - 1) % len(DATASET_COLORS)],
+        'prefix': f"P{n}-",
+        'headers': [],
+        'data': None,
+        'coord_system': None,
+        'from_epsg': None,
+        'x_col': None,
+        'y_col': None,
+        'column_mapping': {},
+    }
+    
+    st.subheader(f"{default_name} podatkov" if n == 1 else f"{default_name} podatkov (opcijsko)")
+    workspace_index = workspace_dataset_index(n)
+    input_modes = INPUT_MODES if workspace_index is None else INPUT_MODES + [WORKSPACE_INPUT_MODE]
+    input_mode = st.radio("Način vnosa:", options=input_modes, horizontal=True, key=f"input_mode_{n}")
+    coords_input = ""
+    uploaded_file = None
+    if input_mode == INPUT_MODES[0]:
+        coords_input = st.text_area(
+            "Vnesite podatke (prva vrstica = imena stolpcev):" if n == 1
+            else "Vnesite dodatne podatke (prva vrstica = imena stolpcev):",
+            height=150,
+            placeholder="ID\tGKY\tGKX\tOpis\n1\t448521\t42259\tTočka 1\n2\t448149\t42745\tTočka 2" if n == 1
+            else "Ime\tLon\tLat\tKategorija\nLokacija A\t14.3362\t45.5227\tTurizem",
+            help="Primera vrstica mora vsebovati imena stolpcev" if n == 1 else "Opcijsko - za prikaz dodatnih točk",
+            key=f"data{n}"
+        )
+    elif input_mode == WORKSPACE_INPUT_MODE:
+        st.caption(f"Prebrani podatki iz delovnega prostora {st.session_state['workspace'].path}")
+    else:
+        uploaded_file = st.file_uploader(
+            "Naložite datoteko CSV, TXT ali XLSX (prva vrstica = imena stolpcev):",
+            type=UPLOAD_TYPES,
+            key=f"file{n}"
+        )
+    
+    headers, data = None, None
+    if coords_input:
+        headers, data, bad_rows = cached_parse_data_with_headers(coords_input)
+        show_bad_rows(bad_rows)
+    elif uploaded_file is not None:
+        # Iz datoteke najprej preberemo samo glave - podatki se berejo po kosih po mapiranju stolpcev
+        headers = read_upload_headers(uploaded_file)
+    elif input_mode == WORKSPACE_INPUT_MODE:
+        # Podatki so preslikani iz datoteke delovnega prostora - brez ponovnega branja
+        workspace = st.session_state["workspace"]
+        headers = workspace.datasets[workspace_index]['headers']
+        data = workspace.dataset_frame(workspace_index)
+    
+    if not headers or (uploaded_file is None and (data is None or not len(data))):
+        return dataset
+    
+    dataset['headers'] = headers
+    data_label = "Prebrani podatki" if n == 1 else f"Prebrani podatki ({default_name.lower()})"
+    if data is not None:
+        dataset['data'] = data
+        st.success(f"Prebrano {len(data)} vrstic z {len(headers)} stolpci")
         
-        # Ustvari DataFrame
-        df = pd.DataFrame(data_rows)
+        # Prikaz raw podatkov
+        with st.expander(data_label):
+            st.dataframe(data)
+    
+    # Koordinatni sistem in stolpca se preverita na vzorcu pred pretvorbo
+    source_key = upload_hash(uploaded_file) if uploaded_file is not None else data_content_key(data)
+    with diagnostics.stage("crs_check"):
+        coordinate_check = precheck_coordinate_system(n, headers, coordinate_sample(data, uploaded_file), source_key)
+    
+    # Mapiranje stolpcev
+    st.subheader(f"Mapiranje stolpcev za {default_name.lower()}")
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        # Privzeto ime v stanju seje (in ne value=), ker ga nastavi tudi odpiranje delovnega prostora
+        st.session_state.setdefault(f"name_{n}", default_name)
+        dataset['name'] = st.text_input("Ime niza (legenda):", key=f"name_{n}").strip() or default_name
         
-        # Ustvari GeoDataFrame z geometrijo
-        gdf = gpd.GeoDataFrame(df, geometry=points, crs=f"EPSG:{from_epsg}")
+        st.write("**Izbira koordinatnega sistema:**")
+        coord_system = st.selectbox(
+            "Koordinatni sistem:",
+            options=list(epsgs.keys()),
+            key=f"coord_sys_{n}"
+        )
+        dataset['coord_system'] = coord_system
+        dataset['from_epsg'] = epsgs[coord_system]["code"]
         
-        # Odstrani vrstice z None geometrijo
-        gdf = gdf.dropna(subset=['geometry'])
+        st.write("**Koordinatni stolpci:**")
+        dataset['x_col'] = st.selectbox(
+            f"Stolpec za {epsgs[coord_system]['x_name']}:",
+            options=[""] + headers,
+            key=f"x_col_{n}"
+        )
+        dataset['y_col'] = st.selectbox(
+            f"Stolpec za {epsgs[coord_system]['y_name']}:",
+            options=[""] + headers,
+            key=f"y_col_{n}"
+        )
         
-        # Pretvori v ciljni koordinatni sistem
-        gdf_transformed = gdf.to_crs(f"EPSG:{to_epsg}")
+        crs_message = st.session_state.pop(f"crs_message_{n}", None)
+        if crs_message:
+            st.info(crs_message)
+        if coordinate_check is not None:
+            show_coordinate_warning(n, coord_system, coordinate_check, dataset['from_epsg'])
         
-        # Dodaj nove koordinate v DataFrame
-        gdf_transformed['converted_x'] = gdf_transformed.geometry.x
-        gdf_transformed['converted_y'] = gdf_transformed.geometry.y
+    with col2:
+        st.write("**Ostali stolpci:**")
+        for header in headers:
+            if header not in [dataset['x_col'], dataset['y_col']]:
+                col_type = st.selectbox(
+                    f"Tip stolpca '{header}':",
+                    options=COLUMN_TYPES,
+                    key=f"type_{header}_{n}"
+                )
+                dataset['column_mapping'][header] = col_type
+    
+    if coordinate_check is not None:
+        # Niz brez koordinatnih stolpcev ni aktiven in se ne pretvori
+        dataset['x_col'] = dataset['y_col'] = None
+    
+    # Datoteka se prebere in pretvori po kosih šele, ko sta izbrana koordinatna stolpca
+    if uploaded_file is not None and dataset['x_col'] and dataset['y_col']:
+        dataset['data'] = load_uploaded_dataset(
+            uploaded_file, dataset['x_col'], dataset['y_col'], dataset['from_epsg']
+        )
+        st.success(f"Prebrano in pretvorjeno {len(dataset['data'])} vrstic z {len(headers)} stolpci")
+        with st.expander(data_label):
+            st.dataframe(dataset['data'].head(1000))
+    return dataset
+
+def build_base_map(map_style, center_lat, center_lon, zoom_level):
+    """Zemljevid s podlago brez točk - za enake nastavitve je enak, zato ga st_folium ob ponovnem zagonu ne naloži znova"""
+    if map_style == "OpenStreetMap":
+        m = folium.Map(
+            location=[center_lat, center_lon],
+            zoom_start=zoom_level,
+            tiles="OpenStreetMap",
+            font_size='1rem'
+        )
+    elif map_style == "CartoDB positron":
+        m = folium.Map(
+            location=[center_lat, center_lon],
+            zoom_start=zoom_level,
+            tiles="CartoDB positron"
+        )
+    elif map_style == "CartoDB dark_matter":
+        m = folium.Map(
+            location=[center_lat, center_lon],
+            zoom_start=zoom_level,
+            tiles="CartoDB dark_matter"
+        )
+    elif map_style == "Stamen Terrain":
+        m = folium.Map(
+            location=[center_lat, center_lon],
+            zoom_start=zoom_level,
+            tiles=None
+        )
+        folium.TileLayer(
+            tiles="https://stamen-tiles-{s}.a.ssl.fastly.net/terrain/{z}/{x}/{y}.png",
+            attr='Map tiles by <a href="http://stamen.com">Stamen Design</a>, '
+                 'under <a href="http://creativecommons.org/licenses/by/3.0">CC BY 3.0</a>. '
+                 'Data by <a href="http://openstreetmap.org">OpenStreetMap</a>, '
+                 'under <a href="http://www.openstreetmap.org/copyright">ODbL</a>.',
+            name="Stamen Terrain",
+            overlay=False,
+            control=True
+        ).add_to(m)
+    elif map_style == "Stamen Toner":
+        m = folium.Map(
+            location=[center_lat, center_lon],
+            zoom_start=zoom_level,
+            tiles=None
+        )
+        folium.TileLayer(
+            tiles="https://stamen-tiles-{s}.a.ssl.fastly.net/toner/{z}/{x}/{y}.png",
+            attr='Map tiles by <a href="http://stamen.com">Stamen Design</a>, '
+                 'under <a href="http://creativecommons.org/licenses/by/3.0">CC BY 3.0</a>. '
+                 'Data by <a href="http://openstreetmap.org">OpenStreetMap</a>, '
+                 'under <a href="http://www.openstreetmap.org/copyright">ODbL</a>.',
+            name="Stamen Toner",
+            overlay=False,
+            control=True
+        ).add_to(m)
+    return m
+
+def fragment_diagnostics():
+    """Diagnostika dela strani - v polnem zagonu skupna za celo stran, ob zagonu samo fragmenta nova"""
+    if not diagnostics.closed:
+        return diagnostics
+    return Diagnostics(enabled=st.session_state.get("diagnostics_enabled", False))
+
+def show_diagnostics(run_diagnostics, title, section):
+    """Prikaz meritev zagona (cele strani ali fragmenta) in zapis v dnevnik"""
+    run_diagnostics.close()
+    if not run_diagnostics.enabled:
+        return
+    st.session_state["diagnostics_run"] = st.session_state.get("diagnostics_run", 0) + 1
+    with st.expander(f"⏱️ Diagnostika {title} ({run_diagnostics.total_seconds * 1000:.0f} ms)"):
+        if run_diagnostics.records:
+            st.dataframe(run_diagnostics.to_frame().round(2), width='stretch', hide_index=True)
+        else:
+            st.caption("V tem zagonu ni bilo merjenih stopenj (rezultati so bili v predpomnilniku)")
+    try:
+        run_diagnostics.write_log(
+            DIAGNOSTICS_LOG_PATH,
+            session=st.session_state.setdefault("diagnostics_session", uuid.uuid4().hex[:12]),
+            run=st.session_state["diagnostics_run"],
+            section=section,
+        )
+    except OSError as e:
+        st.warning(f"Dnevnika diagnostike ni mogoče zapisati: {e}")
+
+@st.fragment
+def show_map(point_store, comparison_pairs, vector_scale, display_columns, filtered_indices=None):
+    """Zemljevid s točkami in podrobnostmi klika
+    
+    Fragment: sprememba možnosti prikaza, premik zemljevida ali klik izvede samo ta del
+    strani, brez branja, pretvorbe in ostalih razdelkov. Podlaga je ločena od sloja točk,
+    zato st_folium ob spremembi sloga zamenja le sloj, polje točk pa je predpomnjeno.
+    Pri filtru (filtered_indices) se prikažejo samo filtrirane točke.
+    """
+    run_diagnostics = fragment_diagnostics()
+    shown_indices = np.arange(len(point_store)) if filtered_indices is None else filtered_indices
+    
+    # Možnosti prikaza zemljevida
+    st.write("**Možnosti prikaza zemljevida:**")
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        map_style = st.selectbox(
+            "Stil zemljevida:",
+            options=["OpenStreetMap", "CartoDB positron", "CartoDB dark_matter", "Stamen Terrain", "Stamen Toner"],
+            key="map_style"
+        )
+    
+    with col2:
+        marker_size = st.slider("Velikost označevalcev:", 5, 20, 8, key="marker_size")
+    
+    with col3:
+        enable_clustering = st.checkbox("Omogoči združevanje točk", value=False, key="enable_clustering")
+    
+    viewport_culling = st.checkbox(
+        "Prikaži samo točke v vidnem delu zemljevida",
+        value=len(shown_indices) > CANVAS_RENDER_THRESHOLD,
+        help="Ob premiku ali povečavi zemljevida se naložijo točke novega pogleda; "
+             "pri manjši povečavi se prikaže le vzorec točk.",
+        key="viewport_culling"
+    )
+    
+    # Izračunaj center zemljevida
+    center_lat = float(point_store.lat.mean())
+    center_lon = float(point_store.lon.mean())
+    
+    # Določi zoom level na podlagi razpona koordinat
+    lat_range = float(np.ptp(point_store.lat))
+    lon_range = float(np.ptp(point_store.lon))
+    max_range = max(lat_range, lon_range)
+    
+    if max_range < 0.01:
+        zoom_level = 14
+    elif max_range < 0.1:
+        zoom_level = 12
+    elif max_range < 1:
+        zoom_level = 10
+    else:
+        zoom_level = 8
+    
+    m = build_base_map(map_style, center_lat, center_lon, zoom_level)
+    draw_areas = st.session_state.get("filter_drawn", False)
+    if draw_areas:
+        # Orodja za risanje območij filtra (mnogokotnik, pravokotnik)
+        from folium.plugins import Draw
+        Draw(draw_options={'polyline': False, 'circle': False, 'marker': False, 'circlemarker': False},
+             edit_options={'edit': False}).add_to(m)
+    
+    # Točke in vektorji premikov so v sloju, ki ga st_folium doda na obstoječi zemljevid
+    point_layer = folium.FeatureGroup(name="Točke")
+    if comparison_pairs is not None and len(comparison_pairs):
+        add_displacement_vectors(point_layer, comparison_pairs, vector_scale)
+    
+    if viewport_culling:
+        # V brskalnik se pošljejo samo točke v (razširjenem) vidnem delu, redčene glede na zoom.
+        # Meje in zoom vrne prejšnji prikaz.
+        map_view = st.session_state.get("main_map") or {}
+        with run_diagnostics.stage("viewport") as record:
+            visible_indices = visible_point_indices(
+                get_point_index(point_store), map_view.get('bounds'),
+                map_view.get('zoom') or zoom_level, center_lat, subset=filtered_indices
+            )
+            record['rows'] = len(visible_indices)
+        st.caption(f"Prikaz {len(visible_indices)} od {len(shown_indices)} točk v vidnem delu zemljevida")
+        returned_objects = ["last_object_clicked", "last_object_clicked_popup", "bounds", "zoom"]
+    else:
+        visible_indices = shown_indices
+        if len(visible_indices) > CANVAS_RENDER_THRESHOLD:
+            st.caption(f"Prikaz {len(visible_indices)} točk na platnu (canvas)")
+        returned_objects = ["last_object_clicked", "last_object_clicked_popup"]
+    if draw_areas:
+        returned_objects.append("all_drawings")
+    with run_diagnostics.stage("markers", rows=len(visible_indices)):
+        add_point_markers(point_layer, point_store, visible_indices, marker_size, enable_clustering)
+    
+    # Prikaži zemljevid
+    with run_diagnostics.stage("map_render"):
+        map_data = st_folium(
+            m, width=1100, height=700, key="main_map",
+            feature_group_to_add=point_layer,
+            returned_objects=returned_objects
+        )
+    
+    # Nova ali izbrisana območja spremenijo filter, ki velja za celo stran (legenda, iskanje, izvoz) -
+    # stran se ponovno zažene enkrat na spremembo risb
+    drawings = map_data.get('all_drawings') or []
+    if (draw_areas and drawings != (st.session_state.get("filter_drawings") or [])
+            and drawings != st.session_state.get("filter_drawings_rerun")):
+        st.session_state["filter_drawings_rerun"] = drawings
+        st.rerun()
+    
+    # Dodaj informacije o interakciji
+    st.info("💡 Kliknite na označevalec za prikaz podrobnosti!")
+    
+    # Prikaži informacije o kliku
+    if map_data['last_object_clicked']:
+        clicked_lat = map_data['last_object_clicked']['lat']
+        clicked_lon = map_data['last_object_clicked']['lng']
+        
+        point_index = get_point_index(point_store)
         
-        # Za Gauss (3912) na izhodu obrni koordinate nazaj
-        if to_epsg == 3912:
-            # Na izhodu: geografski X postane GKX, geografski Y postane GKY
-            gdf_transformed['converted_x'] = gdf_transformed.geometry.y  # sever -> GKX
-            gdf_transformed['converted_y'] = gdf_transformed.geometry.x  # vzhod -> GKY
+        # Popup označevalca vsebuje samo ID točke - iz njega točko najdemo neposredno
+        clicked_id = popup_point_id(map_data.get('last_object_clicked_popup'))
+        anchor = point_store.index_of(clicked_id) if clicked_id else None
+        if anchor is not None:
+            clicked_lon, clicked_lat = point_store.lon[anchor], point_store.lat[anchor]
+            max_distance = STACK_TOLERANCE
+        else:
+            max_distance = CLICK_MAX_DISTANCE_M
         
-        return gdf_transformed.to_dict('records')
+        # Najdi najbližjo točko (in vse točke na istem mestu) prek prostorskega indeksa
+        clicked_indices, _ = point_index.nearest_lonlat(
+            clicked_lon, clicked_lat, max_distance=max_distance
+        )
+        if filtered_indices is not None:
+            clicked_indices = clicked_indices[np.isin(clicked_indices, filtered_indices)]
         
-    except Exception as e:
-        st.error(f"Napaka pri pretvorbi koordinat: {e}")
-        return []
+        if len(clicked_indices):  # Blizu dovolj
+            clicked_ids = point_store.point_ids(clicked_indices).tolist()
+            clicked_names = point_store.dataset_names(clicked_indices).tolist()
+            if len(clicked_indices) == 1:
+                st.success(f"Kliknili ste na: {clicked_ids[0]} ({clicked_names[0]})")
+            else:
+                st.success(f"Kliknili ste na {len(clicked_indices)} točk na istem mestu: "
+                           + ", ".join(f"{point_id} ({name})" for point_id, name in zip(clicked_ids, clicked_names)))
+            
+            for index, point_id, name in zip(clicked_indices, clicked_ids, clicked_names):
+                st.markdown(
+                    build_popup_html(point_store, index, display_columns.get(name, [])),
+                    unsafe_allow_html=True
+                )
+                with st.expander(f"Vsi atributi ({point_id})"):
+                    for attr_name, value in point_store.attributes_of(index).items():
+                        st.write(f"{attr_name}: {value}")
+    
+    # Legenda - prikaži samo za obstoječe nize
+    show_legend(point_store, filtered_indices)
+    
+    if run_diagnostics is not diagnostics:
+        show_diagnostics(run_diagnostics, "zemljevida", section="map")
 
-def prepare_folium_data(dataset1_data, x_col_1, y_col_1, coord_system_1, display_columns_1,
-                       dataset2_data, x_col_2, y_col_2, coord_system_2, display_columns_2):
-    """Pripravi podatke za Folium zemljevid z interaktivnimi popup-i"""
+@st.fragment
+def show_point_selection(point_store, filtered_indices=None):
+    """Iskanje, izbira in izvoz točk - fragment: sprememba iskanja ali izbire izvede samo ta del strani
+
+    Pri filtru (filtered_indices) se iščejo in izvažajo samo filtrirane točke.
+    """
+    # Dodatne možnosti za izbiro več točk
+    st.subheader("Izbira in filtriranje točk")
     
-    all_points = []
+    # Iskanje po indeksu točk - v izbiro se ponudi le stran zadetkov
+    point_labels = get_point_labels(point_store)
     
-    # Prvi niz podatkov
-    if dataset1_data and x_col_1 and y_col_1 and coord_system_1:
-        converted_data_1 = convert_coordinates_from_data(
-            dataset1_data, x_col_1, y_col_1, 
-            epsgs[coord_system_1]["code"], 4326
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        point_search = st.text_input(
+            "Iskanje točk (ID ali niz):",
+            placeholder="npr. P1-12 ali Drugi niz",
+            key="point_search"
         )
-        
-        for i, row in enumerate(converted_data_1):
-            if 'converted_x' in row and 'converted_y' in row:
-                # Pripravi popup text
-                popup_parts = [f"<b>ID: P1-{row.get('row_id', i+1)}</b>"]
-                popup_parts.append(f"<b>Dataset:</b> Prvi niz")
-                popup_parts.append(f"<b>Lat:</b> {row['converted_y']:.6f}")
-                popup_parts.append(f"<b>Lon:</b> {row['converted_x']:.6f}")
-                
-                for col in display_columns_1:
-                    if col in row and row[col] is not None:
-                        popup_parts.append(f"<b>{col}:</b> {row[col]}")
-                
-                point_data = {
-                    'lon': row['converted_x'],
-                    'lat': row['converted_y'],
-                    'popup': "<br>".join(popup_parts),
-                    'color': 'red',
-                    'dataset': 'Prvi niz',
-                    'point_id': f"P1-{row.get('row_id', i+1)}",
-                    'icon': 'circle'
-                }
-                
-                # Dodaj vse atribute za later prikaz
-                for col in row:
-                    if col not in ['converted_x', 'converted_y', 'geometry']:
-                        point_data[f"attr_{col}"] = row[col]
-                
-                all_points.append(point_data)
+    matching_positions = search_point_labels(point_labels, point_search)
+    if filtered_indices is not None:
+        matching_positions = np.intersect1d(matching_positions, filtered_indices, assume_unique=True)
+    n_pages = max(-(-len(matching_positions) // POINT_PAGE_SIZE), 1)
+    with col2:
+        page = st.number_input("Stran zadetkov:", min_value=1, max_value=n_pages, value=1, key="point_page")
+    page = min(page, n_pages)
+    page_positions = matching_positions[(page - 1) * POINT_PAGE_SIZE:page * POINT_PAGE_SIZE]
+    n_searched = len(point_labels) if filtered_indices is None else len(filtered_indices)
+    st.caption(f"Zadetkov: {len(matching_positions)} od {n_searched} točk (stran {page}/{n_pages})")
     
-    # Drugi niz podatkov
-    if dataset2_data and x_col_2 and y_col_2 and coord_system_2:
-        converted_data_2 = convert_coordinates_from_data(
-            dataset2_data, x_col_2, y_col_2, 
-            epsgs[coord_system_2]["code"], 4326
-        )
+    # Že izbrane točke ostanejo med možnostmi tudi, ko niso na trenutni strani zadetkov
+    already_selected = st.session_state.get("multi_select_points", [])
+    selected_points = st.multiselect(
+        "Izberite točke za podroben prikaz:",
+        options=list(dict.fromkeys(already_selected + point_labels.iloc[page_positions].tolist())),
+        key="multi_select_points"
+    )
+    
+    # Položaji izbranih točk v shrambi (točke, ki jih ni več, se izpustijo)
+    selected_indices = [
+        index for index in (point_store.index_of(selected.split(' (')[0]) for selected in selected_points)
+        if index is not None
+    ]
+    
+    if selected_points:
+        st.write(f"**Podrobnosti za {len(selected_points)} izbrane točke:**")
         
-        for i, row in enumerate(converted_data_2):
-            if 'converted_x' in row and 'converted_y' in row:
-                # Pripravi popup text
-                popup_parts = [f"<b>ID: P2-{row.get('row_id', i+1)}</b>"]
-                popup_parts.append(f"<b>Dataset:</b> Drugi niz")
-                popup_parts.append(f"<b>Lat:</b> {row['converted_y']:.6f}")
-                popup_parts.append(f"<b>Lon:</b> {row['converted_x']:.6f}")
+        for index in selected_indices:
+            point_id = point_store.point_ids([index]).iat[0]
+            with st.expander(f"📍 {point_id} - {point_store.dataset_names([index]).iat[0]}"):
+                col1, col2 = st.columns(2)
                 
-                for col in display_columns_2:
-                    if col in row and row[col] is not None:
-                        popup_parts.append(f"<b>{col}:</b> {row[col]}")
-                
-                point_data = {
-                    'lon': row['converted_x'],
-                    'lat': row['converted_y'],
-                    'popup': "<br>".join(popup_parts),
-                    'color': 'blue',
-                    'dataset': 'Drugi niz',
-                    'point_id': f"P2-{row.get('row_id', i+1)}",
-                    'icon': 'circle'
-                }
-                
-                # Dodaj vse atribute
-                for col in row:
-                    if col not in ['converted_x', 'converted_y', 'geometry']:
-                        point_data[f"attr_{col}"] = row[col]
+                with col1:
+                    st.write("**Koordinate:**")
+                    st.write(f"Lat: {point_store.lat[index]:.6f}")
+                    st.write(f"Lon: {point_store.lon[index]:.6f}")
                 
-                all_points.append(point_data)
+                with col2:
+                    st.write("**Atributi:**")
+                    for attr_name, value in point_store.attributes_of(index).items():
+                        st.write(f"{attr_name}: {value}")
+    
+    # Dodaj možnost izvoza izbranih točk
+    if selected_points:
+        if st.button("📥 Prikaži izbrane točke v tabeli"):
+            export_df = point_store.to_frame(selected_indices)
+            st.dataframe(export_df, width='stretch')
+            
+            # Možnost download-a
+            csv = export_df.to_csv(index=False)
+            st.download_button(
+                label="⬇️ Prenesi CSV",
+                data=csv,
+                file_name="izbrane_tocke.csv",
+                mime="text/csv"
+            )
+    
+    # Izvoz vseh, izbranih nizov ali izbranih točk
+    show_export(point_store, selected_indices, filtered_indices)
+
+def show_export(point_store, selected_indices=None, filtered_indices=None):
+    """Izvoz točk v CSV, XLSX, GeoPackage ali GeoParquet - datoteka se ustvari šele ob kliku na prenos
+
+    Pri filtru (filtered_indices) se vsi ali izbrani nizi izvozijo samo s filtriranimi točkami.
+    """
+    st.subheader("Izvoz točk")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        export_format = st.selectbox("Oblika izvoza:", list(EXPORT_FORMATS), key="export_format")
+    with col2:
+        scopes = EXPORT_SCOPES if selected_indices is not None else EXPORT_SCOPES[:2]
+        export_scope = st.radio("Izvozi:", scopes, horizontal=True, key="export_scope")
+    
+    all_indices = np.arange(len(point_store)) if filtered_indices is None else filtered_indices
+    if export_scope == "Izbrane točke" and selected_indices is not None:
+        indices = np.asarray(selected_indices, dtype=np.int64)
+    elif export_scope == "Izbrani nizi":
+        dataset_names = [dataset['name'] for dataset in point_store.datasets]
+        chosen = st.multiselect("Nizi za izvoz:", dataset_names, default=dataset_names, key="export_datasets")
+        codes = [dataset_names.index(name) for name in chosen]
+        indices = all_indices[np.isin(point_store.dataset[all_indices], codes)]
+    else:
+        indices = all_indices
+    
+    filtered_text = " filtriranih" if filtered_indices is not None and export_scope != "Izbrane točke" else ""
+    st.caption(f"Točk za izvoz: {len(indices)}{filtered_text} (koordinate v vseh sistemih, geometrija v EPSG:3794)")
     
-    return all_points
+    # Model se prebere zdaj - funkcija prenosa se izvede v drugi niti ob kliku
+    model = get_transformation_model()
+    export_format_info = EXPORT_FORMATS[export_format]
+    st.download_button(
+        label=f"⬇️ Prenesi {export_format}",
+        data=lambda: export_bytes(export_format, point_store, indices, model=model),
+        file_name=f"tocke.{export_format_info['extension']}",
+        mime=export_format_info['mime'],
+        disabled=not len(indices),
+        key="export_download"
+    )
 
 # Streamlit UI
 st.set_page_config(layout="wide")
 
+# Diagnostika izvajanja (vklop v naprednih nastavitvah) - meritve stopenj tega zagona
+diagnostics = Diagnostics(enabled=st.session_state.get("diagnostics_enabled", False))
+
 st.title("Pretvornik GEO koordinat")
 
 st.markdown("""
 ### Navodila za uporabo:
-1. Prilepite podatke v polje spodaj (prva vrstica naj bodo imena stolpcev)
+1. Prilepite podatke v polje spodaj ali naložite datoteko CSV/TXT/XLSX (prva vrstica naj bodo imena stolpcev)
 2. Podatke ločite s tabulatorjem, podpičjem ali presledkom
 3. Mapirajte stolpce in določite njihove tipe
-4. Po potrebi dodajte še en niz podatkov v drugo polje
+4. Po potrebi povečajte število nizov in dodajte nadaljnje nize podatkov (npr. staro izmero, novo izmero in kontrolne točke)
 """)
 
+with st.expander("Napredne nastavitve pretvorbe"):
+    st.number_input(
+        "Število procesov za pretvorbo (0 = vsa jedra):",
+        min_value=0,
+        max_value=os.cpu_count() or 1,
+        value=1,
+        help=f"Vzporedna pretvorba se uporabi šele pri vsaj {PARALLEL_MIN_POINTS} točkah",
+        key="conversion_workers"
+    )
+    st.number_input(
+        "Velikost kosa za vzporedno pretvorbo (0 = samodejno):",
+        min_value=0,
+        value=0,
+        step=50_000,
+        key="conversion_chunk_points"
+    )
+    transformation_mode = st.radio(
+        "Pretvorba med D48/GK in D96/TM:",
+        options=TRANSFORMATION_MODES,
+        horizontal=True,
+        help="Trikotniški model se uporabi za pretvorbe iz ali v D48/GK (EPSG:3912); "
+             "točke zunaj modela se pretvorijo s parametri EPSG",
+        key="transformation_mode"
+    )
+    if transformation_mode == TRANSFORMATION_MODES[1]:
+        triangle_model_path = st.text_input(
+            "Pot do datoteke trikotniškega modela:",
+            help="Vsaka vrstica je en trikotnik: x1 y1 e1 n1 x2 y2 e2 n2 x3 y3 e3 n3 "
+                 "(oglišča v D48/GK kot GKY GKX in v D96/TM kot E N)",
+            key="triangle_model_path"
+        ).strip()
+        if triangle_model_path:
+            try:
+                st.caption(f"Naložen model s {len(load_triangle_model(triangle_model_path))} trikotniki")
+            except (OSError, ValueError) as e:
+                st.error(f"Trikotniškega modela ni mogoče naložiti: {e}")
+    st.checkbox(
+        "Diagnostika izvajanja (čas, vrstice in pomnilnik po stopnjah)",
+        value=False,
+        help="Meritve se prikažejo na dnu strani in dodajo v dnevnik "
+             f"{DIAGNOSTICS_LOG_PATH}; merjenje pomnilnika upočasni obdelavo",
+        key="diagnostics_enabled"
+    )
+
+with st.expander("Delovni prostor"):
+    st.text_input(
+        "Pot do datoteke delovnega prostora:",
+        value=WORKSPACE_PATH,
+        help="Shranijo se prebrani podatki, mapiranje stolpcev in pretvorjene koordinate aktivnih nizov; "
+             "ob odpiranju se datoteka preslika v pomnilnik brez ponovnega branja in pretvorbe",
+        key="workspace_path"
+    )
+    col1, col2 = st.columns(2)
+    with col1:
+        save_workspace_requested = st.button("💾 Shrani delovni prostor", key="workspace_save")
+    with col2:
+        st.button("📂 Odpri delovni prostor", on_click=open_workspace, key="workspace_open")
+    workspace_status = st.empty()
+    workspace_message = st.session_state.pop("workspace_message", None)
+    if workspace_message:
+        getattr(workspace_status, workspace_message[0])(workspace_message[1])
+
 # Glavni vnos podatkov
 
-st.subheader("Prvi niz podatkov")
-coords_input_1 = st.text_area(
-    "Vnesite podatke (prva vrstica = imena stolpcev):",
-    height=150,
-    placeholder="ID\tGKY\tGKX\tOpis\n1\t448521\t42259\tTočka 1\n2\t448149\t42745\tTočka 2",
-    help="Primera vrstica mora vsebovati imena stolpcev",
-    key="data1"
+st.session_state.setdefault("dataset_count", 2)
+dataset_count = st.number_input(
+    "Število nizov podatkov:",
+    min_value=1,
+    max_value=MAX_DATASETS,
+    help="Npr. stara izmera (D48), nova izmera (D96), GNSS kontrolne točke, kataster",
+    key="dataset_count"
 )
 
-dataset1_columns = []
-dataset1_data = []
-column_mapping_1 = {}
-coord_system_1 = None
-x_col_1 = None
-y_col_1 = None
-display_columns_1 = []
-
-if coords_input_1:
-    headers_1, data_1 = parse_data_with_headers(coords_input_1)
-    if headers_1 and data_1:
-        dataset1_columns = headers_1
-        dataset1_data = data_1
-        st.success(f"Prebrano {len(data_1)} vrstic z {len(headers_1)} stolpci")
-        
-        # Prikaz raw podatkov
-        with st.expander("Prebrani podatki"):
-            df_preview = pd.DataFrame(data_1)
-            st.dataframe(df_preview)
-        
-        # Mapiranje stolpcev
-        st.subheader("Mapiranje stolpcev za prvi niz")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write("**Izbira koordinatnega sistema:**")
-            coord_system_1 = st.selectbox(
-                "Koordinatni sistem:",
-                options=list(epsgs.keys()),
-                key="coord_sys_1"
-            )
-            
-            st.write("**Koordinatni stolpci:**")
-            x_col_1 = st.selectbox(
-                f"Stolpec za {epsgs[coord_system_1]['x_name']}:",
-                options=[""] + headers_1,
-                key="x_col_1"
-            )
-            y_col_1 = st.selectbox(
-                f"Stolpec za {epsgs[coord_system_1]['y_name']}:",
-                options=[""] + headers_1,
-                key="y_col_1"
-            )
-            
-        with col2:
-            st.write("**Ostali stolpci:**")
-            for header in headers_1:
-                if header not in [x_col_1, y_col_1]:
-                    col_type = st.selectbox(
-                        f"Tip stolpca '{header}':",
-                        options=["besedilo", "številka", "datum"],
-                        key=f"type_{header}_1"
-                    )
-                    column_mapping_1[header] = col_type
-
-# Drugi vnos podatkov
-st.subheader("Drugi niz podatkov (opcijsko)")
-coords_input_2 = st.text_area(
-    "Vnesite dodatne podatke (prva vrstica = imena stolpcev):",
-    height=150,
-    placeholder="Ime\tLon\tLat\tKategorija\nLokacija A\t14.3362\t45.5227\tTurizem",
-    help="Opcijsko - za prikaz dodatnih točk",
-    key="data2"
-)
+datasets = [dataset_input(n) for n in range(1, dataset_count + 1)]
 
-dataset2_columns = []
-dataset2_data = []
-column_mapping_2 = {}
-coord_system_2 = None
-x_col_2 = None
-y_col_2 = None
-display_columns_2 = []
-
-if coords_input_2:
-    headers_2, data_2 = parse_data_with_headers(coords_input_2)
-    if headers_2 and data_2:
-        dataset2_columns = headers_2
-        dataset2_data = data_2
-        st.success(f"Prebrano {len(data_2)} vrstic z {len(headers_2)} stolpci")
-        
-        # Prikaz raw podatkov
-        with st.expander("Prebrani podatki (drugi niz)"):
-            df_preview_2 = pd.DataFrame(data_2)
-            st.dataframe(df_preview_2)
-        
-        # Mapiranje stolpcev
-        st.subheader("Mapiranje stolpcev za drugi niz")
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.write("**Izbira koordinatnega sistema:**")
-            coord_system_2 = st.selectbox(
-                "Koordinatni sistem:",
-                options=list(epsgs.keys()),
-                key="coord_sys_2"
-            )
-            
-            st.write("**Koordinatni stolpci:**")
-            x_col_2 = st.selectbox(
-                f"Stolpec za {epsgs[coord_system_2]['x_name']}:",
-                options=[""] + headers_2,
-                key="x_col_2"
-            )
-            y_col_2 = st.selectbox(
-                f"Stolpec za {epsgs[coord_system_2]['y_name']}:",
-                options=[""] + headers_2,
-                key="y_col_2"
-            )
-            
-        with col2:
-            st.write("**Ostali stolpci:**")
-            for header in headers_2:
-                if header not in [x_col_2, y_col_2]:
-                    col_type = st.selectbox(
-                        f"Tip stolpca '{header}':",
-                        options=["besedilo", "številka", "datum"],
-                        key=f"type_{header}_2"
-                    )
-                    column_mapping_2[header] = col_type
+# Imena nizov morajo biti različna - uporabljajo se v legendi, izbiri in izvozu točk
+used_names = set()
+for dataset in datasets:
+    base_name, suffix = dataset['name'], 2
+    while dataset['name'] in used_names:
+        dataset['name'] = f"{base_name} ({suffix})"
+        suffix += 1
+    used_names.add(dataset['name'])
+
+active_datasets = [
+    dataset for dataset in datasets
+    if dataset['data'] is not None and len(dataset['data']) and dataset['x_col'] and dataset['y_col']
+]
 
 # Prikaz na zemljevidu
-if (dataset1_data and x_col_1 and y_col_1) or (dataset2_data and x_col_2 and y_col_2):
+if active_datasets:
     st.subheader("Prikaz na zemljevidu")
     
     # Prikaži, kateri nizi podatkov so aktivni
-    active_datasets = []
-    if dataset1_data and x_col_1 and y_col_1:
-        active_datasets.append("Prvi niz")
-    if dataset2_data and x_col_2 and y_col_2:
-        active_datasets.append("Drugi niz")
-    
-    if len(active_datasets) == 1:
-        st.info(f"📊 Aktivni niz podatkov: {active_datasets[0]}")
+    active_names = [dataset['name'] for dataset in active_datasets]
+    if len(active_names) == 1:
+        st.info(f"📊 Aktivni niz podatkov: {active_names[0]}")
+    elif len(active_names) == 2:
+        st.info(f"📊 Aktivna niza podatkov: {' in '.join(active_names)}")
     else:
-        st.info(f"📊 Aktivna niza podatkov: {' in '.join(active_datasets)}")
+        st.info(f"📊 Aktivni nizi podatkov: {', '.join(active_names[:-1])} in {active_names[-1]}")
     
     # Izbira stolpcev za prikaz - samo za aktivne nize
-    display_columns_1 = []
-    display_columns_2 = []
-    
-    cols_for_display = st.columns(len(active_datasets) if len(active_datasets) > 1 else 1)
-    
-    col_idx = 0
-    if dataset1_data and x_col_1 and y_col_1:
-        with cols_for_display[col_idx] if len(active_datasets) > 1 else cols_for_display[0]:
-            display_columns_1 = st.multiselect(
-                "Stolpci za prikaz (prvi niz):",
-                options=[col for col in dataset1_columns if col not in [x_col_1, y_col_1]],
-                default=[col for col in dataset1_columns if col not in [x_col_1, y_col_1]][:3],
-                key="display_cols_1"
-            )
-        col_idx += 1
-    
-    if dataset2_data and x_col_2 and y_col_2:
-        with cols_for_display[col_idx] if len(active_datasets) > 1 else cols_for_display[0]:
-            display_columns_2 = st.multiselect(
-                "Stolpci za prikaz (drugi niz):",
-                options=[col for col in dataset2_columns if col not in [x_col_2, y_col_2]],
-                default=[col for col in dataset2_columns if col not in [x_col_2, y_col_2]][:3],
-                key="display_cols_2"
+    display_columns = {}
+    cols_for_display = st.columns(min(len(active_datasets), 4))
+    for i, dataset in enumerate(active_datasets):
+        other_columns = [col for col in dataset['headers'] if col not in [dataset['x_col'], dataset['y_col']]]
+        with cols_for_display[i % len(cols_for_display)]:
+            display_key = f"display_cols_{dataset['prefix'][1:-1]}"
+            st.session_state.setdefault(display_key, other_columns[:3])
+            display_columns[dataset['name']] = st.multiselect(
+                f"Stolpci za prikaz ({dataset['name']}):",
+                options=other_columns,
+                key=display_key
             )
     
-    # Pripravi podatke za zemljevid
-    if (dataset1_data and x_col_1 and y_col_1) or (dataset2_data and x_col_2 and y_col_2):
-        
-        if FOLIUM_AVAILABLE:
-            # Pripravi podatke za Folium - deluje tudi z enim nizom podatkov
-            # Preverimo, če imamo vsaj en popoln niz podatkov
-            has_dataset1 = dataset1_data and x_col_1 and y_col_1 and coord_system_1
-            has_dataset2 = dataset2_data and x_col_2 and y_col_2 and coord_system_2
-            
-            if has_dataset1 or has_dataset2:
-                # Če nimamo drugega niza, poslji None vrednosti
-                if not has_dataset2:
-                    dataset2_data, x_col_2, y_col_2, coord_system_2, display_columns_2 = None, None, None, None, []
-                if not has_dataset1:
-                    dataset1_data, x_col_1, y_col_1, coord_system_1, display_columns_1 = None, None, None, None, []
-                
-                folium_points = prepare_folium_data(
-                    dataset1_data, x_col_1, y_col_1, coord_system_1, display_columns_1,
-                    dataset2_data, x_col_2, y_col_2, coord_system_2, display_columns_2
-                )
-            else:
-                # Če nimamo nobenega popolnega niza podatkov
-                st.warning("Prosim, nastavite koordinatni sistem in stolpce za vsaj en niz podatkov.")
-                folium_points = []
+    # Pripravi podatke za zemljevid - nizi z istim izvornim EPSG se pretvorijo skupaj v enem klicu
+    with diagnostics.stage("point_store") as record:
+        point_store = prepare_point_store(active_datasets)
+        record['rows'] = len(point_store)
+    
+    if save_workspace_requested:
+        save_current_workspace(workspace_status, active_datasets, point_store, display_columns)
+    
+    # Primerjava parov točk dveh nizov - premiki v D96/TM
+    comparison_pairs = None
+    vector_scale = None
+    if len(active_datasets) >= 2:
+        st.subheader("Primerjava nizov")
+        if st.checkbox("Primerjaj pare točk dveh nizov", value=False, key="compare_enabled"):
+            dataset_by_name = {dataset['name']: dataset for dataset in active_datasets}
+            col1, col2 = st.columns(2)
+            with col1:
+                name_a = st.selectbox("Izhodiščni niz (npr. D48):", options=list(dataset_by_name), index=0, key="compare_a")
+            with col2:
+                name_b = st.selectbox("Primerjani niz (npr. D96):", options=list(dataset_by_name), index=1, key="compare_b")
+            dataset_a, dataset_b = dataset_by_name[name_a], dataset_by_name[name_b]
             
-            if folium_points:
-                # Možnosti prikaza zemljevida
-                st.write("**Možnosti prikaza zemljevida:**")
-                
-                col1, col2, col3 = st.columns(3)
+            pairing = st.radio("Določitev parov:", options=COMPARISON_PAIRING_MODES, horizontal=True, key="compare_pairing")
+            id_col_a, id_col_b, max_distance = None, None, DEFAULT_PAIR_DISTANCE
+            if pairing == COMPARISON_PAIRING_MODES[0]:
                 with col1:
-                    map_style = st.selectbox(
-                        "Stil zemljevida:",
-                        options=["OpenStreetMap", "CartoDB positron", "CartoDB dark_matter", "Stamen Terrain", "Stamen Toner"],
-                        key="map_style"
-                    )
-                
+                    id_col_a = st.selectbox(f"ID stolpec ({name_a}):", options=dataset_a['headers'], key="compare_id_a")
                 with col2:
-                    marker_size = st.slider("Velikost označevalcev:", 5, 20, 8, key="marker_size")
-                
-                with col3:
-                    enable_clustering = st.checkbox("Omogoči združevanje točk", value=False, key="enable_clustering")
-                
-                # Izračunaj center zemljevida
-                center_lat = sum(point['lat'] for point in folium_points) / len(folium_points)
-                center_lon = sum(point['lon'] for point in folium_points) / len(folium_points)
-                
-                # Določi zoom level na podlagi razpona koordinat
-                lat_range = max(point['lat'] for point in folium_points) - min(point['lat'] for point in folium_points)
-                lon_range = max(point['lon'] for point in folium_points) - min(point['lon'] for point in folium_points)
-                max_range = max(lat_range, lon_range)
-                
-                if max_range < 0.01:
-                    zoom_level = 14
-                elif max_range < 0.1:
-                    zoom_level = 12
-                elif max_range < 1:
-                    zoom_level = 10
-                else:
-                    zoom_level = 8
-                
-                # Ustvari Folium zemljevid
-                if map_style == "OpenStreetMap":
-                    m = folium.Map(
-                        location=[center_lat, center_lon],
-                        zoom_start=zoom_level,
-                        tiles="OpenStreetMap",
-                        font_size='1rem'
-                    )
-                elif map_style == "CartoDB positron":
-                    m = folium.Map(
-                        location=[center_lat, center_lon],
-                        zoom_start=zoom_level,
-                        tiles="CartoDB positron"
-                    )
-                elif map_style == "CartoDB dark_matter":
-                    m = folium.Map(
-                        location=[center_lat, center_lon],
-                        zoom_start=zoom_level,
-                        tiles="CartoDB dark_matter"
-                    )
-                elif map_style == "Stamen Terrain":
-                    m = folium.Map(
-                        location=[center_lat, center_lon],
-                        zoom_start=zoom_level,
-                        tiles=None
-                    )
-                    folium.TileLayer(
-                        tiles="https://stamen-tiles-{s}.a.ssl.fastly.net/terrain/{z}/{x}/{y}.png",
-                        attr='Map tiles by <a href="http://stamen.com">Stamen Design</a>, '
-                             'under <a href="http://creativecommons.org/licenses/by/3.0">CC BY 3.0</a>. '
-                             'Data by <a href="http://openstreetmap.org">OpenStreetMap</a>, '
-                             'under <a href="http://www.openstreetmap.org/copyright">ODbL</a>.',
-                        name="Stamen Terrain",
-                        overlay=False,
-                        control=True
-                    ).add_to(m)
-                elif map_style == "Stamen Toner":
-                    m = folium.Map(
-                        location=[center_lat, center_lon],
-                        zoom_start=zoom_level,
-                        tiles=None
-                    )
-                    folium.TileLayer(
-                        tiles="https://stamen-tiles-{s}.a.ssl.fastly.net/toner/{z}/{x}/{y}.png",
-                        attr='Map tiles by <a href="http://stamen.com">Stamen Design</a>, '
-                             'under <a href="http://creativecommons.org/licenses/by/3.0">CC BY 3.0</a>. '
-                             'Data by <a href="http://openstreetmap.org">OpenStreetMap</a>, '
-                             'under <a href="http://www.openstreetmap.org/copyright">ODbL</a>.',
-                        name="Stamen Toner",
-                        overlay=False,
-                        control=True
-                    ).add_to(m)
-                
-                # Dodaj označevalce na zemljevid
-                if enable_clustering:
-                    try:
-                        from folium.plugins import MarkerCluster
-                        marker_cluster = MarkerCluster().add_to(m)
-                        parent = marker_cluster
-                    except ImportError:
-                        st.warning("MarkerCluster ni na voljo - prikazujem brez združevanja")
-                        parent = m
-                else:
-                    parent = m
-                
-                for point in folium_points:
-                    folium.CircleMarker(
-                        location=[point['lat'], point['lon']],
-                        radius=marker_size,
-                        popup=folium.Popup(point['popup'], max_width=300),
-                        color=point['color'],
-                        fill=True,
-                        fillColor=point['color'],
-                        fillOpacity=0.7,
-                        weight=2
-                    ).add_to(parent)
-                
-                # Prikaži zemljevid
-                map_data = st_folium(m, width=1100, height=700, returned_objects=["last_object_clicked"])
-                
-                # Dodaj informacije o interakciji
-                st.info("💡 Kliknite na označevalec za prikaz podrobnosti!")
-                
-                # Prikaži informacije o kliku
-                if map_data['last_object_clicked']:
-                    clicked_lat = map_data['last_object_clicked']['lat']
-                    clicked_lon = map_data['last_object_clicked']['lng']
-                    
-                    # Najdi najbližjo točko
-                    closest_point = None
-                    min_distance = float('inf')
-                    
-                    for point in folium_points:
-                        distance = ((point['lat'] - clicked_lat) ** 2 + (point['lon'] - clicked_lon) ** 2) ** 0.5
-                        if distance < min_distance:
-                            min_distance = distance
-                            closest_point = point
-                    
-                    if closest_point and min_distance < 0.001:  # Blizu dovolj
-                        st.success(f"Kliknili ste na: {closest_point['point_id']} ({closest_point['dataset']})")
-                        
-                        col1, col2 = st.columns(2)
-                        with col1:
-                            st.write("**Koordinate:**")
-                            st.write(f"Lat: {closest_point['lat']:.6f}")
-                            st.write(f"Lon: {closest_point['lon']:.6f}")
-                        
-                        with col2:
-                            st.write("**Atributi:**")
-                            for key, value in closest_point.items():
-                                if key.startswith('attr_') and value is not None:
-                                    attr_name = key.replace('attr_', '')
-                                    st.write(f"{attr_name}: {value}")
-                
-                # Legenda - prikaži samo za obstoječe nize
-                st.write("**Legenda:**")
-                legend_items = []
-                if any(point['dataset'] == 'Prvi niz' for point in folium_points):
-                    legend_items.append("🔴 Prvi niz podatkov")
-                if any(point['dataset'] == 'Drugi niz' for point in folium_points):
-                    legend_items.append("🔵 Drugi niz podatkov")
-                
-                if len(legend_items) == 1:
-                    st.markdown(legend_items[0])
-                elif len(legend_items) == 2:
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown(legend_items[0])
-                    with col2:
-                        st.markdown(legend_items[1])
-                
-                # Dodatne možnosti za izbiro več točk
-                st.subheader("Izbira in filtriranje točk")
-                
-                # Multiple choice za izbiro točk
-                available_points = [f"{point['point_id']} ({point['dataset']})" 
-                                  for point in folium_points]
-                
-                selected_points = st.multiselect(
-                    "Izberite točke za podroben prikaz:",
-                    options=available_points,
-                    key="multi_select_points"
+                    id_col_b = st.selectbox(f"ID stolpec ({name_b}):", options=dataset_b['headers'], key="compare_id_b")
+            else:
+                max_distance = st.number_input(
+                    "Največja razdalja med točkama para (m):",
+                    min_value=0.001,
+                    value=DEFAULT_PAIR_DISTANCE,
+                    help="Par sta točki, ki sta si vzajemno najbližji in nista dlje od te razdalje",
+                    key="compare_max_distance"
                 )
-                
-                if selected_points:
-                    st.write(f"**Podrobnosti za {len(selected_points)} izbrane točke:**")
-                    
-                    for selected in selected_points:
-                        point_id = selected.split(' (')[0]
-                        point_data = next((p for p in folium_points if p['point_id'] == point_id), None)
-                        
-                        if point_data:
-                            with st.expander(f"📍 {point_id} - {point_data['dataset']}"):
-                                col1, col2 = st.columns(2)
-                                
-                                with col1:
-                                    st.write("**Koordinate:**")
-                                    st.write(f"Lat: {point_data['lat']:.6f}")
-                                    st.write(f"Lon: {point_data['lon']:.6f}")
-                                
-                                with col2:
-                                    st.write("**Atributi:**")
-                                    for key, value in point_data.items():
-                                        if key.startswith('attr_') and value is not None:
-                                            attr_name = key.replace('attr_', '')
-                                            st.write(f"{attr_name}: {value}")
-                
-                # Dodaj možnost izvoza izbranih točk
-                if selected_points:
-                    selected_data = []
-                    for selected in selected_points:
-                        point_id = selected.split(' (')[0]
-                        point_data = next((p for p in folium_points if p['point_id'] == point_id), None)
-                        
-                        if point_data:
-                            export_row = {
-                                'ID': point_id,
-                                'Dataset': point_data['dataset'],
-                                'Lat': point_data['lat'],
-                                'Lon': point_data['lon']
-                            }
-                            
-                            # Dodaj atribute
-                            for key, value in point_data.items():
-                                if key.startswith('attr_') and value is not None:
-                                    attr_name = key.replace('attr_', '')
-                                    export_row[attr_name] = value
-                            
-                            selected_data.append(export_row)
+            
+            if name_a == name_b:
+                st.warning("Za primerjavo izberite dva različna niza.")
+            else:
+                with diagnostics.stage("compare") as record:
+                    comparison_pairs = cached_compare_points(dataset_a, dataset_b, id_col_a, id_col_b, max_distance)
+                    record['rows'] = len(comparison_pairs)
+                st.write(f"**Parov točk: {len(comparison_pairs)}** (premiki iz niza {name_a} v niz {name_b}, v metrih)")
+                if len(comparison_pairs):
+                    st.dataframe(displacement_statistics(comparison_pairs).round(4), width='stretch')
+                    st.caption(f"Povprečna smer premika: {mean_bearing(comparison_pairs):.1f}° (od severa v smeri urinega kazalca)")
+                    vector_scale = st.number_input(
+                        "Povečava vektorjev premikov na zemljevidu:",
+                        min_value=1,
+                        value=1,
+                        step=10,
+                        key="compare_vector_scale"
+                    )
                     
-                    if st.button("📥 Prikaži izbrane točke v tabeli"):
-                        export_df = pd.DataFrame(selected_data)
-                        st.dataframe(export_df, width='stretch')
-                        
-                        # Možnost download-a
-                        csv = export_df.to_csv(index=False)
+                    if st.button("📥 Pripravi pare točk za prenos", key="compare_export"):
+                        pairs_export = comparison_pairs.rename(columns={
+                            'x_a': 'E_A', 'y_a': 'N_A', 'x_b': 'E_B', 'y_b': 'N_B',
+                            'delta_x': 'dE', 'delta_y': 'dN', 'distance': 'razdalja', 'bearing': 'smer'
+                        })
+                        pairs_export.insert(0, 'ID_B', dataset_b['prefix'] + pairs_export['row_id_b'].astype(str))
+                        pairs_export.insert(0, 'ID_A', dataset_a['prefix'] + pairs_export['row_id_a'].astype(str))
                         st.download_button(
                             label="⬇️ Prenesi CSV",
-                            data=csv,
-                            file_name="izbrane_tocke.csv",
-                            mime="text/csv"
+                            data=pairs_export.to_csv(index=False),
+                            file_name="primerjava_parov.csv",
+                            mime="text/csv",
+                            key="compare_download"
                         )
-            else:
-                st.warning("Ni podatkov za prikaz na zemljevidu")
-        
-        else:
-            # Fallback na osnovni st.map če Folium ni na voljo
-            st.warning("⚠️ Folium ni na voljo. Uporabljam osnoven zemljevid brez interaktivnih funkcij.")
-            
-            map_data_list = []
-            
-            # Prvi niz podatkov
-            if dataset1_data and x_col_1 and y_col_1 and coord_system_1:
-                converted_data_1 = convert_coordinates_from_data(
-                    dataset1_data, x_col_1, y_col_1, 
-                    epsgs[coord_system_1]["code"], 4326
-                )
-                
-                for row in converted_data_1:
-                    if 'converted_x' in row and 'converted_y' in row:
-                        map_data_list.append({
-                            'lat': row['converted_y'],
-                            'lon': row['converted_x'],
-                            'color': [255, 0, 0, 160],
-                            'size': 100
-                        })
-            
-            # Drugi niz podatkov
-            if dataset2_data and x_col_2 and y_col_2 and coord_system_2:
-                converted_data_2 = convert_coordinates_from_data(
-                    dataset2_data, x_col_2, y_col_2, 
-                    epsgs[coord_system_2]["code"], 4326
-                )
-                
-                for row in converted_data_2:
-                    if 'converted_x' in row and 'converted_y' in row:
-                        map_data_list.append({
-                            'lat': row['converted_y'],
-                            'lon': row['converted_x'],
-                            'color': [0, 0, 255, 160],
-                            'size': 100
-                        })
-            
-            if map_data_list:
-                map_df = pd.DataFrame(map_data_list)
-                st.map(map_df, zoom=12, size='size', color='color')
-                
-                # Legenda - prikaži samo za obstoječe nize
-                st.write("**Legenda:**")
-                legend_items = []
-                if dataset1_data and x_col_1 and y_col_1 and coord_system_1:
-                    legend_items.append("🔴 Prvi niz podatkov")
-                if dataset2_data and x_col_2 and y_col_2 and coord_system_2:
-                    legend_items.append("🔵 Drugi niz podatkov")
-                
-                if len(legend_items) == 1:
-                    st.markdown(legend_items[0])
-                elif len(legend_items) == 2:
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        st.markdown(legend_items[0])
-                    with col2:
-                        st.markdown(legend_items[1])
-            else:
-                st.warning("Ni podatkov za prikaz na zemljevidu")
     
+    filtered_indices = None
+    if len(point_store):
+        filtered_indices = show_filters(point_store, point_store_cache_key(active_datasets))
+    
+    if not len(point_store):
+        st.warning("Ni podatkov za prikaz na zemljevidu")
+    elif FOLIUM_AVAILABLE:
+        # Knjižnice zemljevida se naložijo šele, ko je kaj prikazati (enkrat na proces)
+        import folium
+        from streamlit_folium import st_folium
+        from map_layers import CANVAS_RENDER_THRESHOLD, PointLayer, encode_points
+        
+        # Zemljevid in izbira točk se ob interakciji izvajata ločeno od vnosa in pretvorbe
+        show_map(point_store, comparison_pairs, vector_scale, display_columns, filtered_indices)
+        show_point_selection(point_store, filtered_indices)
     else:
-        st.info("Vnesite podatke in označite koordinatne stolpce za začetek dela")
+        # Fallback na osnovni st.map če Folium ni na voljo
+        st.warning("⚠️ Folium ni na voljo. Uporabljam osnoven zemljevid brez interaktivnih funkcij.")
+        
+        # Barva niza s prosojnostjo (#rrggbbaa) za vsako (filtrirano) točko
+        shown_indices = np.arange(len(point_store)) if filtered_indices is None else filtered_indices
+        point_colors = np.array([dataset['color'] + 'a0' for dataset in point_store.datasets])
+        map_df = pd.DataFrame({
+            'lat': point_store.lat[shown_indices],
+            'lon': point_store.lon[shown_indices],
+            'color': point_colors[point_store.dataset[shown_indices]],
+            'size': 100
+        })
+        st.map(map_df, zoom=12, size='size', color='color')
+        
+        show_legend(point_store, filtered_indices)
+        show_export(point_store, filtered_indices=filtered_indices)
+
+else:
+    st.info("Vnesite podatke in označite koordinatne stolpce za začetek dela")
+    if save_workspace_requested:
+        workspace_status.warning("Ni aktivnih nizov za shranjevanje")
+
+# Meritve stopenj tega zagona - prikaz in zapis v dnevnik
+show_diagnostics(diagnostics, "zagona", section="page")
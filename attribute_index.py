@@ -0,0 +1,122 @@
+"""Indeksi atributov točk za filtriranje brez pregleda vseh vrstic
+
+Številski in datumski stolpci imajo razvrščen indeks (razpon vrednosti se poišče z
+bisekcijo), besedilni stolpci pa obrnjen indeks (za vsako različno vrednost položaji
+točk, ki jo imajo). Poizvedba vrne naraščajoče položaje točk v shrambi (PointStore),
+zato se rezultati več pogojev združijo s presekom.
+"""
+import numpy as np
+import pandas as pd
+
+from conversion import parse_date_array, parse_number_array
+from point_store import is_typed_column
+
+TEXT_OPERATORS = ["vsebuje", "je enako", "ne vsebuje"]
+RANGE_OPERATORS = ["=", "≥", ">", "≤", "<"]
+# Dan v nanosekundah - datum brez ure pri datumskem stolpcu pomeni cel dan
+DAY_NS = 86_400 * 10**9
+
+class SortedIndex:
+    """Razvrščen indeks številskega ali datumskega stolpca (prazne vrednosti niso v indeksu)"""
+
+    operators = RANGE_OPERATORS
+
+    def __init__(self, values):
+        self.is_date = pd.api.types.is_datetime64_any_dtype(values.dtype)
+        if self.is_date:
+            keys = values.to_numpy(dtype='datetime64[ns]').view('int64')
+        else:
+            keys = values.to_numpy(dtype='float64', na_value=np.nan)
+        present = np.flatnonzero(~values.isna().to_numpy())
+        self.order = present[np.argsort(keys[present], kind='stable')]
+        self.keys = keys[self.order]
+
+    @property
+    def nbytes(self):
+        return self.order.nbytes + self.keys.nbytes
+
+    def parse(self, text):
+        """Vrednost poizvedbe iz besedila - (spodnja, zgornja meja) intervala [spodnja, zgornja) ali None"""
+        if self.is_date:
+            value = parse_date_array([text])[0]
+            if np.isnat(value):
+                return None
+            start = int(value.astype('datetime64[ns]').view('int64'))
+            # Datum brez ure zajame cel dan
+            return (start, start + DAY_NS) if start % DAY_NS == 0 else (start, start + 1)
+        value = float(parse_number_array([text])[0])
+        if np.isnan(value):
+            return None
+        return value, np.nextafter(value, np.inf)
+
+    def query(self, operator, text):
+        """Naraščajoči položaji točk, ki izpolnjujejo pogoj, ali None, če vrednosti ni mogoče prebrati"""
+        bounds = self.parse(text)
+        if bounds is None:
+            return None
+        low, high = bounds
+        start, end = {
+            "=": (np.searchsorted(self.keys, low, side='left'), np.searchsorted(self.keys, high, side='left')),
+            "≥": (np.searchsorted(self.keys, low, side='left'), len(self.keys)),
+            ">": (np.searchsorted(self.keys, high, side='left'), len(self.keys)),
+            "≤": (0, np.searchsorted(self.keys, high, side='left')),
+            "<": (0, np.searchsorted(self.keys, low, side='left')),
+        }[operator]
+        return np.sort(self.order[start:end])
+
+class InvertedIndex:
+    """Obrnjen indeks besedilnega stolpca - položaji točk so razvrščeni po vrednosti"""
+
+    operators = TEXT_OPERATORS
+
+    def __init__(self, values):
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            codes, categories = values.cat.codes.to_numpy(), values.cat.categories
+        else:
+            codes, categories = pd.factorize(values)
+        # Vrednosti brez razlikovanja velikih in malih črk - pripravijo se enkrat ob gradnji
+        self.categories = pd.Series(categories, dtype=str).str.casefold()
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.categories))
+        order = np.argsort(codes, kind='stable')
+        # Prazne vrednosti (koda -1) so na začetku razvrščenih položajev
+        self.order = order[len(codes) - int(counts.sum()):]
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    @property
+    def nbytes(self):
+        return self.order.nbytes + self.offsets.nbytes + int(self.categories.memory_usage(deep=True))
+
+    def positions(self, matched):
+        """Naraščajoči položaji točk z vrednostmi na danih položajih kategorij"""
+        starts = self.offsets[matched]
+        counts = self.offsets[np.asarray(matched) + 1] - starts
+        # Vsi intervali razvrščenih položajev kot eno ploščato polje
+        positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+        return np.sort(self.order[positions])
+
+    def query(self, operator, text):
+        """Naraščajoči položaji točk, ki izpolnjujejo pogoj (primerjava brez razlikovanja velikih in malih črk)"""
+        text = text.strip().casefold()
+        if operator == "je enako":
+            return self.positions(np.flatnonzero(self.categories.eq(text).to_numpy()))
+        contains = self.categories.str.contains(text, regex=False).to_numpy()
+        if operator == "vsebuje":
+            return self.positions(np.flatnonzero(contains))
+        # "ne vsebuje": neprazne vrednosti brez iskanega niza
+        return self.positions(np.flatnonzero(~contains))
+
+def build_column_index(values):
+    """Indeks stolpca atributov glede na tip stolpca"""
+    return SortedIndex(values) if is_typed_column(values) else InvertedIndex(values)
+
+def intersect_positions(parts, n_points):
+    """Presek naraščajočih položajev več pogojev (brez pogojev vse točke)"""
+    if not parts:
+        return np.arange(n_points, dtype=np.int64)
+    parts = sorted(parts, key=len)
+    result = parts[0]
+    for positions in parts[1:]:
+        result = np.intersect1d(result, positions, assume_unique=True)
+        if not len(result):
+            break
+    return result
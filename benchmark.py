@@ -0,0 +1,342 @@
+"""Ponovljive meritve hitrosti in porabe pomnilnika po stopnjah obdelave
+
+Za vsak sistem iz epsgs in vsako velikost se ustvari sintetični niz slovenskih
+točk (vedno enak za isto seme), nato pa se izmerijo stopnje, ki jih izvede
+aplikacija: branje besedila, pretvorba v WGS84, pretvorba stolpcev v tipe, stolpčna shramba točk, HTML
+zemljevida (brez podlag, zato brez omrežja), iskanje točke ob kliku, izvoz CSV ter
+shranjevanje in ponovno odpiranje delovnega prostora.
+Z --startup se izmerita še čas do prvega izrisa aplikacije v novem procesu in
+poraba pomnilnika na dodatno sejo. Rezultati se zapišejo v JSON, ki ga lahko
+primerjate z rezultati drugega commita.
+
+Primer:
+    python benchmark.py --sizes 1000 10000 -o rezultati.json
+    python benchmark.py --sizes 1000 10000 --compare rezultati.json
+    python benchmark.py --sizes 1000 --startup
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import folium
+import numpy as np
+import pandas as pd
+import pyproj
+
+from conversion import (
+    epsgs,
+    coerce_columns,
+    convert_coordinates_from_data,
+    coordinate_labels,
+    parse_data_with_headers,
+    transform_coordinates,
+)
+from export import export_bytes
+from map_layers import PointLayer, encode_points
+from point_store import PointStore
+from spatial_index import GridIndex
+from workspace import Workspace, save_workspace
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_SEED = 3912
+# Število simuliranih klikov na zemljevid na meritev
+CLICK_QUERIES = 1_000
+CLICK_MAX_DISTANCE_M = 100
+# Okvir Slovenije v WGS84 (zahod, jug, vzhod, sever)
+SLOVENIA_BOUNDS = (13.4, 45.45, 16.55, 46.85)
+MUNICIPALITIES = ["Ljubljana", "Maribor", "Celje", "Kranj", "Koper", "Novo mesto",
+                  "Velenje", "Nova Gorica", "Murska Sobota", "Ptuj", "Škofja Loka", "Žalec"]
+# Tipi stolpcev sintetičnega niza (ostali stolpci so besedilo)
+COLUMN_MAPPING = {"Višina": "številka"}
+STAGES = ["parse", "convert", "coerce", "point_store", "map_html", "click", "export", "workspace_save", "workspace_open"]
+# Število dodatnih sej pri merjenju pomnilnika na sejo (--startup)
+STARTUP_SESSIONS = 5
+# Sprememba časa (razmerje), nad katero --compare označi regresijo
+REGRESSION_RATIO = 1.2
+
+def synthetic_text(epsg, rows, seed=DEFAULT_SEED):
+    """Sintetični niz točk v Sloveniji kot besedilo z glavo (tabulatorji), kot ga vnese uporabnik"""
+    rng = np.random.default_rng(seed)
+    west, south, east, north = SLOVENIA_BOUNDS
+    lon = rng.uniform(west, east, rows)
+    lat = rng.uniform(south, north, rows)
+    east_label, north_label = coordinate_labels(epsg)
+    if epsg == 4326:
+        columns = {east_label: np.round(lon, 7), north_label: np.round(lat, 7)}
+    else:
+        x, y = transform_coordinates(lon, lat, 4326, epsg)
+        # Izhod v 3912 je (sever, vzhod)
+        east, north = (y, x) if epsg == 3912 else (x, y)
+        columns = {east_label: np.round(east, 2), north_label: np.round(north, 2)}
+    frame = pd.DataFrame({
+        "ID": np.arange(1, rows + 1),
+        **columns,
+        "Opis": [f"Točka {n}" for n in range(1, rows + 1)],
+        "Občina": np.array(MUNICIPALITIES)[rng.integers(0, len(MUNICIPALITIES), rows)],
+        "Višina": np.round(rng.uniform(0, 2800, rows), 1),
+    })
+    return frame.to_csv(sep="\t", index=False, lineterminator="\n")
+
+def build_map_html(point_store):
+    """HTML zemljevida z vsemi točkami kot v aplikaciji, brez podlag (brez omrežja)"""
+    m = folium.Map(location=[float(np.mean(point_store.lat)), float(np.mean(point_store.lon))],
+                   zoom_start=8, tiles=None)
+    data = encode_points(point_store.lat, point_store.lon, point_store.dataset,
+                         [dataset["color"] for dataset in point_store.datasets], point_store.point_ids())
+    point_layer = folium.FeatureGroup(name="Točke").add_to(m)
+    PointLayer(data, n_points=len(point_store)).add_to(point_layer)
+    return m.get_root().render()
+
+def simulate_clicks(point_store, seed=DEFAULT_SEED):
+    """Prostorski indeks in CLICK_QUERIES klikov blizu naključnih točk - vrne število zadetkov"""
+    rng = np.random.default_rng(seed)
+    point_index = GridIndex.from_lonlat(point_store.lon, point_store.lat)
+    targets = rng.integers(0, len(point_store), CLICK_QUERIES)
+    hits = 0
+    for target in targets:
+        indices, _ = point_index.nearest_lonlat(point_store.lon[target] + 1e-5, point_store.lat[target],
+                                                max_distance=CLICK_MAX_DISTANCE_M)
+        if len(indices):
+            point_store.attributes_of(int(indices[0]))
+            hits += 1
+    return hits
+
+def export_csv(point_store):
+    """CSV izvoz vseh točk po kosih kot pri izvozu v aplikaciji (v začasno datoteko)"""
+    return len(export_bytes("CSV", point_store, np.arange(len(point_store))))
+
+def workspace_dataset(epsg, data):
+    """Niz v obliki, kot ga vrne vnos v aplikaciji, za shranjevanje v delovni prostor"""
+    x_col, y_col = coordinate_labels(epsg)
+    return {
+        "name": "Prvi niz", "color": "#ff0000", "prefix": "P1-",
+        "coord_system": next(name for name, definition in epsgs.items() if definition["code"] == epsg),
+        "from_epsg": epsg, "x_col": x_col, "y_col": y_col,
+        "headers": [col for col in data.columns if col != "row_id"], "column_mapping": COLUMN_MAPPING, "data": data,
+    }
+
+def reopen_workspace(path):
+    """Odpre delovni prostor kot aplikacija: shramba točk in prebrani podatki nizov"""
+    workspace = Workspace.open(path)
+    return workspace.point_store(), [workspace.dataset_frame(i) for i in range(len(workspace))]
+
+def measure(function, *args, repeat=1, memory=True):
+    """Najkrajši čas izmed repeat ponovitev in (opcijsko) vrh porabe pomnilnika v ločeni ponovitvi
+
+    Pomnilnik se meri s tracemalloc (tudi polja numpy in pandas), ki upočasni izvajanje,
+    zato se ne meri hkrati s časom. Vrne (rezultat, sekunde, vrh v bajtih ali None).
+    """
+    seconds = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = function(*args)
+        seconds.append(time.perf_counter() - start)
+    peak = None
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        function(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result, min(seconds), peak
+
+def run_benchmarks(sizes, epsg_codes, repeat=1, memory=True, seed=DEFAULT_SEED, stages=STAGES, log=None):
+    """Izvede vse stopnje za vse sisteme in velikosti - vrne seznam rezultatov (slovarjev)"""
+    results = []
+    for epsg in epsg_codes:
+        x_col, y_col = coordinate_labels(epsg)
+        for rows in sizes:
+            text = synthetic_text(epsg, rows, seed)
+
+            def record(stage, function, *args):
+                result, seconds, peak = measure(function, *args, repeat=repeat, memory=memory)
+                results.append({"stage": stage, "epsg": epsg, "rows": rows,
+                                "seconds": seconds, "peak_bytes": peak})
+                if log:
+                    peak_text = f", vrh {peak / 2**20:.1f} MiB" if peak is not None else ""
+                    print(f"{epsg} {rows:>9} {stage:<14} {seconds:8.3f} s{peak_text}", file=log)
+                return result
+
+            # Vsaka stopnja potrebuje rezultat prejšnje, zato se izvedejo vse, zapišejo pa samo izbrane
+            def stage(name, function, *args):
+                if name in stages:
+                    return record(name, function, *args)
+                return function(*args)
+
+            _, data, _ = stage("parse", parse_data_with_headers, text)
+            converted = stage("convert", convert_coordinates_from_data, data, x_col, y_col, epsg, 4326)
+            converted, _ = stage("coerce", coerce_columns, converted, COLUMN_MAPPING)
+            point_store = stage("point_store", PointStore.from_frames,
+                                [("Prvi niz", "#ff0000", "P1-", epsg, converted)])
+            for name, function in (("map_html", build_map_html), ("click", simulate_clicks),
+                                   ("export", export_csv)):
+                if name in stages:
+                    record(name, function, point_store)
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "delovni_prostor.arrow")
+                stage("workspace_save", save_workspace, path, [workspace_dataset(epsg, data)], point_store)
+                stage("workspace_open", reopen_workspace, path)
+            del text, data, converted, point_store
+    return results
+
+# Izvede se v novem procesu: prvi zagon aplikacije (prazna stran) in nato dodatne seje
+_STARTUP_SCRIPT = """
+import json, resource, sys, time
+start = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+
+def rss():
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+harness_seconds = time.perf_counter() - start
+harness_rss = rss()
+app = AppTest.from_file(sys.argv[1], default_timeout=600)
+run_start = time.perf_counter()
+app.run()
+first_run = time.perf_counter() - run_start
+first_rss = rss()
+sessions = [AppTest.from_file(sys.argv[1], default_timeout=600) for _ in range(int(sys.argv[2]))]
+run_start = time.perf_counter()
+for session in sessions:
+    session.run()
+print(json.dumps({
+    'first_paint_seconds': first_run,
+    'next_session_seconds': (time.perf_counter() - run_start) / max(len(sessions), 1),
+    'harness_seconds': harness_seconds,
+    'first_session_bytes': first_rss - harness_rss,
+    'session_bytes': (rss() - first_rss) / max(len(sessions), 1),
+    'exceptions': [str(e.value) for e in app.exception],
+}))
+"""
+
+def measure_startup(app_path="app.py", sessions=STARTUP_SESSIONS):
+    """Čas do prvega izrisa prazne aplikacije v novem procesu in pomnilnik na sejo (Streamlit AppTest)
+
+    Čas prvega zagona vključuje uvoz vseh modulov, ki jih aplikacija potrebuje za prazno stran,
+    ne pa zagona Streamlita samega (harness_seconds). Pomnilnik na sejo je prirastek RSS na
+    vsako dodatno sejo.
+    """
+    app_path = os.path.abspath(app_path)
+    completed = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT, app_path, str(sessions)],
+                               capture_output=True, text=True, check=True, cwd=os.path.dirname(app_path))
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def git_commit():
+    """Trenutni commit (kratek hash) ali None zunaj repozitorija git"""
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def environment():
+    """Okolje meritve - za primerjavo rezultatov z istega računalnika"""
+    return {
+        "commit": git_commit(),
+        "time": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "pyproj": pyproj.__version__,
+        "folium": folium.__version__,
+    }
+
+def compare_results(baseline, current):
+    """Primerjava z rezultati prejšnje meritve - vrstice (stopnja, epsg, vrstice, prej, zdaj, razmerje)"""
+    previous = {(r["stage"], r["epsg"], r["rows"]): r["seconds"] for r in baseline["results"]}
+    rows = []
+    for r in current["results"]:
+        before = previous.get((r["stage"], r["epsg"], r["rows"]))
+        if before:
+            rows.append((r["stage"], r["epsg"], r["rows"], before, r["seconds"], r["seconds"] / before))
+    return rows
+
+def format_comparison(rows, baseline_commit):
+    lines = [f"Primerjava z {baseline_commit or 'prejšnjo meritvijo'} (razmerje časov zdaj/prej):"]
+    for stage, epsg, size, before, after, ratio in rows:
+        flag = "  REGRESIJA" if ratio > REGRESSION_RATIO else ""
+        lines.append(f"{epsg} {size:>9} {stage:<14} {before:8.3f} s -> {after:8.3f} s  x{ratio:.2f}{flag}")
+    return "\n".join(lines)
+
+def parse_args(argv=None):
+    codes = sorted(definition["code"] for definition in epsgs.values())
+    parser = argparse.ArgumentParser(
+        description="Meritve hitrosti in pomnilnika za branje, pretvorbo, zemljevid, klik in izvoz."
+    )
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                        help=f"število točk v nizih (privzeto {' '.join(map(str, DEFAULT_SIZES))})")
+    parser.add_argument("--epsg", type=int, nargs="+", default=codes, choices=codes,
+                        help="izvorni sistemi (privzeto vsi iz epsgs)")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES,
+                        help="merjene stopnje (privzeto vse)")
+    parser.add_argument("--repeat", type=int, default=1,
+                        help="število ponovitev za čas, uporabi se najkrajši (privzeto 1)")
+    parser.add_argument("--no-memory", action="store_true",
+                        help="brez merjenja vrha porabe pomnilnika (hitrejše)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED, help="seme sintetičnih podatkov")
+    parser.add_argument("-o", "--output", default="-",
+                        help="datoteka JSON z rezultati (privzeto standardni izhod)")
+    parser.add_argument("--compare", help="datoteka JSON prejšnje meritve za primerjavo časov")
+    parser.add_argument("--startup", action="store_true",
+                        help="izmeri tudi čas do prvega izrisa aplikacije in pomnilnik na sejo")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    baseline = None
+    if args.compare:
+        try:
+            with open(args.compare, encoding="utf-8") as baseline_file:
+                baseline = json.load(baseline_file)
+        except (OSError, ValueError) as e:
+            print(f"Napaka: {e}", file=sys.stderr)
+            return 1
+
+    report = {
+        "environment": environment(),
+        "settings": {"sizes": args.sizes, "epsg": args.epsg, "repeat": args.repeat,
+                     "memory": not args.no_memory, "seed": args.seed, "click_queries": CLICK_QUERIES},
+        "results": run_benchmarks(args.sizes, args.epsg, repeat=args.repeat, memory=not args.no_memory,
+                                  seed=args.seed, stages=args.stages, log=sys.stderr),
+    }
+    if args.startup:
+        try:
+            report["startup"] = measure_startup()
+        except (OSError, subprocess.CalledProcessError, ValueError) as e:
+            print(f"Napaka pri merjenju zagona: {e}", file=sys.stderr)
+            return 1
+        startup = report["startup"]
+        print(f"Prvi izris {startup['first_paint_seconds']:.2f} s, naslednja seja "
+              f"{startup['next_session_seconds']:.2f} s, pomnilnik prve seje "
+              f"{startup['first_session_bytes'] / 2**20:.1f} MiB, dodatne seje "
+              f"{startup['session_bytes'] / 2**20:.1f} MiB", file=sys.stderr)
+
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output == "-":
+        print(output)
+    else:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+
+    if baseline is not None:
+        print(format_comparison(compare_results(baseline, report), baseline["environment"].get("commit")),
+              file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
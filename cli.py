@@ -0,0 +1,162 @@
+"""Paketna pretvorba koordinat D48/D96/WGS84 iz ukazne vrstice
+
+Uporablja iste definicije epsgs in isto pretvorbo kot aplikacija, zato so
+rezultati enaki kot v Streamlit vmesniku. Podatki se berejo in zapisujejo v
+paketih, tako da poraba pomnilnika ni odvisna od velikosti vhoda.
+
+Primer:
+    python cli.py --from 3912 --to 3794 < tocke_d48.txt > tocke_d96.txt
+"""
+import argparse
+import itertools
+import sys
+import time
+
+from conversion import (
+    PARALLEL_MIN_POINTS,
+    epsgs,
+    convert_coordinates_from_data,
+    coordinate_labels,
+    iter_text_chunks,
+    load_triangle_model,
+    sniff_delimiter,
+    split_header_line,
+)
+
+DEFAULT_BATCH_ROWS = 100_000
+EPSG_BY_CODE = {definition["code"]: definition for definition in epsgs.values()}
+
+def default_coordinate_columns(epsg):
+    """Privzeta stolpca (vzhod, sever) za izvorni sistem - oznake iz epsgs"""
+    return coordinate_labels(epsg)
+
+def output_columns(headers, to_epsg):
+    """Imena stolpcev za pretvorjene koordinate - oznake ciljnega sistema iz epsgs"""
+    target = EPSG_BY_CODE[to_epsg]
+    columns = []
+    for label in (target["x_label"], target["y_label"]):
+        # Če vhod že ima stolpec s tem imenom, dodamo kodo EPSG
+        columns.append(label if label not in headers else f"{label}_{to_epsg}")
+    return columns
+
+def convert_stream(input_stream, output_stream, from_epsg, to_epsg, x_col=None, y_col=None,
+                   batch_rows=DEFAULT_BATCH_ROWS, output_delimiter=None, workers=1, chunk_points=None,
+                   model=None):
+    """Pretvori vhodni tok v izhodni tok po paketih in vrne statistiko obdelave"""
+    lines = iter(input_stream)
+    header_line = next(lines, "")
+    delimiter = sniff_delimiter(header_line)
+    headers = split_header_line(header_line.strip(), delimiter)
+    
+    default_x_col, default_y_col = default_coordinate_columns(from_epsg)
+    x_col = x_col or default_x_col
+    y_col = y_col or default_y_col
+    missing = [col for col in (x_col, y_col) if col not in headers]
+    if missing:
+        raise ValueError(f"V glavi ni stolpcev: {', '.join(missing)} (na voljo: {', '.join(headers)})")
+    
+    converted_x_col, converted_y_col = output_columns(headers, to_epsg)
+    sep = output_delimiter or delimiter or "\t"
+    stats = {"rows_read": 0, "rows_written": 0, "bad_rows": 0, "invalid_coordinates": 0, "first_bad_lines": []}
+    
+    start = time.perf_counter()
+    write_header = True
+    for _, chunk, bad_rows in iter_text_chunks(itertools.chain([header_line], lines), batch_rows):
+        converted = convert_coordinates_from_data(
+            chunk, x_col, y_col, from_epsg, to_epsg, workers=workers, chunk_points=chunk_points, model=model
+        )
+        
+        stats["rows_read"] += len(chunk) + len(bad_rows)
+        stats["bad_rows"] += len(bad_rows)
+        stats["invalid_coordinates"] += len(chunk) - len(converted)
+        stats["first_bad_lines"].extend(line_no for line_no, _ in bad_rows[:10 - len(stats["first_bad_lines"])])
+        if not len(converted):
+            continue
+        
+        output = converted[headers].copy()
+        output[converted_x_col] = converted["converted_x"]
+        output[converted_y_col] = converted["converted_y"]
+        output.to_csv(output_stream, sep=sep, index=False, header=write_header, lineterminator="\n")
+        write_header = False
+        stats["rows_written"] += len(output)
+    
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+def format_stats(stats):
+    """Povzetek obdelave za standardni izhod napak"""
+    rate = stats["rows_read"] / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    lines = [
+        f"Prebranih vrstic: {stats['rows_read']}",
+        f"Zapisanih vrstic: {stats['rows_written']}",
+        f"Vrstice s premalo stolpci: {stats['bad_rows']}",
+        f"Vrstice z neveljavnimi koordinatami: {stats['invalid_coordinates']}",
+        f"Čas: {stats['seconds']:.2f} s ({rate:,.0f} vrstic/s)",
+    ]
+    if stats["first_bad_lines"]:
+        lines.append(f"Prve izpuščene vrstice: {', '.join(map(str, stats['first_bad_lines']))}")
+    return "\n".join(lines)
+
+def parse_args(argv=None):
+    codes = sorted(EPSG_BY_CODE)
+    parser = argparse.ArgumentParser(
+        description="Paketna pretvorba koordinat med sistemi WGS84 (4326), D48/GK (3912) in D96/TM (3794)."
+    )
+    parser.add_argument("--from", dest="from_epsg", type=int, required=True, choices=codes,
+                        help="EPSG koda vhodnih koordinat")
+    parser.add_argument("--to", dest="to_epsg", type=int, required=True, choices=codes,
+                        help="EPSG koda izhodnih koordinat")
+    parser.add_argument("-i", "--input", default="-",
+                        help="vhodna datoteka (privzeto standardni vhod)")
+    parser.add_argument("-o", "--output", default="-",
+                        help="izhodna datoteka (privzeto standardni izhod)")
+    parser.add_argument("--x-col", help="stolpec z vzhodno koordinato oz. dolžino (privzeto GKY, E ali Lon)")
+    parser.add_argument("--y-col", help="stolpec s severno koordinato oz. širino (privzeto GKX, N ali Lat)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_ROWS,
+                        help=f"število vrstic v paketu (privzeto {DEFAULT_BATCH_ROWS})")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="število procesov za pretvorbo, 0 = vsa jedra (privzeto 1); "
+                             f"vzporedno se pretvarjajo paketi z vsaj {PARALLEL_MIN_POINTS} točkami")
+    parser.add_argument("--chunk-points", type=int,
+                        help="velikost kosa za posamezen proces (privzeto paket enakomerno razdeljen)")
+    parser.add_argument("--delimiter", choices=["tab", ";", ","],
+                        help="ločilo v izhodu (privzeto enako kot v vhodu)")
+    parser.add_argument("--encoding", default="utf-8-sig", help="kodna tabela vhoda (privzeto utf-8-sig)")
+    parser.add_argument("--model",
+                        help="datoteka trikotniškega modela D48/GK -> D96/TM; pretvorbe iz ali v 3912 "
+                             "gredo prek modela, točke zunaj modela pa prek parametrov EPSG")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    output_delimiter = "\t" if args.delimiter == "tab" else args.delimiter
+    
+    if args.input == "-":
+        sys.stdin.reconfigure(encoding=args.encoding, newline="")
+        input_stream = sys.stdin
+    else:
+        input_stream = open(args.input, encoding=args.encoding, errors="replace", newline="")
+    output_stream = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8", newline="")
+    
+    try:
+        model = load_triangle_model(args.model) if args.model else None
+        stats = convert_stream(
+            input_stream, output_stream, args.from_epsg, args.to_epsg,
+            x_col=args.x_col, y_col=args.y_col,
+            batch_rows=args.batch_size, output_delimiter=output_delimiter,
+            workers=args.workers, chunk_points=args.chunk_points, model=model,
+        )
+    except (OSError, ValueError) as e:
+        print(f"Napaka: {e}", file=sys.stderr)
+        return 1
+    finally:
+        if input_stream is not sys.stdin:
+            input_stream.close()
+        if output_stream is not sys.stdout:
+            output_stream.close()
+    
+    print(format_stats(stats), file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
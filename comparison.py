@@ -0,0 +1,107 @@
+"""Primerjava parov točk dveh nizov (npr. stara izmera D48 in nova izmera D96)
+
+Oba niza se primerjata v projiciranem sistemu D96/TM (EPSG:3794), zato so premiki
+ΔE/ΔN in razdalje v metrih. Pari se določijo po ID stolpcu ali kot vzajemno
+najbližji točki prek mrežnega prostorskega indeksa; vsi izračuni so vektorizirani.
+"""
+import numpy as np
+import pandas as pd
+
+from spatial_index import GridIndex
+
+# Sistem, v katerem se računajo premiki
+COMPARISON_EPSG = 3794
+# Privzeta največja razdalja (m) med točkama para pri iskanju najbližje točke
+DEFAULT_PAIR_DISTANCE = 10.0
+# Percentili v povzetku premikov
+STATISTICS_PERCENTILES = [50, 95, 99]
+
+def pair_by_id(ids_a, ids_b):
+    """Pari po enakem ID (brez presledkov na robovih) - vrne (indeksi v A, indeksi v B)
+
+    Če se ID v nizu B ponovi, se uporabi njegova prva pojavitev.
+    """
+    ids_a = pd.Series(ids_a).astype(str).str.strip()
+    ids_b = pd.Series(ids_b).astype(str).str.strip()
+    first_b = ~ids_b.duplicated().to_numpy()
+    positions = pd.Index(ids_b[first_b]).get_indexer(ids_a)
+    matched = positions >= 0
+    return np.flatnonzero(matched), np.flatnonzero(first_b)[positions[matched]]
+
+def pair_by_nearest(x_a, y_a, x_b, y_b, max_distance=DEFAULT_PAIR_DISTANCE):
+    """Pari vzajemno najbližjih točk znotraj max_distance (m) - vrne (indeksi v A, indeksi v B)
+
+    Točka iz A in točka iz B sta par samo, če je vsaka najbližja točka druge,
+    zato se nobena točka ne uporabi v dveh parih.
+    """
+    # Pri celici 2 * max_distance se za vsako poizvedbo preverijo največ 4 celice
+    cell_size = max(2 * max_distance, 1e-3)
+    nearest_b, _ = GridIndex(x_b, y_b, cell_size=cell_size).nearest_many(x_a, y_a, max_distance)
+    nearest_a, _ = GridIndex(x_a, y_a, cell_size=cell_size).nearest_many(x_b, y_b, max_distance)
+    candidates = np.flatnonzero(nearest_b >= 0)
+    mutual = nearest_a[nearest_b[candidates]] == candidates
+    return candidates[mutual], nearest_b[candidates[mutual]]
+
+def displacements(x_a, y_a, x_b, y_b):
+    """Premiki iz A v B: ΔE, ΔN, razdalja in smer (azimut od severa v smeri urinega kazalca, °)"""
+    delta_x = np.asarray(x_b, dtype='float64') - np.asarray(x_a, dtype='float64')
+    delta_y = np.asarray(y_b, dtype='float64') - np.asarray(y_a, dtype='float64')
+    return pd.DataFrame({
+        'delta_x': delta_x,
+        'delta_y': delta_y,
+        'distance': np.hypot(delta_x, delta_y),
+        'bearing': np.degrees(np.arctan2(delta_x, delta_y)) % 360,
+    })
+
+def compare_points(frame_a, frame_b, id_col_a=None, id_col_b=None, max_distance=DEFAULT_PAIR_DISTANCE):
+    """Pari točk dveh pretvorjenih nizov (converted_x/converted_y v COMPARISON_EPSG) s premiki
+
+    Z id_col_a in id_col_b se pari določijo po ID, sicer kot vzajemno najbližji točki.
+    Vrne DataFrame z row_id obeh točk, koordinatama obeh točk in premiki (displacements).
+    """
+    columns = ['row_id_a', 'row_id_b', 'x_a', 'y_a', 'x_b', 'y_b', 'delta_x', 'delta_y', 'distance', 'bearing']
+    if frame_a is None or frame_b is None or not len(frame_a) or not len(frame_b):
+        return pd.DataFrame(columns=columns)
+
+    x_a, y_a = frame_a['converted_x'].to_numpy(), frame_a['converted_y'].to_numpy()
+    x_b, y_b = frame_b['converted_x'].to_numpy(), frame_b['converted_y'].to_numpy()
+    if id_col_a and id_col_b:
+        index_a, index_b = pair_by_id(frame_a[id_col_a], frame_b[id_col_b])
+    else:
+        index_a, index_b = pair_by_nearest(x_a, y_a, x_b, y_b, max_distance)
+
+    pairs = pd.DataFrame({
+        'row_id_a': frame_a['row_id'].to_numpy()[index_a],
+        'row_id_b': frame_b['row_id'].to_numpy()[index_b],
+        'x_a': x_a[index_a],
+        'y_a': y_a[index_a],
+        'x_b': x_b[index_b],
+        'y_b': y_b[index_b],
+    })
+    return pd.concat([pairs, displacements(pairs['x_a'], pairs['y_a'], pairs['x_b'], pairs['y_b'])], axis=1)
+
+def displacement_statistics(pairs):
+    """Povzetek premikov (ΔE, ΔN, razdalja): število, povprečje, std. odklon, RMS, min, percentili in max"""
+    rows = {}
+    for label, col in (('ΔE', 'delta_x'), ('ΔN', 'delta_y'), ('Razdalja', 'distance')):
+        values = pairs[col].to_numpy(dtype='float64')
+        if not len(values):
+            continue
+        percentiles = np.percentile(values, STATISTICS_PERCENTILES)
+        rows[label] = {
+            'Število': len(values),
+            'Povprečje': values.mean(),
+            'Std. odklon': values.std(),
+            'RMS': np.sqrt(np.mean(values ** 2)),
+            'Min': values.min(),
+            **{f"P{p}": value for p, value in zip(STATISTICS_PERCENTILES, percentiles)},
+            'Max': values.max(),
+        }
+    return pd.DataFrame.from_dict(rows, orient='index')
+
+def mean_bearing(pairs):
+    """Povprečna smer premikov (°) kot krožno povprečje ali None, če ni parov"""
+    if not len(pairs):
+        return None
+    radians = np.radians(pairs['bearing'].to_numpy(dtype='float64'))
+    return float(np.degrees(np.arctan2(np.sin(radians).mean(), np.cos(radians).mean())) % 360)
@@ -0,0 +1,568 @@
+"""Jedro pretvornika koordinat - branje podatkov in pretvorba med sistemi iz epsgs
+
+Modul ne uporablja Streamlita, zato ga lahko uporabljajo tudi aplikacija, ukazna
+vrstica in drugi programi.
+"""
+import csv
+import functools
+import io
+import itertools
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from triangle_model import TriangleModel
+
+epsgs = {
+    "WGS 84 (EPSG:4326)": {
+        "code": 4326, 
+        "x_label": "Lon", 
+        "y_label": "Lat",
+        "x_name": "Longitude",
+        "y_name": "Latitude"
+    },
+    "Gauss (EPSG:3912)": {
+        "code": 3912, 
+        "x_label": "GKX", 
+        "y_label": "GKY",
+        # Vhodni stolpec x je vodoravna os (vzhod, GKY), y pa navpična (sever, GKX) - kot v transform_coordinates
+        "x_name": "GKY (vzhod)",
+        "y_name": "GKX (sever)"
+    },
+    "D96 (EPSG:3794)": {
+        "code": 3794, 
+        "x_label": "E", 
+        "y_label": "N",
+        "x_name": "E (east)",
+        "y_name": "N (north)"
+    },
+}
+
+def coordinate_labels(epsg):
+    """Oznaki koordinat (vzhod, sever) oziroma (dolžina, širina) za sistem iz epsgs"""
+    definition = next(definition for definition in epsgs.values() if definition["code"] == epsg)
+    # Za Gauss (3912) je vodoravna os (vzhod) GKY, navpična (sever) pa GKX
+    if epsg == 3912:
+        return definition["y_label"], definition["x_label"]
+    return definition["x_label"], definition["y_label"]
+
+# Vrstica za besedilom, ki je samostojen zapis samo, če se zadnje polje v narekovajih zapre
+_END_MARK = '\x1f'
+
+def _read_records(text, delimiter):
+    """csv.reader z enakimi pravili kot branje s pandas - ločila v narekovajih ne štejejo"""
+    return csv.reader(io.StringIO(text, newline=''), delimiter=delimiter or ' ', skipinitialspace=delimiter is None)
+
+def count_fields(body, delimiter):
+    """Število stolpcev in prva vrstica (od 0) vsake zapisane vrstice v body (seznam vrstic brez glave)
+
+    Brez narekovajev je vsaka vrstica en zapis. Z narekovaji se štejejo s csv.reader kot pri
+    branju s pandas - ločila v narekovajih ne štejejo, polje v narekovajih pa lahko obsega več
+    vrstic. Prazne vrstice imajo 0 stolpcev.
+    """
+    if not any('"' in line for line in body):
+        if delimiter is None:
+            counts = (len(line.split()) for line in body)
+        else:
+            counts = (line.count(delimiter) + 1 if line else 0 for line in body)
+        return np.fromiter(counts, dtype=np.int64, count=len(body)), np.arange(len(body))
+    reader = _read_records('\n'.join(body), delimiter)
+    counts, starts = [], []
+    start = 0
+    for row in reader:
+        counts.append(len(row))
+        starts.append(start)
+        start = reader.line_num
+    return np.array(counts, dtype=np.int64), np.array(starts, dtype=np.int64)
+
+def open_record_start(body, delimiter):
+    """Prva vrstica (od 0) zapisa v body, v katerem se polje v narekovajih do konca ne zapre, ali None"""
+    if not any('"' in line for line in body):
+        return None
+    reader = _read_records('\n'.join(body) + '\n' + _END_MARK, delimiter)
+    start = last_start = 0
+    for row in reader:
+        if row == [_END_MARK]:
+            return None
+        last_start, start = start, reader.line_num
+    return last_start
+
+def sniff_delimiter(header_line):
+    """Določi ločilo stolpcev iz prve vrstice - tabulator, podpičje ali presledki (None)"""
+    if '\t' in header_line:
+        return '\t'
+    if ';' in header_line:
+        return ';'
+    return None
+
+def split_header_line(header_line, delimiter):
+    """Razdeli vrstico z imeni stolpcev z upoštevanjem narekovajev"""
+    if delimiter is None:
+        return next(csv.reader([header_line], delimiter=' ', skipinitialspace=True))
+    return next(csv.reader([header_line], delimiter=delimiter))
+
+def parse_number_array(values):
+    """Pretvori stolpec besedil v float64 polje - podpira decimalno vejico, neveljavne vrednosti so NaN"""
+    series = pd.Series(values, copy=False)
+    try:
+        # Hitri primer: vse vrednosti so že zapisane z decimalno piko
+        return series.to_numpy(dtype='float64')
+    except (TypeError, ValueError):
+        pass
+    series = series.astype(str).str.strip()
+    series = series.str.replace(',', '.', regex=False)
+    return pd.to_numeric(series, errors='coerce').to_numpy(dtype='float64')
+
+# Tipi ostalih stolpcev v mapiranju stolpcev
+COLUMN_TYPES = ["besedilo", "številka", "datum"]
+# Zapisi datumov, ki se poskusijo po vrsti (slovenski zapis in ISO 8601)
+DATE_FORMATS = ["%d.%m.%Y", "%d. %m. %Y", "%d.%m.%Y %H:%M", "%d.%m.%Y %H:%M:%S",
+                "%Y-%m-%d", "%Y-%m-%d %H:%M", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S", "%d/%m/%Y"]
+
+def parse_date_array(values):
+    """Pretvori stolpec besedil v datetime64 - neveljavne in prazne vrednosti so NaT
+
+    Razčlenijo se samo različne vrednosti (datumi se v podatkih večinoma ponavljajo), za
+    vsak zapis iz DATE_FORMATS pa z enim vektoriziranim klicem nad še nerazčlenjenimi.
+    """
+    codes, uniques = pd.factorize(pd.Series(values, copy=False).astype(str).str.strip())
+    uniques = pd.Series(uniques)
+    parsed = np.full(len(uniques) + 1, np.datetime64('NaT'), dtype='datetime64[ns]')
+    remaining = np.flatnonzero(uniques.ne('').to_numpy())
+    for date_format in DATE_FORMATS:
+        if not len(remaining):
+            break
+        attempt = pd.to_datetime(uniques.iloc[remaining], format=date_format, errors='coerce').to_numpy()
+        matched = ~np.isnat(attempt)
+        parsed[remaining[matched]] = attempt[matched]
+        remaining = remaining[~matched]
+    # Manjkajoče vrednosti imajo kodo -1 in dobijo zadnji element (NaT)
+    return parsed[codes]
+
+def coerce_columns(frame, column_mapping, max_examples=5):
+    """Pretvori ostale stolpce v tipe iz mapiranja stolpcev (številka -> float64, datum -> datetime64)
+
+    Stolpci z 'besedilo' ostanejo besedilo (v shrambi točk se shranijo kot kategorični).
+    Vrne (DataFrame, napake), kjer so napake slovar stolpec -> (število vrednosti, ki jih
+    ni bilo mogoče pretvoriti, prvih max_examples takih vrednosti). Prazne vrednosti niso napake.
+    """
+    typed, failures = {}, {}
+    for col, col_type in column_mapping.items():
+        if col not in frame.columns or col_type not in ("številka", "datum"):
+            continue
+        values = frame[col]
+        converted = parse_number_array(values) if col_type == "številka" else parse_date_array(values)
+        present = values.notna().to_numpy() & values.astype(str).str.strip().ne('').to_numpy()
+        failed = present & pd.isna(converted)
+        if failed.any():
+            failures[col] = (int(failed.sum()), values[failed].head(max_examples).tolist())
+        typed[col] = converted
+    if not typed:
+        return frame, failures
+    return frame.assign(**typed), failures
+
+# Obseg Slovenije z robom v sistemih iz epsgs kot (zahod, jug, vzhod, sever) - za D48/GK je vzhod GKY,
+# sever pa GKX. D48/GK in D96/TM se razlikujeta le za nekaj sto metrov, zato ju obseg ne loči.
+SLOVENIA_EXTENTS = {
+    4326: (13.3, 45.4, 16.7, 47.0),
+    3912: (365_000, 25_000, 635_000, 205_000),
+    3794: (365_000, 25_000, 635_000, 205_000),
+}
+# Koordinatni sistem se preveri na vzorcu največ toliko vrstic
+CRS_SAMPLE_ROWS = 10_000
+# Najmanjši delež točk vzorca v obsegu, da sistem (oziroma zamenjava osi) velja za ustreznega
+CRS_MIN_SHARE = 0.9
+
+def sample_rows(data_rows, max_rows=CRS_SAMPLE_ROWS):
+    """Enakomerno razporejen vzorec največ max_rows vrstic (vse vrstice, če jih je manj)"""
+    if len(data_rows) <= max_rows:
+        return data_rows
+    return data_rows.iloc[np.linspace(0, len(data_rows) - 1, max_rows).astype(np.int64)]
+
+def extent_shares(x_vals, y_vals):
+    """Delež točk (x = vzhod, y = sever) v obsegu Slovenije za vsak sistem iz epsgs, z in brez zamenjave osi
+
+    Vrne slovar (epsg, zamenjani osi) -> delež med točkami s številskima koordinatama
+    oziroma prazen slovar, če takih točk ni. Vse kombinacije se preverijo vektorizirano.
+    """
+    x_vals = np.asarray(x_vals, dtype='float64')
+    y_vals = np.asarray(y_vals, dtype='float64')
+    valid = ~(np.isnan(x_vals) | np.isnan(y_vals))
+    if not valid.any():
+        return {}
+    x_vals, y_vals = x_vals[valid], y_vals[valid]
+    shares = {}
+    for epsg, (west, south, east, north) in SLOVENIA_EXTENTS.items():
+        for swapped, (east_vals, north_vals) in ((False, (x_vals, y_vals)), (True, (y_vals, x_vals))):
+            inside = (east_vals >= west) & (east_vals <= east) & (north_vals >= south) & (north_vals <= north)
+            shares[(epsg, swapped)] = float(inside.mean())
+    return shares
+
+def check_coordinate_system(x_vals, y_vals, from_epsg, columns=None, min_share=CRS_MIN_SHARE):
+    """Preveri izbrani sistem na vzorcu koordinat pred pretvorbo - vrne (delež v obsegu, predlogi)
+
+    Predlogi so četvorke (epsg, zamenjani osi, delež, ujemanje imen stolpcev) za sisteme, pri
+    katerih je v obsegu Slovenije vsaj min_share točk; prazni so, če izbrani sistem ustreza
+    ali noben ne. Razvrščeni so po deležu, nato po ujemanju imen stolpcev (columns = (x_col,
+    y_col)) z oznakami sistema, izbranem sistemu in nezamenjanih oseh.
+    """
+    shares = extent_shares(x_vals, y_vals)
+    if not shares:
+        return None, []
+    selected_share = shares[(from_epsg, False)]
+    if selected_share >= min_share:
+        return selected_share, []
+
+    def labels_match(epsg, swapped):
+        if columns is None:
+            return False
+        expected = coordinate_labels(epsg)[::-1] if swapped else coordinate_labels(epsg)
+        return [str(col).strip().casefold() for col in columns] == [label.casefold() for label in expected]
+
+    suggestions = [
+        (epsg, swapped, share, labels_match(epsg, swapped))
+        for (epsg, swapped), share in shares.items()
+        if share >= min_share and share > selected_share
+    ]
+    suggestions.sort(key=lambda item: (-item[2], not item[3], item[0] != from_epsg, item[1]))
+    return selected_share, suggestions
+
+def parse_data_with_headers(text):
+    """Parse podatkov z glavami stolpcev - prva vrstica so imena stolpcev
+
+    Ločilo se določi enkrat iz prve vrstice, podatki pa se preberejo naenkrat v
+    stolpčni DataFrame (stolpec row_id + vsi stolpci kot besedilo). Vrstice s
+    premalo stolpci se ne prikazujejo sproti, ampak se vrnejo kot seznam
+    (številka vrstice, vsebina) za skupno poročilo.
+    """
+    raw_lines = [line.rstrip('\r') for line in text.strip().split('\n')]
+    lines = [line.strip() for line in raw_lines]
+    if not lines or not lines[0]:
+        return None, None, []
+    
+    # Prva vrstica so imena stolpcev
+    delimiter = sniff_delimiter(lines[0])
+    headers = split_header_line(lines[0], delimiter)
+    
+    # Polje v narekovajih, ki se ne zapre (narekovaj brez para), bi zajelo vse nadaljnje vrstice -
+    # prva vrstica takega zapisa je napačna, branje se nadaljuje v naslednji vrstici
+    body = lines[1:]
+    unclosed = []
+    start = open_record_start(body, delimiter)
+    while start is not None:
+        unclosed.append((start + 2, body[start]))
+        body[start] = raw_lines[start + 1] = ''
+        next_start = open_record_start(body[start + 1:], delimiter)
+        start = None if next_start is None else start + 1 + next_start
+    
+    # Število stolpcev v vsakem zapisu (polje v narekovajih lahko obsega več vrstic)
+    field_counts, starts = count_fields(body, delimiter)
+    
+    if not len(field_counts) or not field_counts.max():
+        return headers, pd.DataFrame(columns=['row_id'] + headers), unclosed
+    
+    ends = np.append(starts[1:], len(body))
+    if len(starts) == len(body):
+        content = lines[:1] + body
+    else:
+        # Presledki se odstranijo samo na robovih zapisov, v poljih v narekovajih ostanejo
+        content = [lines[0]] + raw_lines[1:]
+        for start, end in zip(starts + 1, ends):
+            content[start] = content[start].lstrip()
+            content[end] = content[end].rstrip()
+    
+    frame = pd.read_csv(
+        io.StringIO('\n'.join(content)),
+        sep=r'\s+' if delimiter is None else delimiter,
+        header=None,
+        skiprows=1,
+        names=range(max(len(headers), field_counts.max())),
+        dtype=str,
+        keep_default_na=False,
+        skip_blank_lines=False,
+        quotechar='"',
+        engine='c',
+    )
+    
+    # Zapisi se ujemajo po položaju - row_id je številka prve vrstice zapisa za glavo
+    n_rows = min(len(frame), len(field_counts))
+    frame = frame.iloc[:n_rows]
+    field_counts = field_counts[:n_rows]
+    row_ids = starts[:n_rows] + 1
+    ends = ends[:n_rows] + 1
+    
+    valid = field_counts >= len(headers)
+    bad = np.flatnonzero(~valid & (field_counts > 0))
+    bad_rows = sorted(unclosed + [(int(row_ids[i]) + 1, '\n'.join(content[row_ids[i]:ends[i]])) for i in bad])
+    
+    data = frame.loc[valid, list(range(len(headers)))]
+    data.columns = headers
+    data.insert(0, 'row_id', row_ids[valid])
+    data = data.reset_index(drop=True)
+    
+    return headers, data, bad_rows
+
+# Največ toliko dodatnih kosov se prebere, da se polje v narekovajih na koncu kosa zapre
+QUOTED_FIELD_MAX_CHUNKS = 4
+
+def iter_text_chunks(stream, chunk_rows):
+    """Bere besedilni tok ali iterator vrstic (prva vrstica = imena stolpcev) po kosih največ chunk_rows vrstic
+
+    Vrača trojke (headers, chunk, bad_rows) v enaki obliki kot parse_data_with_headers,
+    row_id in številke vrstic pa se nadaljujejo čez vse kose. Kos, ki bi se končal sredi
+    polja v narekovajih, se podaljša do konca tega polja, vendar za največ
+    QUOTED_FIELD_MAX_CHUNKS kosov - zapis, ki se do takrat ne zapre, je napačna vrstica.
+    """
+    lines_iter = iter(stream)
+    header_line = next(lines_iter, '')
+    delimiter = sniff_delimiter(header_line.strip())
+    row_offset = 0
+    while True:
+        lines = list(itertools.islice(lines_iter, chunk_rows))
+        if not lines:
+            break
+        start = open_record_start([line.strip() for line in lines], delimiter)
+        for _ in range(QUOTED_FIELD_MAX_CHUNKS):
+            if start is None:
+                break
+            more = list(itertools.islice(lines_iter, chunk_rows))
+            if not more:
+                break
+            lines.extend(more)
+            next_start = open_record_start([line.strip() for line in lines[start:]], delimiter)
+            start = None if next_start is None else start + next_start
+        headers, chunk, bad_rows = parse_data_with_headers(header_line + ''.join(lines))
+        if chunk is None:
+            break
+        chunk['row_id'] += row_offset
+        bad_rows = [(line_no + row_offset, line) for line_no, line in bad_rows]
+        row_offset += len(lines)
+        yield headers, chunk, bad_rows
+
+@functools.lru_cache(maxsize=None)
+def get_crs(epsg):
+    """Vrne predpomnjen pyproj CRS za kodo EPSG - ustvari se enkrat na proces in je skupen vsem sejam
+
+    pyproj se uvozi šele ob prvi pretvorbi, zato ga aplikacija ne nalaga pred vnosom podatkov.
+    """
+    from pyproj import CRS
+    return CRS.from_epsg(epsg)
+
+@functools.lru_cache(maxsize=None)
+def get_transformer(from_epsg, to_epsg):
+    """Vrne predpomnjen pyproj Transformer za par (from_epsg, to_epsg) - zgradi se enkrat na proces"""
+    from pyproj import Transformer
+    return Transformer.from_crs(get_crs(from_epsg), get_crs(to_epsg), always_xy=True)
+
+# Vzporedna pretvorba v več procesih - pod PARALLEL_MIN_POINTS točkami je zagon procesov dražji od pretvorbe
+PARALLEL_MIN_POINTS = 200_000
+PARALLEL_MIN_CHUNK_POINTS = 50_000
+
+# En bazen procesov na proces - ob spremembi števila procesov se stari bazen zapre
+_process_pool = None
+_process_pool_workers = 0
+_process_pool_lock = threading.RLock()
+
+def get_process_pool(workers):
+    """Vrne skupen bazen procesov z danim številom procesov - zažene se enkrat in se ponovno uporablja
+
+    Ob drugem številu procesov se zažene nov bazen, stari pa se zapre, ko konča že oddane
+    kose. Klicatelj naj bazen pridobi in vanj odda kose pod _process_pool_lock, da ga
+    druga nit med tem ne zapre.
+    """
+    global _process_pool, _process_pool_workers
+    with _process_pool_lock:
+        if _process_pool is None or _process_pool_workers != workers:
+            if _process_pool is not None:
+                _process_pool.shutdown(wait=False)
+            # spawn namesto fork, ker se lahko kliče iz večnitnega strežnika (Streamlit)
+            _process_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+            _process_pool_workers = workers
+        return _process_pool
+
+def resolve_workers(workers):
+    """Dejansko število procesov - None ali 0 pomeni vsa jedra"""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(int(workers), 1)
+
+def _transform_chunk(args):
+    """Pretvorba enega kosa v procesu iz bazena"""
+    x_vals, y_vals, from_epsg, to_epsg = args
+    return transform_coordinates(x_vals, y_vals, from_epsg, to_epsg)
+
+def transform_coordinates_parallel(x_vals, y_vals, from_epsg, to_epsg, workers=None, chunk_points=None):
+    """Pretvori polji koordinat po kosih v bazenu procesov - vrstni red točk se ohrani
+
+    chunk_points je velikost kosa; privzeto se polji razdelita enakomerno med procese.
+    Pod PARALLEL_MIN_POINTS točkami ali z enim procesom se pretvori zaporedno.
+    """
+    workers = resolve_workers(workers)
+    n_points = len(x_vals)
+    if workers == 1 or n_points < PARALLEL_MIN_POINTS or from_epsg == to_epsg:
+        return transform_coordinates(x_vals, y_vals, from_epsg, to_epsg)
+    
+    if not chunk_points:
+        chunk_points = max(-(-n_points // workers), PARALLEL_MIN_CHUNK_POINTS)
+    x_vals = np.asarray(x_vals, dtype='float64')
+    y_vals = np.asarray(y_vals, dtype='float64')
+    chunks = [
+        (x_vals[start:start + chunk_points], y_vals[start:start + chunk_points], from_epsg, to_epsg)
+        for start in range(0, n_points, chunk_points)
+    ]
+    # map odda vse kose takoj in vrne rezultate v enakem vrstnem redu kot kose
+    with _process_pool_lock:
+        results = get_process_pool(workers).map(_transform_chunk, chunks)
+    results = list(results)
+    return (
+        np.concatenate([converted_x for converted_x, _ in results]),
+        np.concatenate([converted_y for _, converted_y in results]),
+    )
+
+@functools.lru_cache(maxsize=4)
+def _load_triangle_model(path, modified):
+    model = TriangleModel.from_file(path)
+    model.source = (path, modified)
+    return model
+
+def load_triangle_model(path):
+    """Naloži trikotniški model iz datoteke - model in njegov indeks se zgradita enkrat (do spremembe datoteke)
+
+    model.source je (pot, čas spremembe) in se lahko uporabi v ključih predpomnilnika.
+    """
+    path = os.path.abspath(path)
+    return _load_triangle_model(path, os.path.getmtime(path))
+
+def _transform_with_model(x_vals, y_vals, from_epsg, to_epsg, model, workers=1, chunk_points=None):
+    """Pretvorba prek trikotniškega modela - točke zunaj modela se pretvorijo s pyproj"""
+    if from_epsg == model.source_epsg:
+        # Model v njegov ciljni sistem, naprej (npr. v WGS84) s pyproj
+        model_x, model_y, inside = model.transform(x_vals, y_vals)
+        converted_x, converted_y = transform_coordinates(
+            model_x, model_y, model.target_epsg, to_epsg, workers=workers, chunk_points=chunk_points
+        )
+    else:
+        # S pyproj v ciljni sistem modela, nato obratni model v izvorni sistem modela
+        inverse = model.inverse()
+        model_x, model_y = transform_coordinates(
+            x_vals, y_vals, from_epsg, inverse.source_epsg, workers=workers, chunk_points=chunk_points
+        )
+        east, north, inside = inverse.transform(model_x, model_y)
+        # Za Gauss (3912) na izhodu enaka zamenjava osi kot pri pyproj
+        converted_x, converted_y = (north, east) if to_epsg == 3912 else (east, north)
+    
+    if not inside.all():
+        converted_x[~inside], converted_y[~inside] = transform_coordinates(
+            x_vals[~inside], y_vals[~inside], from_epsg, to_epsg, workers=workers, chunk_points=chunk_points
+        )
+    return converted_x, converted_y
+
+def transform_coordinates(x_vals, y_vals, from_epsg, to_epsg, known=None, workers=1, chunk_points=None,
+                          model=None):
+    """Pretvori polji koordinat x/y z enim vektoriziranim klicem, vrne (converted_x, converted_y)
+
+    known je opcijska četvorka (x, y, converted_x, converted_y) že pretvorjenih točk
+    za isti par EPSG - pretvorijo se samo točke, ki jih v njej ni. Z workers > 1 (ali
+    None za vsa jedra) se velika polja pretvorijo vzporedno s transform_coordinates_parallel.
+    Z model (TriangleModel) se pretvorbe iz ali v izvorni sistem modela izvedejo prek modela.
+    """
+    x_vals = np.asarray(x_vals, dtype='float64')
+    y_vals = np.asarray(y_vals, dtype='float64')
+    if from_epsg == to_epsg:
+        return x_vals.copy(), y_vals.copy()
+    
+    if known is not None and len(known[0]):
+        # Par (x, y) kot kompleksno število je natančen ključ za iskanje po indeksu
+        known_index = pd.Index(np.asarray(known[0]) + 1j * np.asarray(known[1]))
+        unique = ~known_index.duplicated()
+        positions = known_index[unique].get_indexer(x_vals + 1j * y_vals)
+        missing = positions < 0
+        
+        converted_x = np.asarray(known[2])[unique][positions]
+        converted_y = np.asarray(known[3])[unique][positions]
+        if missing.any():
+            converted_x[missing], converted_y[missing] = transform_coordinates(
+                x_vals[missing], y_vals[missing], from_epsg, to_epsg,
+                workers=workers, chunk_points=chunk_points, model=model
+            )
+        return converted_x, converted_y
+    
+    if model is not None and model.source_epsg in (from_epsg, to_epsg):
+        return _transform_with_model(x_vals, y_vals, from_epsg, to_epsg, model, workers, chunk_points)
+    
+    if workers != 1 and len(x_vals) >= PARALLEL_MIN_POINTS:
+        return transform_coordinates_parallel(
+            x_vals, y_vals, from_epsg, to_epsg, workers=workers, chunk_points=chunk_points
+        )
+    
+    # Za Gauss (3912) na vhodu: GKY je vodoravno (vzhod), GKX je navpično (sever)
+    # Transformer z always_xy=True pričakuje (vzhod, sever) - vrednosti gredo naprej brez zamenjave
+    east, north = get_transformer(from_epsg, to_epsg).transform(x_vals, y_vals)
+    
+    # Za Gauss (3912) na izhodu obrni koordinate nazaj
+    if to_epsg == 3912:
+        # Na izhodu: geografski X postane GKX, geografski Y postane GKY
+        return np.asarray(north), np.asarray(east)  # sever -> GKX, vzhod -> GKY
+    return np.asarray(east), np.asarray(north)
+
+def convert_coordinates_from_data(data_rows, x_col, y_col, from_epsg, to_epsg, known=None,
+                                  workers=1, chunk_points=None, model=None):
+    """Pretvori koordinate iz podatkov z določenimi stolpci
+
+    Vrne DataFrame z veljavnimi vrsticami, izvornima koordinatama source_x/source_y
+    in dodanima stolpcema converted_x/converted_y. Vrstice z neveljavnimi koordinatami
+    so izpuščene, napake pri pretvorbi (npr. neznan stolpec) se prenesejo klicatelju.
+    workers in chunk_points vklopita vzporedno pretvorbo (glej transform_coordinates_parallel),
+    model pa pretvorbo prek trikotniškega modela.
+    """
+    return convert_datasets_from_data(
+        [(data_rows, x_col, y_col)], from_epsg, to_epsg, known=known,
+        workers=workers, chunk_points=chunk_points, model=model
+    )[0]
+
+def convert_datasets_from_data(datasets, from_epsg, to_epsg, known=None, workers=1, chunk_points=None,
+                               model=None):
+    """Pretvori več nizov z istim parom EPSG z enim klicem transform_coordinates
+
+    datasets je seznam (data_rows, x_col, y_col). Vrne seznam DataFrame-ov v enakem
+    vrstnem redu, vsak kot pri convert_coordinates_from_data.
+    """
+    parsed = []
+    for data_rows, x_col, y_col in datasets:
+        if data_rows is None or not len(data_rows):
+            parsed.append(None)
+            continue
+        x_vals = parse_number_array(data_rows[x_col])
+        y_vals = parse_number_array(data_rows[y_col])
+        # Odstrani vrstice z neveljavnimi koordinatami
+        valid = ~(np.isnan(x_vals) | np.isnan(y_vals))
+        parsed.append((data_rows, x_vals[valid], y_vals[valid], valid))
+    
+    present = [item for item in parsed if item is not None]
+    if not present:
+        return [pd.DataFrame() for _ in datasets]
+    converted_x, converted_y = transform_coordinates(
+        np.concatenate([item[1] for item in present]), np.concatenate([item[2] for item in present]),
+        from_epsg, to_epsg, known=known, workers=workers, chunk_points=chunk_points, model=model
+    )
+    
+    results = []
+    offset = 0
+    for item in parsed:
+        if item is None:
+            results.append(pd.DataFrame())
+            continue
+        data_rows, x_vals, y_vals, valid = item
+        end = offset + len(x_vals)
+        converted = data_rows[valid].reset_index(drop=True)
+        converted['source_x'] = x_vals
+        converted['source_y'] = y_vals
+        converted['converted_x'] = converted_x[offset:end]
+        converted['converted_y'] = converted_y[offset:end]
+        results.append(converted)
+        offset = end
+    return results
@@ -0,0 +1,157 @@
+"""Meritve časa, števila vrstic in porabe pomnilnika po stopnjah enega zagona
+
+Stopnje se merijo s kontekstom Diagnostics.stage; gnezdene stopnje (npr. pretvorba
+znotraj priprave točk) se zapišejo z globino. Pomnilnik se meri s tracemalloc, ki
+upočasni dodeljevanje Python objektov, zato so meritve vklopljene samo na zahtevo.
+Izklopljen Diagnostics ne meri ničesar.
+
+tracemalloc je skupen celemu procesu (vsem sejam strežnika): zažene se ob prvem
+odprtem Diagnostics z meritvami pomnilnika in ustavi ob zaprtju zadnjega. Vrh se
+ponastavi samo, ko stopenj ne meri nobena druga seja; stopnja, ki se je prekrivala s
+stopnjo druge seje, nima meritev pomnilnika (vključevale bi tudi tuje alokacije).
+"""
+import datetime
+import json
+import threading
+import time
+import tracemalloc
+import weakref
+from contextlib import contextmanager
+
+import pandas as pd
+
+_tracing_lock = threading.Lock()
+# Število odprtih Diagnostics z meritvami pomnilnika in ali je tracemalloc zagnal ta modul
+_tracing_users = 0
+_tracing_started = False
+# Diagnostics z odprtimi stopnjami (za zaznavo prekrivanja med sejami)
+_measuring = set()
+
+def _acquire_tracing():
+    """Prijavi uporabnika tracemalloc - prvi ga zažene, če še ne teče"""
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _tracing_started = True
+        _tracing_users += 1
+
+def _release_tracing():
+    """Odjavi uporabnika tracemalloc - zadnji ga ustavi, če ga je zagnal ta modul"""
+    global _tracing_users, _tracing_started
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+class Diagnostics:
+    """Zapisi stopenj enega zagona: ime, globina, čas, vrstice, alocirani pomnilnik in vrh"""
+
+    def __init__(self, enabled=False, trace_memory=True):
+        self.enabled = enabled
+        self.records = []
+        self._stack = []
+        self.closed = False
+        self._start = time.perf_counter()
+        self.trace_memory = enabled and trace_memory
+        if self.trace_memory:
+            _acquire_tracing()
+            # Odjava tudi, če zagon ne pride do close (npr. prekinjen zagon skripte)
+            self._release = weakref.finalize(self, _release_tracing)
+
+    @contextmanager
+    def stage(self, name, rows=None, **details):
+        """Izmeri stopnjo - vrne slovar zapisa, v katerega lahko klicatelj doda 'rows' in podrobnosti"""
+        record = {'stage': name, 'depth': len(self._stack), 'rows': rows, **details}
+        if not self.enabled:
+            yield record
+            return
+
+        if self.trace_memory:
+            with _tracing_lock:
+                current, peak = tracemalloc.get_traced_memory()
+                others = [other for other in _measuring if other is not self]
+                if others:
+                    # Prekrivanje s stopnjami drugih sej - vrha ni mogoče ponastaviti nikomur
+                    for diagnostics in others + [self]:
+                        for open_frame in diagnostics._stack:
+                            open_frame['shared'] = True
+                else:
+                    # Vrh nadrejene stopnje se ohrani, preden se števec vrha ponastavi za to stopnjo
+                    if self._stack:
+                        self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+                    tracemalloc.reset_peak()
+                    peak = current
+                frame = {'current': current, 'peak': peak, 'shared': bool(others)}
+                self._stack.append(frame)
+                _measuring.add(self)
+        else:
+            frame = {}
+            self._stack.append(frame)
+        self.records.append(record)
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - start
+            if self.trace_memory:
+                with _tracing_lock:
+                    current, peak = tracemalloc.get_traced_memory()
+                    self._stack.pop()
+                    if not self._stack:
+                        _measuring.discard(self)
+                peak = max(frame['peak'], peak)
+                if frame['shared']:
+                    record['memory_bytes'] = record['peak_bytes'] = None
+                    record['shared_memory'] = True
+                else:
+                    record['memory_bytes'] = current - frame['current']
+                    record['peak_bytes'] = peak - frame['current']
+                if self._stack:
+                    self._stack[-1]['peak'] = max(self._stack[-1]['peak'], peak)
+            else:
+                self._stack.pop()
+
+    @property
+    def total_seconds(self):
+        return time.perf_counter() - self._start
+
+    def close(self):
+        """Konča meritve zagona in odjavi tracemalloc (ustavi se ob zaprtju zadnjega uporabnika)"""
+        self.closed = True
+        if self.trace_memory:
+            self._release()
+
+    def to_frame(self):
+        """Tabela stopenj za prikaz (gnezdene stopnje so označene z ↳)"""
+        frame = pd.DataFrame({
+            'Stopnja': [" " * (record['depth'] - 1) + "↳ " * bool(record['depth']) + record['stage']
+                        for record in self.records],
+            'Vrstice': pd.array([record.get('rows') for record in self.records], dtype='Int64'),
+            'Čas (ms)': [record.get('seconds', 0.0) * 1000 for record in self.records],
+        })
+        if self.trace_memory:
+            # Stopnje, ki so se prekrivale z drugo sejo, nimajo meritev pomnilnika (prazna celica)
+            for column, key in (('Alocirano (MiB)', 'memory_bytes'), ('Vrh (MiB)', 'peak_bytes')):
+                frame[column] = [
+                    record.get(key, 0) / 2**20 if record.get(key, 0) is not None else float('nan')
+                    for record in self.records
+                ]
+        frame['Podrobnosti'] = [
+            ", ".join(f"{key}={value}" for key, value in record.items()
+                      if key not in ('stage', 'depth', 'rows', 'seconds', 'memory_bytes', 'peak_bytes'))
+            for record in self.records
+        ]
+        return frame
+
+    def write_log(self, path, **context):
+        """Doda zagon kot eno vrstico JSON v dnevnik (context so npr. ID seje in številka zagona)"""
+        entry = {
+            'time': datetime.datetime.now().isoformat(timespec='milliseconds'),
+            **context,
+            'total_seconds': self.total_seconds,
+            'stages': self.records,
+        }
+        with open(path, 'a', encoding='utf-8') as log_file:
+            log_file.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
@@ -0,0 +1,190 @@
+"""Izvoz točk v CSV, XLSX, GeoPackage in GeoParquet
+
+Točke se izvažajo po kosih iz stolpčne shrambe (PointStore): za vsak kos se sestavi
+tabela z izvornimi koordinatami in koordinatami v vseh sistemih iz epsgs, ki se
+takoj zapiše v datoteko. Celotna tabela ali besedilo izvoza ni nikoli v pomnilniku.
+Knjižnice za posamezne oblike (openpyxl, geopandas/pyogrio, pyarrow) se uvozijo
+šele ob izvozu v to obliko.
+"""
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from conversion import epsgs, coordinate_labels, get_crs, transform_coordinates
+
+# Število točk v enem kosu izvoza
+EXPORT_CHUNK_ROWS = 100_000
+# Sistem geometrije v GeoPackage in GeoParquet
+GEOMETRY_EPSG = 3794
+# Največ podatkovnih vrstic na list XLSX (brez glave) - nadaljnje vrstice gredo na nov list
+XLSX_MAX_ROWS = 1_048_575
+# Ime sloja v GeoPackage
+GPKG_LAYER = "tocke"
+
+EXPORT_FORMATS = {
+    "CSV": {"extension": "csv", "mime": "text/csv"},
+    "XLSX": {"extension": "xlsx",
+             "mime": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"},
+    "GeoPackage": {"extension": "gpkg", "mime": "application/geopackage+sqlite3"},
+    "GeoParquet": {"extension": "parquet", "mime": "application/vnd.apache.parquet"},
+}
+
+def _east_north(x_vals, y_vals, from_epsg, to_epsg, model=None):
+    """Pretvorba (vzhod, sever) -> (vzhod, sever) ne glede na zamenjavo osi pri Gauss (3912)"""
+    if from_epsg == to_epsg:
+        return np.asarray(x_vals, dtype='float64'), np.asarray(y_vals, dtype='float64')
+    converted_x, converted_y = transform_coordinates(x_vals, y_vals, from_epsg, to_epsg, model=model)
+    return (converted_y, converted_x) if to_epsg == 3912 else (converted_x, converted_y)
+
+def export_columns(point_store, indices):
+    """Imena stolpcev izvoza: točka, izvorne koordinate, koordinate v vseh sistemih in atributi izvoženih nizov"""
+    columns = ['ID', 'Dataset', 'row_id', 'Izvorni EPSG', 'Izvorni X', 'Izvorni Y']
+    for definition in epsgs.values():
+        columns.extend(coordinate_labels(definition['code']))
+    codes = np.unique(point_store.dataset[indices])
+    attributes = dict.fromkeys(col for code in codes for col in point_store.datasets[code]['columns'])
+    # Atribut z enakim imenom kot stolpec izvoza dobi pripono (kot v PointStore.to_frame)
+    return columns, {col: f"{col} (atribut)" if col in columns else col for col in attributes}
+
+def iter_export_chunks(point_store, indices, model=None, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Kosi izvoza (DataFrame) za točke na danih položajih - vsaj en kos, tudi če točk ni
+
+    Koordinate v vseh sistemih se izračunajo iz izvornih koordinat (z istim modelom kot na
+    zemljevidu), WGS84 pa se vzame iz shrambe. Atributi so v svojem osnovnem tipu.
+    """
+    indices = np.asarray(indices, dtype=np.int64)
+    columns, attributes = export_columns(point_store, indices)
+    source_epsgs = np.array([dataset['source_epsg'] for dataset in point_store.datasets], dtype=np.int64)
+    for start in range(0, max(len(indices), 1), chunk_rows):
+        chunk = indices[start:start + chunk_rows]
+        source_epsg = source_epsgs[point_store.dataset[chunk]] if len(source_epsgs) else np.empty(0, np.int64)
+        source_x, source_y = point_store.source_x[chunk], point_store.source_y[chunk]
+        frame = pd.DataFrame({
+            'ID': point_store.point_ids(chunk).to_numpy(),
+            'Dataset': point_store.dataset_names(chunk).to_numpy(),
+            'row_id': point_store.row_id[chunk],
+            'Izvorni EPSG': source_epsg,
+            'Izvorni X': source_x,
+            'Izvorni Y': source_y,
+        })
+        for definition in epsgs.values():
+            to_epsg = definition['code']
+            east, north = np.full(len(chunk), np.nan), np.full(len(chunk), np.nan)
+            if to_epsg == 4326:
+                east, north = point_store.lon[chunk], point_store.lat[chunk]
+            else:
+                for from_epsg in np.unique(source_epsg):
+                    same = source_epsg == from_epsg
+                    east[same], north[same] = _east_north(source_x[same], source_y[same], int(from_epsg), to_epsg,
+                                                          model=model)
+            east_label, north_label = coordinate_labels(to_epsg)
+            frame[east_label] = east
+            frame[north_label] = north
+        for col, name in attributes.items():
+            values = point_store.attributes[col].iloc[chunk].reset_index(drop=True)
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                values = values.astype(values.cat.categories.dtype)
+            frame[name] = values
+        yield frame[columns + list(attributes.values())]
+
+def write_csv(path, chunks):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as output:
+        for i, chunk in enumerate(chunks):
+            chunk.to_csv(output, index=False, header=i == 0, lineterminator='\n')
+
+def write_xlsx(path, chunks):
+    """XLSX v načinu samo za pisanje (vrstice gredo sproti v datoteko), po XLSX_MAX_ROWS vrstic na list"""
+    import openpyxl
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet, sheet_rows = None, 0
+    for chunk in chunks:
+        if sheet is None:
+            sheet = workbook.create_sheet("Točke")
+            sheet.append(list(chunk.columns))
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if sheet_rows == XLSX_MAX_ROWS:
+                sheet = workbook.create_sheet(f"Točke {len(workbook.worksheets) + 1}")
+                sheet.append(list(chunk.columns))
+                sheet_rows = 0
+            sheet.append(row)
+            sheet_rows += 1
+    workbook.save(path)
+
+def write_gpkg(path, chunks, geometry_epsg=GEOMETRY_EPSG):
+    """GeoPackage s točkami v geometry_epsg - vsak kos se doda v isti sloj"""
+    import geopandas
+    east_col, north_col = coordinate_labels(geometry_epsg)
+    for i, chunk in enumerate(chunks):
+        frame = geopandas.GeoDataFrame(
+            chunk, geometry=geopandas.points_from_xy(chunk[east_col], chunk[north_col]),
+            crs=get_crs(geometry_epsg)
+        )
+        frame.to_file(path, layer=GPKG_LAYER, driver='GPKG', engine='pyogrio', mode='w' if i == 0 else 'a')
+
+def write_geoparquet(path, chunks, geometry_epsg=GEOMETRY_EPSG):
+    """GeoParquet (geometrija WKB) - vsak kos je ena skupina vrstic, shema se določi iz prvega kosa"""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    import shapely
+    east_col, north_col = coordinate_labels(geometry_epsg)
+    geo_metadata = {
+        'version': '1.1.0',
+        'primary_column': 'geometry',
+        'columns': {'geometry': {
+            'encoding': 'WKB',
+            'geometry_types': ['Point'],
+            'crs': get_crs(geometry_epsg).to_json_dict(),
+        }},
+    }
+    writer = None
+    try:
+        for chunk in chunks:
+            geometry = shapely.to_wkb(shapely.points(chunk[east_col].to_numpy(), chunk[north_col].to_numpy()))
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            table = table.append_column('geometry', pa.array(geometry, type=pa.binary()))
+            if writer is None:
+                # Stolpci brez vrednosti v prvem kosu so v shemi besedilo
+                schema = pa.schema([
+                    field.with_type(pa.string()) if pa.types.is_null(field.type) else field
+                    for field in table.schema
+                ]).with_metadata({b'geo': json.dumps(geo_metadata).encode('utf-8')})
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+def write_export(path, export_format, point_store, indices, model=None, geometry_epsg=GEOMETRY_EPSG,
+                 chunk_rows=EXPORT_CHUNK_ROWS):
+    """Zapiše točke na danih položajih v datoteko v obliki iz EXPORT_FORMATS"""
+    chunks = iter_export_chunks(point_store, indices, model=model, chunk_rows=chunk_rows)
+    if export_format == "CSV":
+        write_csv(path, chunks)
+    elif export_format == "XLSX":
+        write_xlsx(path, chunks)
+    elif export_format == "GeoPackage":
+        write_gpkg(path, chunks, geometry_epsg)
+    elif export_format == "GeoParquet":
+        write_geoparquet(path, chunks, geometry_epsg)
+    else:
+        raise ValueError(f"Neznana oblika izvoza: {export_format}")
+
+def export_bytes(export_format, point_store, indices, model=None, geometry_epsg=GEOMETRY_EPSG,
+                 chunk_rows=EXPORT_CHUNK_ROWS):
+    """Vsebina izvoza kot bajti - zapiše se v začasno datoteko, ki se po branju izbriše"""
+    handle, path = tempfile.mkstemp(suffix=f".{EXPORT_FORMATS[export_format]['extension']}")
+    os.close(handle)
+    try:
+        # GeoPackage mora ustvariti datoteko sam
+        os.remove(path)
+        write_export(path, export_format, point_store, indices, model=model,
+                     geometry_epsg=geometry_epsg, chunk_rows=chunk_rows)
+        with open(path, 'rb') as export_file:
+            return export_file.read()
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,228 @@
+"""Obremenitveni test lokalne storitve za pretvorbo (service.py)
+
+Zažene storitev v novem procesu na prostih vratih (ali uporabi že zagnano z --url),
+nato z --concurrency sočasnimi povezavami (keep-alive) pošlje --requests zahtev s po
+--points naključnih točk v Sloveniji. Izpiše zakasnitve (p50, p90, p99, največja),
+zahteve in točke na sekundo ter povprečno število zahtev v eni skupni pretvorbi.
+
+Primer:
+    python loadtest.py --requests 5000 --concurrency 100 --points 10
+    python loadtest.py --url http://127.0.0.1:8512 --format csv --from 3912 --to 4326
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+from conversion import epsgs, coordinate_labels, transform_coordinates
+
+DEFAULT_REQUESTS = 2_000
+DEFAULT_CONCURRENCY = 50
+DEFAULT_POINTS = 10
+DEFAULT_SEED = 3912
+# Okvir Slovenije v WGS84 (zahod, jug, vzhod, sever)
+SLOVENIA_BOUNDS = (13.4, 45.45, 16.55, 46.85)
+# Najdaljše čakanje na zagon storitve (s)
+STARTUP_TIMEOUT = 30
+
+def request_bodies(n_bodies, n_points, from_epsg, body_format, seed=DEFAULT_SEED):
+    """Telesa zahtev z naključnimi točkami v izvornem sistemu (vzhod, sever)"""
+    rng = np.random.default_rng(seed)
+    west, south, east, north = SLOVENIA_BOUNDS
+    lon = rng.uniform(west, east, n_bodies * n_points)
+    lat = rng.uniform(south, north, n_bodies * n_points)
+    x_vals, y_vals = transform_coordinates(lon, lat, 4326, from_epsg)
+    if from_epsg == 3912:
+        # Izhod v 3912 je (sever, vzhod)
+        x_vals, y_vals = y_vals, x_vals
+    x_label, y_label = coordinate_labels(from_epsg)
+    bodies = []
+    for i in range(n_bodies):
+        points = np.column_stack([x_vals, y_vals])[i * n_points:(i + 1) * n_points].round(7)
+        if body_format == "json":
+            bodies.append(json.dumps({"points": points.tolist()}).encode("utf-8"))
+        else:
+            lines = [f"ID\t{x_label}\t{y_label}"] + [f"{j}\t{x}\t{y}" for j, (x, y) in enumerate(points)]
+            bodies.append("\n".join(lines).encode("utf-8"))
+    return bodies
+
+async def read_response(reader):
+    """Prebere odgovor HTTP/1.1 - vrne (status, telo)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Storitev je zaprla povezavo")
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        if name.strip().lower() == "content-length":
+            length = int(value)
+    return int(status_line.split()[1]), await reader.readexactly(length)
+
+async def http_get(host, port, path):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n".encode("latin-1"))
+        await writer.drain()
+        return await read_response(reader)
+    finally:
+        writer.close()
+
+async def run_load(host, port, bodies, n_requests, concurrency, query, content_type):
+    """Pošlje n_requests zahtev prek concurrency povezav - vrne (zakasnitve v s, napake, skupni čas)"""
+    latencies, errors = [], []
+    counter = iter(range(n_requests))
+
+    async def client():
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            for i in counter:
+                body = bodies[i % len(bodies)]
+                head = (f"POST /convert?{query} HTTP/1.1\r\nHost: {host}\r\n"
+                        f"Content-Type: {content_type}\r\nContent-Length: {len(body)}\r\n\r\n")
+                start = time.perf_counter()
+                writer.write(head.encode("latin-1") + body)
+                await writer.drain()
+                status, payload = await read_response(reader)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors.append(f"{status}: {payload[:200].decode('utf-8', 'replace')}")
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return np.array(latencies), errors, time.perf_counter() - start
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+async def wait_for_service(host, port, process):
+    """Počaka, da storitev odgovori na /health"""
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError("Storitev se je ob zagonu ustavila")
+        try:
+            status, _ = await http_get(host, port, "/health")
+            if status == 200:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError(f"Storitev na {host}:{port} ni odgovorila v {STARTUP_TIMEOUT} s")
+
+async def load_test(args):
+    process = None
+    if args.url:
+        url = urlsplit(args.url)
+        host, port = url.hostname, url.port or 80
+    else:
+        host, port = "127.0.0.1", free_port()
+        command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "service.py"),
+                   "--host", host, "--port", str(port), "--delay", str(args.delay)]
+        process = subprocess.Popen(command, stderr=subprocess.DEVNULL)
+    try:
+        await wait_for_service(host, port, process)
+        bodies = request_bodies(min(args.requests, 500), args.points, args.from_epsg, args.format, args.seed)
+        query = f"from={args.from_epsg}&to={args.to_epsg}"
+        content_type = "application/json" if args.format == "json" else "text/csv"
+
+        # Ogrevanje (transformer, prve povezave) se ne šteje v rezultat
+        await run_load(host, port, bodies, min(args.concurrency, args.requests), args.concurrency, query, content_type)
+        _, before = await http_get(host, port, "/health")
+        latencies, errors, seconds = await run_load(
+            host, port, bodies, args.requests, args.concurrency, query, content_type
+        )
+        _, after = await http_get(host, port, "/health")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+
+    before, after = json.loads(before), json.loads(after)
+    batches = after["batches"] - before["batches"]
+    requests_converted = after["requests"] - before["requests"]
+    return {
+        "requests": int(len(latencies)),
+        "errors": len(errors),
+        "first_errors": errors[:5],
+        "concurrency": args.concurrency,
+        "points_per_request": args.points,
+        "format": args.format,
+        "from_epsg": args.from_epsg,
+        "to_epsg": args.to_epsg,
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "points_per_second": len(latencies) * args.points / seconds,
+        "latency_ms": {
+            name: float(np.percentile(latencies, q) * 1000) if len(latencies) else None
+            for name, q in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))
+        },
+        "batches": batches,
+        "requests_per_batch": requests_converted / batches if batches else None,
+    }
+
+def format_results(results):
+    """Povzetek testa za izpis"""
+    latency = results["latency_ms"]
+    lines = [
+        f"Zahteve: {results['requests']} ({results['errors']} napak), {results['concurrency']} sočasnih povezav, "
+        f"{results['points_per_request']} točk na zahtevo ({results['format']}, "
+        f"{results['from_epsg']} -> {results['to_epsg']})",
+        f"Čas: {results['seconds']:.2f} s, {results['requests_per_second']:,.0f} zahtev/s, "
+        f"{results['points_per_second']:,.0f} točk/s",
+        f"Zakasnitev: p50 {latency['p50']:.2f} ms, p90 {latency['p90']:.2f} ms, "
+        f"p99 {latency['p99']:.2f} ms, največ {latency['max']:.2f} ms",
+    ]
+    if results["batches"]:
+        lines.append(f"Skupne pretvorbe: {results['batches']} "
+                     f"(povprečno {results['requests_per_batch']:.1f} zahtev na pretvorbo)")
+    lines.extend(f"Napaka: {error}" for error in results["first_errors"])
+    return "\n".join(lines)
+
+def parse_args(argv=None):
+    codes = sorted(definition["code"] for definition in epsgs.values())
+    parser = argparse.ArgumentParser(description="Obremenitveni test lokalne storitve za pretvorbo koordinat.")
+    parser.add_argument("--url", help="naslov zagnane storitve (privzeto se zažene nova na prostih vratih)")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS,
+                        help=f"število zahtev (privzeto {DEFAULT_REQUESTS})")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"število sočasnih povezav (privzeto {DEFAULT_CONCURRENCY})")
+    parser.add_argument("--points", type=int, default=DEFAULT_POINTS,
+                        help=f"število točk v zahtevi (privzeto {DEFAULT_POINTS})")
+    parser.add_argument("--format", choices=["json", "csv"], default="json", help="oblika telesa zahtev")
+    parser.add_argument("--from", dest="from_epsg", type=int, default=3912, choices=codes)
+    parser.add_argument("--to", dest="to_epsg", type=int, default=3794, choices=codes)
+    parser.add_argument("--delay", type=float, default=2.0,
+                        help="čas zbiranja zahtev v ms za zagnano storitev (privzeto 2)")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("-o", "--output", help="zapiši rezultate v JSON datoteko")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        results = asyncio.run(load_test(args))
+    except (OSError, RuntimeError) as e:
+        print(f"Napaka: {e}", file=sys.stderr)
+        return 1
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output:
+            json.dump(results, output, indent=2, ensure_ascii=False)
+    return 1 if results["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
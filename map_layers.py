@@ -0,0 +1,92 @@
+"""Sloj točk zemljevida
+
+Namesto enega folium.CircleMarker (in popup-a) na točko se koordinate pošljejo v
+brskalnik kot eno kompaktno polje, označevalci pa se ustvarijo šele tam. Veliki
+nabori se rišejo na skupno platno (L.canvas), ki ne potrebuje grafičnega
+pospeševalnika, manjši pa kot SVG. Popup vsebuje samo ID točke, podrobnosti
+prikaže aplikacija ob kliku.
+
+Polje točk (encode_points) je neodvisno od sloga sloja, zato se ob spremembi
+velikosti označevalcev ali združevanja ne sestavlja znova.
+"""
+import json
+
+import numpy as np
+from folium.elements import JSCSSMixin
+from folium.plugins import MarkerCluster
+from folium.template import Template
+
+# Nad tem številom točk se označevalci rišejo na platno namesto kot SVG
+CANVAS_RENDER_THRESHOLD = 5_000
+# Decimalna mesta za WGS84 koordinate v brskalniku (6 mest je približno 0.1 m)
+COORDINATE_DECIMALS = 6
+
+def encode_points(lat, lon, dataset_codes, dataset_colors, point_ids):
+    """Točke kot kompaktno polje JSON za PointLayer (koordinate, kode nizov, barve nizov in ID-ji)"""
+    return json.dumps({
+        "lat": np.round(np.asarray(lat, dtype="float64"), COORDINATE_DECIMALS).tolist(),
+        "lon": np.round(np.asarray(lon, dtype="float64"), COORDINATE_DECIMALS).tolist(),
+        "dataset": np.asarray(dataset_codes, dtype="int64").tolist(),
+        "ids": list(point_ids),
+        "colors": list(dataset_colors),
+    }, separators=(",", ":"), ensure_ascii=False).replace("</", "<\\/")
+
+class PointLayer(JSCSSMixin):
+    """Vse točke kot en sloj krogov (na platnu ali SVG), opcijsko združenih v gruče
+
+    data je rezultat encode_points; canvas=None izbere platno nad CANVAS_RENDER_THRESHOLD točkami.
+    """
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+        var {{ this.get_name() }} = (function() {
+            var data = {{ this.data }};
+            var renderer = {% if this.canvas %}L.canvas({padding: 0.5}){% else %}L.svg(){% endif %};
+            var layer = {% if this.cluster %}L.markerClusterGroup({chunkedLoading: true}){% else %}L.featureGroup(){% endif %};
+            var markers = new Array(data.lat.length);
+            for (var i = 0; i < data.lat.length; i++) {
+                var color = data.colors[data.dataset[i]];
+                var marker = L.circleMarker([data.lat[i], data.lon[i]], {
+                    renderer: renderer,
+                    radius: {{ this.radius }},
+                    color: color,
+                    fill: true,
+                    fillColor: color,
+                    fillOpacity: 0.7,
+                    weight: 2
+                });
+                marker.pointIndex = i;
+                marker.bindPopup("", {maxWidth: 300});
+                // Vsebina popup-a (samo ID točke) se ustvari šele ob kliku, pred odzivom st_folium
+                marker.on("click", function() {
+                    var content = document.createElement("div");
+                    var title = document.createElement("b");
+                    title.textContent = "ID: " + data.ids[this.pointIndex];
+                    content.appendChild(title);
+                    this.setPopupContent(content);
+                });
+                markers[i] = marker;
+            }
+            {% if this.cluster %}
+            layer.addLayers(markers);
+            {% else %}
+            for (var j = 0; j < markers.length; j++) {
+                layer.addLayer(markers[j]);
+            }
+            {% endif %}
+            layer.addTo({{ this._parent.get_name() }});
+            return layer;
+        })();
+        {% endmacro %}
+    """)
+
+    def __init__(self, data, n_points, radius=8, cluster=False, canvas=None):
+        super().__init__()
+        self._name = "PointLayer"
+        self.data = data
+        self.radius = int(radius)
+        self.cluster = cluster
+        self.canvas = n_points > CANVAS_RENDER_THRESHOLD if canvas is None else canvas
+        if cluster:
+            self.default_js = MarkerCluster.default_js
+            self.default_css = MarkerCluster.default_css
@@ -0,0 +1,183 @@
+"""Stolpčna shramba točk za zemljevid, iskanje, izbiro in izvoz
+
+Namesto slovarja (in več Python objektov) na točko so koordinate shranjene v
+zveznih poljih float64, niz v polju kod, atributi pa v tipu iz mapiranja stolpcev:
+številke in datumi kot float64 in datetime64, besedilo kot kategorični stolpci
+(vsaka različna vrednost je shranjena enkrat); shramba iz delovnega prostora ima
+atribute kot stolpce besedila, preslikane iz datoteke (glej workspace). ID točke se
+sestavi iz predpone niza in row_id šele, ko je potreben.
+"""
+import numpy as np
+import pandas as pd
+
+# Stolpci pretvorbe, ki niso atributi točke
+COORDINATE_COLUMNS = ['converted_x', 'converted_y', 'source_x', 'source_y']
+
+def is_typed_column(values):
+    """Ali je stolpec atributov številski ali datumski (in ne besedilo)"""
+    return pd.api.types.is_numeric_dtype(values.dtype) or pd.api.types.is_datetime64_any_dtype(values.dtype)
+
+def display_value(value):
+    """Vrednost atributa za prikaz - cela števila brez decimalk, datumi brez ure ob polnoči"""
+    if isinstance(value, pd.Timestamp):
+        return value.date() if value == value.normalize() else value.to_pydatetime()
+    if isinstance(value, (float, np.floating)) and float(value).is_integer():
+        return int(value)
+    return value.item() if isinstance(value, np.generic) else value
+
+def column_kind(values):
+    """Vrsta stolpca atributov pri združevanju nizov - številke, datumi (s časovnim pasom) ali besedilo"""
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return 'number'
+    if pd.api.types.is_datetime64_any_dtype(values.dtype):
+        return str(values.dtype)
+    return 'text'
+
+def text_column(values):
+    """Stolpec kot besedilo (prazne vrednosti ostanejo prazne) - vrednosti se oblikujejo kot pri prikazu"""
+    codes, uniques = pd.factorize(values)
+    texts = np.array([str(display_value(value)) for value in uniques] + [None], dtype=object)
+    return pd.Series(texts[codes], index=values.index, dtype=str)
+
+class PointStore:
+    """Točke vseh nizov - en element na točko v vsakem polju, atributi v kategoričnih stolpcih
+
+    datasets je seznam slovarjev z 'name', 'color', 'prefix', 'source_epsg' (izvorni sistem
+    source_x/source_y) in 'columns' (atributi niza),
+    polje dataset pa za vsako točko vsebuje položaj njenega niza v tem seznamu.
+    """
+
+    def __init__(self, lon, lat, source_x, source_y, dataset, row_id, attributes, datasets):
+        self.lon = np.ascontiguousarray(lon, dtype='float64')
+        self.lat = np.ascontiguousarray(lat, dtype='float64')
+        self.source_x = np.ascontiguousarray(source_x, dtype='float64')
+        self.source_y = np.ascontiguousarray(source_y, dtype='float64')
+        self.dataset = np.ascontiguousarray(dataset, dtype='int16')
+        self.row_id = np.ascontiguousarray(row_id, dtype='int64')
+        self.attributes = attributes
+        self.datasets = datasets
+
+        # Urejeni ključi (niz, row_id) za iskanje točke po ID brez slovarja
+        keys = (self.dataset.astype('int64') << 40) | self.row_id
+        self._id_order = np.argsort(keys, kind='stable')
+        self._id_keys = keys[self._id_order]
+
+    @classmethod
+    def from_frames(cls, frames):
+        """Zgradi shrambo iz pretvorjenih nizov - frames je seznam (name, color, prefix, source_epsg, DataFrame)"""
+        datasets, parts = [], []
+        for name, color, prefix, source_epsg, frame in frames:
+            if frame is None or not len(frame) or 'converted_x' not in frame.columns:
+                continue
+            columns = [col for col in frame.columns if col not in COORDINATE_COLUMNS and col != 'row_id']
+            datasets.append({'name': name, 'color': color, 'prefix': prefix, 'source_epsg': source_epsg,
+                             'columns': columns})
+            parts.append(frame)
+
+        lengths = [len(frame) for frame in parts]
+        all_columns = list(dict.fromkeys(col for dataset in datasets for col in dataset['columns']))
+        attributes = {}
+        for col in all_columns:
+            present = [frame[col] for frame in parts if col in frame.columns]
+            dtype = present[0].dtype
+            # Stolpec, ki je v enem nizu številski, v drugem pa datumski ali besedilo, se v vseh
+            # nizih pretvori v besedilo - pandas bi sicer sestavil mešan stolpec tipa object
+            if len({column_kind(part) for part in present}) > 1:
+                dtype = str
+            # Niz brez stolpca prispeva manjkajoče vrednosti
+            values = pd.concat([
+                (text_column(frame[col]) if dtype is str else frame[col]) if col in frame.columns
+                else pd.Series(index=pd.RangeIndex(length), dtype=dtype)
+                for frame, length in zip(parts, lengths)
+            ], ignore_index=True)
+            # Številke in datumi ostanejo v svojem tipu, besedilo (in mešani tipi) je kategorično
+            if not is_typed_column(values):
+                values = values.astype('category')
+            attributes[col] = values
+
+        def column(name, dtype='float64'):
+            if not parts:
+                return np.empty(0, dtype=dtype)
+            return np.concatenate([frame[name].to_numpy(dtype=dtype) for frame in parts])
+
+        if all('row_id' in frame.columns for frame in parts):
+            row_id = column('row_id', 'int64')
+        else:
+            row_id = np.concatenate([np.arange(length, dtype='int64') for length in lengths])
+
+        return cls(
+            lon=column('converted_x'),
+            lat=column('converted_y'),
+            source_x=column('source_x'),
+            source_y=column('source_y'),
+            dataset=np.repeat(np.arange(len(parts), dtype='int16'), lengths),
+            row_id=row_id,
+            attributes=pd.DataFrame(attributes, index=pd.RangeIndex(int(sum(lengths)))),
+            datasets=datasets,
+        )
+
+    def __len__(self):
+        return len(self.lon)
+
+    @property
+    def nbytes(self):
+        arrays = (self.lon, self.lat, self.source_x, self.source_y, self.dataset, self.row_id,
+                  self._id_order, self._id_keys)
+        return sum(array.nbytes for array in arrays) + int(self.attributes.memory_usage(deep=True).sum())
+
+    def dataset_names(self, indices=None):
+        """Imena nizov za točke (vse ali na danih položajih)"""
+        codes = self.dataset if indices is None else self.dataset[indices]
+        names = pd.Categorical.from_codes(codes, categories=[dataset['name'] for dataset in self.datasets])
+        return pd.Series(names).astype(str)
+
+    def point_ids(self, indices=None):
+        """ID-ji točk (predpona niza + row_id) za vse točke ali točke na danih položajih"""
+        codes = self.dataset if indices is None else self.dataset[indices]
+        row_id = self.row_id if indices is None else self.row_id[indices]
+        prefixes = pd.Categorical.from_codes(codes, categories=[dataset['prefix'] for dataset in self.datasets])
+        return pd.Series(prefixes).astype(str).str.cat(pd.Series(row_id).astype(str))
+
+    def labels(self):
+        """Oznake točk za iskanje in izbiro, npr. 'P1-12 (Prvi niz)'"""
+        return self.point_ids().str.cat(" (" + self.dataset_names() + ")")
+
+    def index_of(self, point_id):
+        """Položaj točke z danim ID ali None, če je ni"""
+        for code, dataset in enumerate(self.datasets):
+            if point_id.startswith(dataset['prefix']):
+                try:
+                    row_id = int(point_id[len(dataset['prefix']):])
+                except ValueError:
+                    continue
+                key = (code << 40) | row_id
+                position = int(np.searchsorted(self._id_keys, key))
+                if position < len(self._id_keys) and self._id_keys[position] == key:
+                    return int(self._id_order[position])
+        return None
+
+    def attributes_of(self, index):
+        """Neprazni atributi točke (vključno z row_id) kot slovar stolpec -> vrednost za prikaz"""
+        dataset = self.datasets[self.dataset[index]]
+        values = {'row_id': int(self.row_id[index])}
+        for col in dataset['columns']:
+            value = self.attributes[col].iat[index]
+            if not pd.isna(value):
+                values[col] = display_value(value)
+        return values
+
+    def to_frame(self, indices):
+        """Tabela točk na danih položajih za prikaz in izvoz (ID, niz, WGS84 in atributi)"""
+        indices = np.asarray(indices, dtype=np.int64)
+        frame = pd.DataFrame({
+            'ID': self.point_ids(indices).to_numpy(),
+            'Dataset': self.dataset_names(indices).to_numpy(),
+            'Lat': self.lat[indices],
+            'Lon': self.lon[indices],
+            'row_id': self.row_id[indices],
+        })
+        attributes = self.attributes.iloc[indices].reset_index(drop=True)
+        attributes = attributes.loc[:, attributes.notna().any()]
+        # Atribut z enakim imenom kot stolpec točke (npr. ID) dobi pripono
+        attributes.columns = [f"{col} (atribut)" if col in frame.columns else col for col in attributes.columns]
+        return pd.concat([frame, attributes.astype(object)], axis=1)
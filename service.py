@@ -0,0 +1,352 @@
+"""Lokalna storitev HTTP za pretvorbo koordinat D48/D96/WGS84
+
+Uporablja iste definicije epsgs, isto zamenjavo osi za Gauss (3912) in iste
+predpomnjene transformerje kot aplikacija in ukazna vrstica. Zahteve se obdelujejo
+asinhrono (asyncio, brez dodatnih knjižnic), sočasne zahteve z istim parom EPSG
+pa se združijo v eno vektorizirano pretvorbo (ConversionBatcher).
+
+Zahteve:
+    POST /convert?from=3912&to=3794   pretvorba (telo JSON ali CSV)
+    GET  /epsg                        podprti sistemi in oznake koordinat
+    GET  /health                      stanje in števci združenih pretvorb
+
+Telo JSON je {"from": 3912, "to": 3794, "points": [[x, y], ...]} ali
+{"from": ..., "to": ..., "x": [...], "y": [...]}, kjer je x vzhod oz. dolžina
+(za Gauss GKY) in y sever oz. širina (za Gauss GKX). Odgovor ima enako obliko
+in oznake ciljnih koordinat; neveljavne točke so null. Drugo telo se obravnava kot
+besedilo s stolpci (CSV/TXT) kot pri cli.py: imena koordinatnih stolpcev lahko
+podate s parametroma x_col in y_col, odgovor pa ima dodana pretvorjena stolpca.
+
+Primer:
+    python service.py --port 8512
+    curl -s localhost:8512/convert -d '{"from": 3912, "to": 3794, "points": [[448521, 42259]]}'
+"""
+import argparse
+import asyncio
+import functools
+import io
+import json
+import math
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from cli import default_coordinate_columns, output_columns
+from conversion import (
+    epsgs,
+    coordinate_labels,
+    load_triangle_model,
+    parse_data_with_headers,
+    parse_number_array,
+    sniff_delimiter,
+    transform_coordinates,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8512
+# Čas (s), v katerem se zbirajo sočasne zahteve za skupno pretvorbo
+COALESCE_DELAY = 0.002
+# Največja velikost telesa zahteve
+MAX_BODY_BYTES = 64 * 2**20
+EPSG_CODES = sorted(definition["code"] for definition in epsgs.values())
+
+class RequestError(Exception):
+    """Napaka v zahtevi - odjemalcu se vrne s statusom HTTP in sporočilom"""
+
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+class ConversionBatcher:
+    """Združuje sočasne zahteve z istim parom EPSG v en klic transform_coordinates
+
+    Zahteve, ki prispejo v času COALESCE_DELAY ali med tekočo pretvorbo, se pretvorijo
+    skupaj, zato pri večji obremenitvi rastejo paketi in ne število klicev. Pretvorbe
+    tečejo v eni niti, da zanka dogodkov medtem sprejema nove zahteve.
+    """
+
+    def __init__(self, model=None, delay=COALESCE_DELAY):
+        self.model = model
+        self.delay = delay
+        self.stats = {"requests": 0, "batches": 0, "points": 0, "largest_batch": 0}
+        self._pending = {}
+        self._wakeup = None
+        self._worker = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pretvorba")
+
+    async def convert(self, x_vals, y_vals, from_epsg, to_epsg):
+        """Pretvori polji kot transform_coordinates - počaka na skupno pretvorbo čakajočih zahtev"""
+        if not len(x_vals):
+            return np.empty(0), np.empty(0)
+        if self._worker is None:
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.ensure_future(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._pending.setdefault((from_epsg, to_epsg), []).append((
+            np.asarray(x_vals, dtype='float64'), np.asarray(y_vals, dtype='float64'), future
+        ))
+        self._wakeup.set()
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            await asyncio.sleep(self.delay)
+            while self._pending:
+                (from_epsg, to_epsg), items = self._pending.popitem()
+                x_vals = np.concatenate([x for x, _, _ in items])
+                y_vals = np.concatenate([y for _, y, _ in items])
+                try:
+                    converted_x, converted_y = await loop.run_in_executor(self._executor, functools.partial(
+                        transform_coordinates, x_vals, y_vals, from_epsg, to_epsg, model=self.model
+                    ))
+                except Exception as e:
+                    for _, _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+
+                self.stats["requests"] += len(items)
+                self.stats["batches"] += 1
+                self.stats["points"] += len(x_vals)
+                self.stats["largest_batch"] = max(self.stats["largest_batch"], len(items))
+                offset = 0
+                for x, _, future in items:
+                    end = offset + len(x)
+                    if not future.done():
+                        future.set_result((converted_x[offset:end], converted_y[offset:end]))
+                    offset = end
+
+def _query_epsg(value, name):
+    """EPSG koda iz parametra ali telesa zahteve"""
+    try:
+        code = int(value)
+    except (TypeError, ValueError):
+        raise RequestError(f"Manjka ali ni veljaven parameter '{name}' (EPSG koda: {EPSG_CODES})") from None
+    if code not in EPSG_CODES:
+        raise RequestError(f"Nepodprta EPSG koda {code} (podprte: {EPSG_CODES})")
+    return code
+
+def _json_values(values):
+    """Pretvorjene vrednosti za JSON - neveljavne (NaN, neskončne) so null"""
+    return [value if math.isfinite(value) else None for value in values.tolist()]
+
+class ConversionService:
+    """Obravnava povezav HTTP/1.1 (s keep-alive) in zahtev za pretvorbo"""
+
+    def __init__(self, batcher):
+        self.batcher = batcher
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                parts = request_line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = (len(parts) == 3 and parts[2] == 'HTTP/1.1'
+                              and headers.get('connection', '').lower() != 'close')
+                try:
+                    if len(parts) != 3:
+                        raise RequestError("Neveljavna vrstica zahteve")
+                    if 'chunked' in headers.get('transfer-encoding', '').lower():
+                        raise RequestError("Telo mora imeti Content-Length", HTTPStatus.LENGTH_REQUIRED)
+                    length = int(headers.get('content-length') or 0)
+                    if length > MAX_BODY_BYTES:
+                        raise RequestError(f"Telo je večje od {MAX_BODY_BYTES} bajtov",
+                                           HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+                    body = await reader.readexactly(length) if length else b''
+                    status, content_type, payload, extra_headers = await self.dispatch(parts[0], parts[1], headers, body)
+                except RequestError as e:
+                    status, content_type, payload, extra_headers = (
+                        e.status, 'application/json', json.dumps({'error': str(e)}, ensure_ascii=False), {}
+                    )
+                    # Telo zahteve morda ni prebrano do konca - povezava se zapre
+                    keep_alive = keep_alive and e.status < HTTPStatus.LENGTH_REQUIRED
+                except Exception as e:
+                    # Npr. neveljaven Content-Length ali napaka pri pretvorbi
+                    status = HTTPStatus.BAD_REQUEST if isinstance(e, ValueError) else HTTPStatus.INTERNAL_SERVER_ERROR
+                    status, content_type, payload, extra_headers = (
+                        status, 'application/json', json.dumps({'error': str(e)}, ensure_ascii=False), {}
+                    )
+                    keep_alive = False
+
+                writer.write(self.response(status, content_type, payload, keep_alive, extra_headers))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def response(status, content_type, payload, keep_alive=True, extra_headers=None):
+        """Odgovor HTTP/1.1 kot bajti"""
+        body = payload.encode('utf-8')
+        lines = [
+            f"HTTP/1.1 {status.value} {status.phrase}",
+            f"Content-Type: {content_type}; charset=utf-8",
+            f"Content-Length: {len(body)}",
+            f"Connection: {'keep-alive' if keep_alive else 'close'}",
+            *(f"{name}: {value}" for name, value in (extra_headers or {}).items()),
+        ]
+        return ("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body
+
+    async def dispatch(self, method, target, headers, body):
+        """Izvede zahtevo - vrne (status, vrsta vsebine, besedilo odgovora, dodatne glave)"""
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        if url.path == '/health' and method == 'GET':
+            model = self.batcher.model
+            return HTTPStatus.OK, 'application/json', json.dumps({
+                'status': 'ok',
+                'model': None if model is None else model.source[0],
+                **self.batcher.stats,
+            }), {}
+        if url.path == '/epsg' and method == 'GET':
+            return HTTPStatus.OK, 'application/json', json.dumps([
+                {'code': definition['code'], 'name': name, 'labels': coordinate_labels(definition['code'])}
+                for name, definition in epsgs.items()
+            ], ensure_ascii=False), {}
+        if url.path == '/convert':
+            if method != 'POST':
+                raise RequestError("Pretvorba sprejema samo POST", HTTPStatus.METHOD_NOT_ALLOWED)
+            if 'json' in headers.get('content-type', '') or body.lstrip()[:1] == b'{':
+                return await self.convert_json(query, body)
+            return await self.convert_text(query, body)
+        raise RequestError(f"Neznana pot {url.path}", HTTPStatus.NOT_FOUND)
+
+    async def convert_json(self, query, body):
+        """Pretvorba točk iz telesa JSON (points ali x/y) - vrne vzhod/sever ciljnega sistema"""
+        try:
+            request = json.loads(body)
+        except (UnicodeDecodeError, ValueError):
+            raise RequestError("Telo ni veljaven JSON") from None
+        if not isinstance(request, dict):
+            raise RequestError("Telo JSON mora biti objekt")
+        from_epsg = _query_epsg(request.get('from', query.get('from')), 'from')
+        to_epsg = _query_epsg(request.get('to', query.get('to')), 'to')
+
+        if 'points' in request:
+            points = np.array(request['points'], dtype=object)
+            if points.size and (points.ndim != 2 or points.shape[1] != 2):
+                raise RequestError("points mora biti seznam parov [x, y]")
+            points = points.reshape(-1, 2)
+            x_vals, y_vals = parse_number_array(points[:, 0]), parse_number_array(points[:, 1])
+        elif 'x' in request and 'y' in request:
+            if not isinstance(request['x'], list) or not isinstance(request['y'], list) \
+                    or len(request['x']) != len(request['y']):
+                raise RequestError("x in y morata biti seznama enake dolžine")
+            x_vals, y_vals = parse_number_array(request['x']), parse_number_array(request['y'])
+        else:
+            raise RequestError("Telo mora vsebovati points ali x in y")
+
+        valid = np.isfinite(x_vals) & np.isfinite(y_vals)
+        east, north = np.full(len(x_vals), np.nan), np.full(len(x_vals), np.nan)
+        converted_x, converted_y = await self.batcher.convert(x_vals[valid], y_vals[valid], from_epsg, to_epsg)
+        # Izhod v Gauss (3912) je (sever, vzhod) - odgovor je vedno (vzhod, sever)
+        if to_epsg == 3912 and from_epsg != 3912:
+            converted_x, converted_y = converted_y, converted_x
+        east[valid], north[valid] = converted_x, converted_y
+
+        response = {'from': from_epsg, 'to': to_epsg, 'labels': coordinate_labels(to_epsg)}
+        if 'points' in request:
+            pairs = np.column_stack([east, north]).tolist()
+            for i in np.flatnonzero(~(np.isfinite(east) & np.isfinite(north))):
+                pairs[i] = None
+            response['points'] = pairs
+        else:
+            response['x'], response['y'] = _json_values(east), _json_values(north)
+        return HTTPStatus.OK, 'application/json', json.dumps(response), {}
+
+    async def convert_text(self, query, body):
+        """Pretvorba besedila s stolpci kot pri cli.py - vrne vhodne stolpce in pretvorjena stolpca"""
+        from_epsg = _query_epsg(query.get('from'), 'from')
+        to_epsg = _query_epsg(query.get('to'), 'to')
+        try:
+            text = body.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise RequestError("Besedilo mora biti v UTF-8") from None
+
+        # Branje in zapis večjih besedil ne zadržujeta zanke dogodkov
+        loop = asyncio.get_running_loop()
+        headers, data, bad_rows = await loop.run_in_executor(None, parse_data_with_headers, text)
+        if not headers:
+            raise RequestError("Telo je prazno - prva vrstica morajo biti imena stolpcev")
+        default_x_col, default_y_col = default_coordinate_columns(from_epsg)
+        x_col, y_col = query.get('x_col') or default_x_col, query.get('y_col') or default_y_col
+        missing = [col for col in (x_col, y_col) if col not in headers]
+        if missing:
+            raise RequestError(f"V glavi ni stolpcev: {', '.join(missing)} (na voljo: {', '.join(headers)})")
+
+        x_vals, y_vals = parse_number_array(data[x_col]), parse_number_array(data[y_col])
+        valid = ~(np.isnan(x_vals) | np.isnan(y_vals))
+        converted_x, converted_y = await self.batcher.convert(x_vals[valid], y_vals[valid], from_epsg, to_epsg)
+
+        output = data.loc[valid, headers].copy()
+        converted_x_col, converted_y_col = output_columns(headers, to_epsg)
+        output[converted_x_col] = converted_x
+        output[converted_y_col] = converted_y
+        sep = sniff_delimiter(text.split('\n', 1)[0]) or '\t'
+        buffer = io.StringIO()
+        await loop.run_in_executor(None, functools.partial(
+            output.to_csv, buffer, sep=sep, index=False, lineterminator='\n'
+        ))
+        return HTTPStatus.OK, 'text/csv', buffer.getvalue(), {
+            'X-Bad-Rows': len(bad_rows),
+            'X-Invalid-Coordinates': int((~valid).sum()),
+        }
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, model=None, delay=COALESCE_DELAY):
+    """Zažene storitev in teče do prekinitve"""
+    service = ConversionService(ConversionBatcher(model=model, delay=delay))
+    server = await asyncio.start_server(service.handle_connection, host, port)
+    address = server.sockets[0].getsockname()
+    print(f"Storitev za pretvorbo teče na http://{address[0]}:{address[1]}", file=sys.stderr, flush=True)
+    async with server:
+        await server.serve_forever()
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Lokalna storitev HTTP za pretvorbo koordinat med WGS84 (4326), D48/GK (3912) in D96/TM (3794)."
+    )
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"naslov (privzeto {DEFAULT_HOST}, samo lokalno)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"vrata (privzeto {DEFAULT_PORT})")
+    parser.add_argument("--delay", type=float, default=COALESCE_DELAY * 1000,
+                        help=f"čas zbiranja sočasnih zahtev v ms (privzeto {COALESCE_DELAY * 1000:g})")
+    parser.add_argument("--model",
+                        help="datoteka trikotniškega modela D48/GK -> D96/TM (kot pri cli.py)")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    try:
+        model = load_triangle_model(args.model) if args.model else None
+    except (OSError, ValueError) as e:
+        print(f"Napaka: {e}", file=sys.stderr)
+        return 1
+    try:
+        asyncio.run(serve(args.host, args.port, model=model, delay=args.delay / 1000))
+    except KeyboardInterrupt:
+        pass
+    except OSError as e:
+        print(f"Napaka: {e}", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
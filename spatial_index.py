@@ -0,0 +1,269 @@
+"""Prostorski indeks nad pretvorjenimi točkami za iskanje najbližjih točk in točk v radiju
+
+Točke se indeksirajo v projiciranem sistemu D96/TM (EPSG:3794), zato so razdalje
+in radiji v metrih in enaki v vseh smereh.
+"""
+import numpy as np
+
+from conversion import transform_coordinates
+
+# Projicirani sistem za razdalje v metrih
+INDEX_EPSG = 3794
+# Točke, ki so si bližje od te razdalje (m), štejemo za točke na istem mestu
+STACK_TOLERANCE = 0.01
+# Veljaven obseg pravokotnika v WGS84 (južna, zahodna, severna, vzhodna meja) - spletni zemljevid sega do ±85°
+LONLAT_LIMITS = (-85.0, -180.0, 85.0, 180.0)
+# Število točk na stranici pravokotnika WGS84 pri pretvorbi (stranice so v INDEX_EPSG ukrivljene)
+EDGE_SAMPLES = 16
+
+class GridIndex:
+    """Mrežni prostorski indeks - točke so razvrščene po celicah kvadratne mreže
+
+    Točke z neskončnimi ali manjkajočimi koordinatami ostanejo na svojih položajih (indeksi
+    so vedno položaji v x/y), v mrežo pa se ne uvrstijo, zato jih poizvedbe ne vrnejo.
+    """
+
+    def __init__(self, x, y, cell_size=None):
+        self.x = np.ascontiguousarray(x, dtype='float64')
+        self.y = np.ascontiguousarray(y, dtype='float64')
+        positions = np.flatnonzero(np.isfinite(self.x) & np.isfinite(self.y))
+        n_points = len(positions)
+
+        if n_points:
+            finite_x, finite_y = self.x[positions], self.y[positions]
+            self.min_x, self.max_x = float(finite_x.min()), float(finite_x.max())
+            self.min_y, self.max_y = float(finite_y.min()), float(finite_y.max())
+        else:
+            self.min_x = self.max_x = self.min_y = self.max_y = 0.0
+
+        if cell_size is None:
+            # Približno nekaj točk na celico ob enakomerni razporeditvi
+            area = max((self.max_x - self.min_x) * (self.max_y - self.min_y), 1.0)
+            cell_size = float(np.clip(np.sqrt(area / max(n_points, 1)) * 2, 1.0, 10_000.0))
+        self.cell_size = cell_size
+
+        self.n_cols = int((self.max_x - self.min_x) // cell_size) + 1
+        self.n_rows = int((self.max_y - self.min_y) // cell_size) + 1
+        keys = self._cell_rows(self.y[positions]) * self.n_cols + self._cell_cols(self.x[positions])
+        order = np.argsort(keys, kind='stable')
+        self._order = positions[order]
+        self._keys = keys[order]
+        # Obseg indeksiranih točk v WGS84 (južna, zahodna, severna, vzhodna meja), če je znan
+        self.lonlat_bounds = None
+
+    def __len__(self):
+        return len(self.x)
+
+    @property
+    def nbytes(self):
+        return self.x.nbytes + self.y.nbytes + self._order.nbytes + self._keys.nbytes
+
+    @classmethod
+    def from_lonlat(cls, lon, lat, cell_size=None):
+        """Zgradi indeks iz WGS84 koordinat - točke se pretvorijo v INDEX_EPSG"""
+        x, y = transform_coordinates(lon, lat, 4326, INDEX_EPSG)
+        index = cls(x, y, cell_size)
+        if len(index._order):
+            lon = np.asarray(lon, dtype='float64')[index._order]
+            lat = np.asarray(lat, dtype='float64')[index._order]
+            index.lonlat_bounds = (float(lat.min()), float(lon.min()), float(lat.max()), float(lon.max()))
+        return index
+
+    def _cell_cols(self, x):
+        return np.floor((np.asarray(x) - self.min_x) / self.cell_size).astype(np.int64)
+
+    def _cell_rows(self, y):
+        return np.floor((np.asarray(y) - self.min_y) / self.cell_size).astype(np.int64)
+
+    def _candidates(self, min_x, min_y, max_x, max_y):
+        """Indeksi točk v celicah, ki jih pokriva pravokotnik (min_x, min_y) - (max_x, max_y)"""
+        col_from = max(int(self._cell_cols(min_x)), 0)
+        col_to = min(int(self._cell_cols(max_x)), self.n_cols - 1)
+        row_from = max(int(self._cell_rows(min_y)), 0)
+        row_to = min(int(self._cell_rows(max_y)), self.n_rows - 1)
+        if col_from > col_to or row_from > row_to:
+            return np.empty(0, dtype=np.int64)
+
+        # Celice v isti vrstici mreže imajo zaporedne ključe - en interval na vrstico
+        row_keys = np.arange(row_from, row_to + 1, dtype=np.int64) * self.n_cols
+        starts = np.searchsorted(self._keys, row_keys + col_from, side='left')
+        ends = np.searchsorted(self._keys, row_keys + col_to, side='right')
+        if not (ends > starts).any():
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate([self._order[start:end] for start, end in zip(starts, ends) if end > start])
+
+    def query_radius(self, x, y, radius):
+        """Vse točke v radiju (m) okoli (x, y), razvrščene po razdalji - vrne (indeksi, razdalje)"""
+        if not len(self._order) or not np.isfinite([x, y, radius]).all():
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        candidates = self._candidates(x - radius, y - radius, x + radius, y + radius)
+        distances = np.hypot(self.x[candidates] - x, self.y[candidates] - y)
+        inside = distances <= radius
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        return candidates[order], distances[order]
+
+    def query_bbox(self, min_x, min_y, max_x, max_y):
+        """Indeksi vseh točk v pravokotniku (m), razvrščeni naraščajoče"""
+        if not len(self._order) or not np.isfinite([min_x, min_y, max_x, max_y]).all():
+            return np.empty(0, dtype=np.int64)
+        candidates = self._candidates(min_x, min_y, max_x, max_y)
+        inside = ((self.x[candidates] >= min_x) & (self.x[candidates] <= max_x)
+                  & (self.y[candidates] >= min_y) & (self.y[candidates] <= max_y))
+        return np.sort(candidates[inside])
+
+    def query_polygon(self, polygon_x, polygon_y):
+        """Indeksi vseh točk znotraj mnogokotnika (oglišča v m), razvrščeni naraščajoče
+
+        Kandidati so točke v celicah obsega mnogokotnika, za njih pa se preveri sodo-liho
+        pravilo (število presečišč vodoravnega žarka s stranicami) za vse stranice naenkrat.
+        """
+        polygon_x = np.asarray(polygon_x, dtype='float64')
+        polygon_y = np.asarray(polygon_y, dtype='float64')
+        if not len(self._order) or len(polygon_x) < 3 or not np.isfinite([polygon_x, polygon_y]).all():
+            return np.empty(0, dtype=np.int64)
+        candidates = self.query_bbox(polygon_x.min(), polygon_y.min(), polygon_x.max(), polygon_y.max())
+        x, y = self.x[candidates], self.y[candidates]
+        inside = np.zeros(len(candidates), dtype=bool)
+        for x1, y1, x2, y2 in zip(polygon_x, polygon_y, np.roll(polygon_x, -1), np.roll(polygon_y, -1)):
+            crosses = (y1 > y) != (y2 > y)
+            if y1 != y2:
+                crosses &= x < x1 + (y - y1) * (x2 - x1) / (y2 - y1)
+            inside ^= crosses
+        return candidates[inside]
+
+    def thin(self, indices, cell_size, max_points=None):
+        """Redčenje točk za prikaz - ena točka na celico velikosti cell_size (m)
+
+        Če je točk še vedno več kot max_points, se med njimi enakomerno izbere max_points točk.
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        # Točk brez končnih koordinat ni mogoče prikazati
+        indices = indices[np.isfinite(self.x[indices]) & np.isfinite(self.y[indices])]
+        if len(indices) and cell_size > 0:
+            cols = np.floor((self.x[indices] - self.min_x) / cell_size).astype(np.int64)
+            rows = np.floor((self.y[indices] - self.min_y) / cell_size).astype(np.int64)
+            _, first = np.unique(rows * (cols.max() + 1) + cols, return_index=True)
+            indices = indices[np.sort(first)]
+        if max_points is not None and len(indices) > max_points:
+            indices = indices[np.linspace(0, len(indices) - 1, max_points).astype(np.int64)]
+        return indices
+
+    def nearest(self, x, y, max_distance=None):
+        """Najbližja točka (x, y) - vrne (indeksi vseh točk na tem mestu, razdalja)
+
+        Če ni nobene točke znotraj max_distance (m), vrne prazen seznam indeksov in None.
+        """
+        if not len(self._order) or not np.isfinite([x, y]).all():
+            return np.empty(0, dtype=np.int64), None
+
+        # Največja smiselna razdalja je diagonala obsega točk, povečana za oddaljenost poizvedbe
+        extent = np.hypot(
+            max(self.max_x - self.min_x, abs(x - self.min_x), abs(x - self.max_x)),
+            max(self.max_y - self.min_y, abs(y - self.min_y), abs(y - self.max_y)),
+        )
+        limit = extent if max_distance is None else min(max_distance, extent)
+
+        radius = min(self.cell_size, limit)
+        while True:
+            indices, distances = self.query_radius(x, y, radius)
+            if len(indices):
+                stacked = distances <= distances[0] + STACK_TOLERANCE
+                return indices[stacked], float(distances[0])
+            if radius >= limit:
+                return np.empty(0, dtype=np.int64), None
+            radius = min(radius * 2, limit)
+
+    def nearest_many(self, x, y, max_distance, chunk_size=100_000):
+        """Najbližja točka za vsako od poizvedb (x, y) v enem vektoriziranem prehodu
+
+        Vrne (indeksi, razdalje); poizvedbe brez točke znotraj max_distance (m) dobijo
+        indeks -1 in razdaljo inf. Pri enako oddaljenih točkah se izbere nižji indeks.
+        Poizvedbe se obdelujejo v kosih po chunk_size, da je poraba pomnilnika omejena;
+        najhitreje je, ko je cell_size vsaj 2 * max_distance (preverijo se 4 celice).
+        """
+        x = np.asarray(x, dtype='float64')
+        y = np.asarray(y, dtype='float64')
+        nearest = np.full(len(x), -1, dtype=np.int64)
+        nearest_distance = np.full(len(x), np.inf)
+        # Poizvedbe brez končnih koordinat nimajo najbližje točke
+        finite = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+        if not len(self._order) or not len(finite):
+            return nearest, nearest_distance
+
+        # Celice, ki jih pokriva kvadrat okoli vsake poizvedbe
+        with np.errstate(invalid='ignore'):
+            cols_from, cols_to = self._cell_cols(x - max_distance), self._cell_cols(x + max_distance)
+            rows_from, rows_to = self._cell_rows(y - max_distance), self._cell_rows(y + max_distance)
+        # Poizvedbe, urejene po celici, so za searchsorted precej hitrejše od naključnega vrstnega reda
+        query_order = finite[np.argsort(rows_from[finite] * (self.n_cols + 2) + cols_from[finite], kind='stable')]
+        col_span = int((cols_to[finite] - cols_from[finite]).max())
+        row_span = int((rows_to[finite] - rows_from[finite]).max())
+
+        for start in range(0, len(query_order), chunk_size):
+            chunk = query_order[start:start + chunk_size]
+            query_parts, candidate_parts = [], []
+            for row_offset in range(row_span + 1):
+                for col_offset in range(col_span + 1):
+                    cell_rows, cell_cols = rows_from[chunk] + row_offset, cols_from[chunk] + col_offset
+                    inside = ((cell_rows <= rows_to[chunk]) & (cell_cols <= cols_to[chunk])
+                              & (cell_rows >= 0) & (cell_rows < self.n_rows)
+                              & (cell_cols >= 0) & (cell_cols < self.n_cols))
+                    queries = np.flatnonzero(inside)
+                    keys = cell_rows[inside] * self.n_cols + cell_cols[inside]
+                    starts = np.searchsorted(self._keys, keys, side='left')
+                    counts = np.searchsorted(self._keys, keys, side='right') - starts
+                    # Vse točke celic poizvedb kot eno ploščato polje (poizvedba, kandidat)
+                    positions = (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                                 + np.repeat(starts, counts))
+                    query_parts.append(np.repeat(chunk[queries], counts))
+                    candidate_parts.append(self._order[positions])
+
+            queries, candidates = np.concatenate(query_parts), np.concatenate(candidate_parts)
+            distances = np.hypot(self.x[candidates] - x[queries], self.y[candidates] - y[queries])
+            within = distances <= max_distance
+            queries, candidates, distances = queries[within], candidates[within], distances[within]
+
+            # Za vsako poizvedbo prvi kandidat po razdalji (in indeksu)
+            order = np.lexsort((candidates, distances, queries))
+            first = order[np.r_[True, queries[order][1:] != queries[order][:-1]]] if len(order) else order
+            nearest[queries[first]] = candidates[first]
+            nearest_distance[queries[first]] = distances[first]
+        return nearest, nearest_distance
+
+    def query_radius_lonlat(self, lon, lat, radius):
+        """query_radius za točko v WGS84"""
+        x, y = transform_coordinates([lon], [lat], 4326, INDEX_EPSG)
+        return self.query_radius(float(x[0]), float(y[0]), radius)
+
+    def query_bbox_lonlat(self, south, west, north, east):
+        """query_bbox za pravokotnik v WGS84 - uporabi se pravokotnik, ki v INDEX_EPSG objame vse stranice
+
+        Pravokotnik se omeji na LONLAT_LIMITS in na obseg točk (lonlat_bounds), saj daleč od
+        območja INDEX_EPSG pretvorba ni končna. Če pravokotnik pokrije vse točke, se vrnejo vse.
+        """
+        limits = LONLAT_LIMITS if self.lonlat_bounds is None else self.lonlat_bounds
+        if (self.lonlat_bounds is not None and south <= limits[0] and west <= limits[1]
+                and north >= limits[2] and east >= limits[3]):
+            return np.sort(self._order)
+        south, west = max(south, limits[0], LONLAT_LIMITS[0]), max(west, limits[1], LONLAT_LIMITS[1])
+        north, east = min(north, limits[2], LONLAT_LIMITS[2]), min(east, limits[3], LONLAT_LIMITS[3])
+        if not south <= north or not west <= east:
+            return np.empty(0, dtype=np.int64)
+        lon, lat = np.linspace(west, east, EDGE_SAMPLES), np.linspace(south, north, EDGE_SAMPLES)
+        x, y = transform_coordinates(
+            np.concatenate([lon, lon, np.full(EDGE_SAMPLES, west), np.full(EDGE_SAMPLES, east)]),
+            np.concatenate([np.full(EDGE_SAMPLES, south), np.full(EDGE_SAMPLES, north), lat, lat]),
+            4326, INDEX_EPSG,
+        )
+        return self.query_bbox(float(x.min()), float(y.min()), float(x.max()), float(y.max()))
+
+    def query_polygon_lonlat(self, lon, lat):
+        """query_polygon za mnogokotnik z oglišči v WGS84"""
+        x, y = transform_coordinates(lon, lat, 4326, INDEX_EPSG)
+        return self.query_polygon(x, y)
+
+    def nearest_lonlat(self, lon, lat, max_distance=None):
+        """nearest za točko v WGS84"""
+        x, y = transform_coordinates([lon], [lat], 4326, INDEX_EPSG)
+        return self.nearest(float(x[0]), float(y[0]), max_distance)
@@ -0,0 +1,69 @@
+import io
+
+import numpy as np
+import pytest
+
+import conversion
+from conversion import iter_text_chunks, parse_data_with_headers, transform_coordinates_parallel
+
+TEXT = (
+    'ime;x;y;opis\n'
+    'A;14.5;46.0;"prva\n'
+    'vrstica"\n'
+    'B;14.6;46.1;ok\n'
+    'C;14.7\n'
+    'D;14.8;46.2;"a;b"\n'
+)
+
+
+def test_quoted_field_with_newline():
+    headers, data, bad_rows = parse_data_with_headers(TEXT)
+    assert headers == ['ime', 'x', 'y', 'opis']
+    assert data['ime'].tolist() == ['A', 'B', 'D']
+    assert data['opis'].tolist() == ['prva\nvrstica', 'ok', 'a;b']
+    # row_id je prva vrstica zapisa za glavo, poročilo ima številko vrstice v besedilu
+    assert data['row_id'].tolist() == [1, 3, 5]
+    assert bad_rows == [(5, 'C;14.7')]
+
+
+def test_chunks_do_not_split_quoted_field():
+    chunks = list(iter_text_chunks(io.StringIO(TEXT), chunk_rows=1))
+    data = [chunk for _, chunk, _ in chunks]
+    assert [value for chunk in data for value in chunk['opis']] == ['prva\nvrstica', 'ok', 'a;b']
+    assert [value for chunk in data for value in chunk['row_id']] == [1, 3, 5]
+    assert [row for _, _, bad_rows in chunks for row in bad_rows] == [(5, 'C;14.7')]
+
+
+
+def test_whitespace_inside_quoted_field_is_kept():
+    _, data, bad_rows = parse_data_with_headers('ime;x;y;opis\r\n  A;14.5;46.0;"prva  \r\n   vrstica "  \r\n')
+    assert data['ime'].tolist() == ['A']
+    assert data['opis'].tolist() == ['prva  \n   vrstica ']
+    assert not bad_rows
+
+
+def test_unclosed_quote_is_a_bad_row():
+    text = 'ime;x;y\n"S;14.5;46.0\nB;14.6;46.1\n' + ''.join(f'R{i};14.5;46.0\n' for i in range(40))
+    _, data, bad_rows = parse_data_with_headers(text)
+    assert data['ime'].tolist()[:2] == ['B', 'R0']
+    assert bad_rows == [(2, '"S;14.5;46.0')]
+
+    chunks = list(iter_text_chunks(io.StringIO(text), chunk_rows=3))
+    # Kos se podaljša za največ QUOTED_FIELD_MAX_CHUNKS kosov, ne do konca toka
+    assert max(len(chunk) for _, chunk, _ in chunks) <= 3 * (conversion.QUOTED_FIELD_MAX_CHUNKS + 1)
+    assert sum(len(chunk) for _, chunk, _ in chunks) == 41
+    assert [row for _, _, bad_rows in chunks for row in bad_rows] == [(2, '"S;14.5;46.0')]
+
+def test_process_pool_is_replaced_when_workers_change(monkeypatch):
+    monkeypatch.setattr(conversion, 'PARALLEL_MIN_POINTS', 10)
+    lon, lat = np.linspace(13.5, 16.5, 1000), np.linspace(45.5, 46.8, 1000)
+    expected = conversion.transform_coordinates(lon, lat, 4326, 3794)
+    for workers in (2, 3):
+        converted = transform_coordinates_parallel(lon, lat, 4326, 3794, workers=workers, chunk_points=100)
+        assert np.allclose(converted, expected)
+    pool = conversion.get_process_pool(3)
+    assert conversion.get_process_pool(3) is pool
+    assert conversion.get_process_pool(2) is not pool
+    # Zamenjani bazen je zaprt in ne sprejema novih kosov
+    with pytest.raises(RuntimeError):
+        pool.submit(int)
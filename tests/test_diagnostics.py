@@ -0,0 +1,46 @@
+import tracemalloc
+
+import numpy as np
+
+from diagnostics import Diagnostics
+
+
+def test_tracing_runs_until_last_diagnostics_closes():
+    first, second = Diagnostics(enabled=True), Diagnostics(enabled=True)
+    assert tracemalloc.is_tracing()
+    first.close()
+    assert tracemalloc.is_tracing()
+    with second.stage("convert") as record:
+        values = np.ones(100_000)
+    assert record['memory_bytes'] >= values.nbytes
+    second.close()
+    assert not tracemalloc.is_tracing()
+
+
+def test_tracing_started_elsewhere_is_not_stopped():
+    tracemalloc.start()
+    try:
+        diagnostics = Diagnostics(enabled=True)
+        diagnostics.close()
+        assert tracemalloc.is_tracing()
+    finally:
+        tracemalloc.stop()
+
+
+def test_overlapping_sessions_have_no_memory_measurements():
+    first, second = Diagnostics(enabled=True), Diagnostics(enabled=True)
+    with first.stage("parse") as outer:
+        with second.stage("convert") as other:
+            pass
+        with first.stage("coerce") as inner:
+            pass
+    with second.stage("point_store") as alone:
+        values = np.ones(100_000)
+    first.close()
+    second.close()
+
+    for record in (outer, other):
+        assert record['memory_bytes'] is None and record['shared_memory']
+    assert inner['memory_bytes'] is not None
+    assert alone['peak_bytes'] >= values.nbytes
+    assert np.isnan(first.to_frame()['Vrh (MiB)'].iloc[0])
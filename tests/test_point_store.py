@@ -0,0 +1,42 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from attribute_index import build_column_index
+from export import export_bytes
+from point_store import PointStore
+
+
+def converted(values):
+    """Pretvorjen niz točk v Sloveniji s stolpcem atributov 'oznaka'"""
+    n = len(values)
+    return pd.DataFrame({
+        'row_id': np.arange(n), 'oznaka': values,
+        'converted_x': np.full(n, 14.5), 'converted_y': np.full(n, 46.0),
+        'source_x': np.full(n, 14.5), 'source_y': np.full(n, 46.0),
+    })
+
+
+def test_column_with_different_types_becomes_text():
+    numbers = converted(pd.Series([1.0, np.nan, 2.5]))
+    texts = converted(pd.Series(['a1', None], dtype=str))
+    store = PointStore.from_frames([('A', 'red', 'A', 4326, numbers), ('B', 'blue', 'B', 4326, texts)])
+
+    values = store.attributes['oznaka']
+    assert isinstance(values.dtype, pd.CategoricalDtype)
+    assert all(isinstance(value, str) for value in values.cat.categories)
+    assert values.isna().tolist() == [False, True, False, False, True]
+    assert build_column_index(values).query("je enako", "1").tolist() == [0]
+
+    table = pq.read_table(io.BytesIO(export_bytes("GeoParquet", store, np.arange(len(store)))))
+    assert table.num_rows == 5
+
+
+def test_numeric_columns_stay_numeric():
+    store = PointStore.from_frames([
+        ('A', 'red', 'A', 4326, converted(pd.Series([1, 2]))),
+        ('B', 'blue', 'B', 4326, converted(pd.Series([1.5, np.nan]))),
+    ])
+    assert store.attributes['oznaka'].dtype == 'float64'
@@ -0,0 +1,60 @@
+import numpy as np
+
+from spatial_index import GridIndex
+
+
+def points_with_bad_row():
+    """6000 točk v Sloveniji (WGS84), ena z neveljavno širino"""
+    rng = np.random.default_rng(7)
+    lon = rng.uniform(13.5, 16.5, 6000)
+    lat = rng.uniform(45.5, 46.8, 6000)
+    lat[1234] = 460.0
+    return lon, lat
+
+
+def test_index_skips_non_finite_points():
+    lon, lat = points_with_bad_row()
+    index = GridIndex.from_lonlat(lon, lat)
+    assert len(index) == 6000
+    assert not np.isfinite(index.y[1234])
+
+    indices, distance = index.nearest_lonlat(lon[10], lat[10], max_distance=1)
+    assert indices.tolist() == [10]
+    assert distance < 0.01
+
+    everything = index.query_bbox(index.min_x, index.min_y, index.max_x, index.max_y)
+    assert len(everything) == 5999
+    assert 1234 not in everything
+    assert 1234 not in index.thin(np.arange(6000), cell_size=1.0)
+
+
+def test_index_with_nan_coordinates_and_queries():
+    x = np.array([0.0, np.nan, 10.0, np.inf])
+    y = np.array([0.0, 5.0, 10.0, 1.0])
+    index = GridIndex(x, y)
+    assert index.query_radius(0.0, 0.0, 20.0)[0].tolist() == [0, 2]
+
+    nearest, distances = index.nearest_many(np.array([1.0, np.nan, 9.0]), np.array([0.0, 0.0, 10.0]), 5.0)
+    assert nearest.tolist() == [0, -1, 2]
+    assert np.isinf(distances[1])
+
+
+def test_index_without_finite_points():
+    index = GridIndex(np.array([np.nan]), np.array([np.inf]))
+    assert index.nearest(0.0, 0.0)[0].size == 0
+    assert index.query_polygon([0, 1, 1], [0, 0, 1]).size == 0
+
+
+def test_zoomed_out_viewport():
+    lon, lat = points_with_bad_row()
+    index = GridIndex.from_lonlat(lon, lat)
+    # Pogled 30..60N, -10..40E, razširjen na mrežo pogleda (snap_viewport v app.py)
+    everything = index.query_bbox_lonlat(0.0, -64.0, 80.0, 96.0)
+    assert len(everything) == 5999
+    assert 1234 not in everything
+
+    north = index.query_bbox_lonlat(46.0, -64.0, 80.0, 96.0)
+    expected = np.flatnonzero((lat >= 46.0) & (lat <= 80.0))
+    assert np.isin(expected, north).all()
+    assert len(north) < 5999
+    assert index.query_bbox_lonlat(50.0, 0.0, 60.0, 10.0).size == 0
@@ -0,0 +1,166 @@
+"""Trikotniški model transformacije D48/GK -> D96/TM
+
+Model je mreža trikotnikov z znanimi koordinatami oglišč v obeh sistemih. Za vsak
+trikotnik se iz oglišč določi afina transformacija, točka pa se transformira s
+parametri trikotnika, v katerem leži. Mrežni indeks trikotnikov se zgradi enkrat
+ob nalaganju, iskanje trikotnikov in transformacija sta vektorizirana.
+
+Datoteka modela je besedilna; vsaka vrstica opisuje en trikotnik z 12 števili
+(ločenimi s presledki, tabulatorji, podpičji ali vejicami):
+
+    x1 y1 e1 n1 x2 y2 e2 n2 x3 y3 e3 n3
+
+kjer sta x, y koordinati oglišča v izvornem sistemu (za D48/GK: GKY, GKX) in e, n
+koordinati istega oglišča v ciljnem sistemu (za D96/TM: E, N). Prazne vrstice,
+vrstice z # in glava (prva vrstica brez števil) se preskočijo.
+"""
+import re
+
+import numpy as np
+
+# Privzeta sistema modela (vhod brez zamenjave osi: x = GKY, y = GKX)
+MODEL_SOURCE_EPSG = 3912
+MODEL_TARGET_EPSG = 3794
+# Dovoljeno odstopanje baricentričnih koordinat (točke na robu trikotnika)
+BARYCENTRIC_TOLERANCE = 1e-9
+
+_FIELD_SEPARATOR = re.compile(r'[\s;,]+')
+
+class TriangleModel:
+    """Afina transformacija po trikotnikih z mrežnim indeksom za iskanje trikotnika točke"""
+
+    def __init__(self, source_vertices, target_vertices,
+                 source_epsg=MODEL_SOURCE_EPSG, target_epsg=MODEL_TARGET_EPSG, cell_size=None):
+        source_vertices = np.asarray(source_vertices, dtype='float64').reshape(-1, 3, 2)
+        target_vertices = np.asarray(target_vertices, dtype='float64').reshape(-1, 3, 2)
+        if not len(source_vertices) or source_vertices.shape != target_vertices.shape:
+            raise ValueError("Model mora vsebovati vsaj en trikotnik z oglišči v obeh sistemih")
+        self.source_vertices = source_vertices
+        self.target_vertices = target_vertices
+        self.source_epsg = source_epsg
+        self.target_epsg = target_epsg
+        self._inverse = None
+
+        # Lokalno izhodišče za numerično stabilnost (koordinate so reda 10^5 m)
+        self.source_origin = source_vertices.reshape(-1, 2).min(axis=0)
+        self.target_origin = target_vertices.reshape(-1, 2).min(axis=0)
+        local_source = source_vertices - self.source_origin
+        local_target = target_vertices - self.target_origin
+
+        # Vrstice [x y 1] oglišč; inverz da baricentrične koordinate, inverz @ cilj pa afine parametre
+        source_matrix = np.concatenate([local_source, np.ones((len(source_vertices), 3, 1))], axis=2)
+        determinants = np.linalg.det(source_matrix)
+        if (np.abs(determinants) < 1e-9).any():
+            bad = np.flatnonzero(np.abs(determinants) < 1e-9)
+            raise ValueError(f"Izrojeni trikotniki v modelu (zaporedne številke): {(bad + 1).tolist()[:10]}")
+        self._barycentric = np.linalg.inv(source_matrix)
+        self._affine = self._barycentric @ local_target
+
+        # Mrežni indeks: pari (celica, trikotnik) za vse celice, ki jih pokriva okvir trikotnika
+        low = local_source.min(axis=1)
+        high = local_source.max(axis=1)
+        if cell_size is None:
+            cell_size = float(np.median((high - low).max(axis=1))) or 1.0
+        self.cell_size = cell_size
+        self.n_cols = int(high[:, 0].max() // cell_size) + 1
+        col_from, col_to = (low[:, 0] // cell_size).astype(np.int64), (high[:, 0] // cell_size).astype(np.int64)
+        row_from, row_to = (low[:, 1] // cell_size).astype(np.int64), (high[:, 1] // cell_size).astype(np.int64)
+        widths = col_to - col_from + 1
+        counts = widths * (row_to - row_from + 1)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        triangles = np.repeat(np.arange(len(counts)), counts)
+        keys = ((row_from[triangles] + within // widths[triangles]) * self.n_cols
+                + col_from[triangles] + within % widths[triangles])
+        order = np.lexsort((triangles, keys))
+        self._cell_keys = keys[order]
+        self._cell_triangles = triangles[order]
+
+    def __len__(self):
+        return len(self.source_vertices)
+
+    @property
+    def nbytes(self):
+        arrays = (self.source_vertices, self.target_vertices, self._barycentric, self._affine,
+                  self._cell_keys, self._cell_triangles)
+        return sum(array.nbytes for array in arrays)
+
+    @classmethod
+    def from_file(cls, path, **kwargs):
+        """Naloži model iz besedilne datoteke (12 števil na trikotnik, glej opis modula)"""
+        rows = []
+        with open(path, encoding='utf-8-sig') as model_file:
+            for line_no, line in enumerate(model_file, start=1):
+                line = line.strip()
+                if not line or line.startswith('#'):
+                    continue
+                fields = [field for field in _FIELD_SEPARATOR.split(line) if field]
+                try:
+                    values = [float(field) for field in fields]
+                except ValueError:
+                    if not rows:
+                        continue  # glava
+                    raise ValueError(f"Vrstica {line_no} modela ni veljavna: {line[:80]}") from None
+                if len(values) != 12:
+                    raise ValueError(f"Vrstica {line_no} modela ima {len(values)} števil namesto 12")
+                rows.append(values)
+        if not rows:
+            raise ValueError(f"Datoteka {path} ne vsebuje trikotnikov")
+        vertices = np.array(rows).reshape(-1, 3, 4)
+        return cls(vertices[:, :, 0:2], vertices[:, :, 2:4], **kwargs)
+
+    def inverse(self):
+        """Model za obratno smer (ciljni sistem -> izvorni sistem) z istimi trikotniki - zgradi se enkrat"""
+        if self._inverse is None:
+            self._inverse = TriangleModel(self.target_vertices, self.source_vertices,
+                                          source_epsg=self.target_epsg, target_epsg=self.source_epsg)
+            self._inverse._inverse = self
+        return self._inverse
+
+    def locate(self, x, y, chunk_size=200_000):
+        """Indeks trikotnika, v katerem leži vsaka točka, ali -1 za točke zunaj modela"""
+        x = np.asarray(x, dtype='float64') - self.source_origin[0]
+        y = np.asarray(y, dtype='float64') - self.source_origin[1]
+        triangle = np.full(len(x), -1, dtype=np.int64)
+        cols = np.floor(x / self.cell_size)
+        keys = np.floor(y / self.cell_size) * self.n_cols + cols
+        valid = np.isfinite(keys) & (x >= 0) & (y >= 0) & (cols < self.n_cols)
+        keys = np.where(valid, keys, -1).astype(np.int64)
+        # Točke, urejene po celici, so za searchsorted precej hitrejše
+        query_order = np.argsort(keys, kind='stable')
+        for start in range(0, len(x), chunk_size):
+            chunk = query_order[start:start + chunk_size]
+            chunk = chunk[valid[chunk]]
+            starts = np.searchsorted(self._cell_keys, keys[chunk], side='left')
+            counts = np.searchsorted(self._cell_keys, keys[chunk], side='right') - starts
+            positions = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+            queries = np.repeat(chunk, counts)
+            candidates = self._cell_triangles[positions]
+
+            # Baricentrične koordinate [x y 1] @ inverz; točka je v trikotniku, če so vse nenegativne
+            barycentric = np.einsum(
+                'ni,nij->nj',
+                np.column_stack([x[queries], y[queries], np.ones(len(queries))]),
+                self._barycentric[candidates]
+            )
+            inside = (barycentric >= -BARYCENTRIC_TOLERANCE).all(axis=1)
+            queries, candidates = queries[inside], candidates[inside]
+            # Točka na skupnem robu dobi trikotnik z nižjim indeksom
+            order = np.lexsort((candidates, queries))
+            first = order[np.r_[True, queries[order][1:] != queries[order][:-1]]] if len(order) else order
+            triangle[queries[first]] = candidates[first]
+        return triangle
+
+    def transform(self, x, y):
+        """Transformira polji koordinat - vrne (x, y, inside); točke zunaj modela imajo NaN in inside=False"""
+        x = np.asarray(x, dtype='float64')
+        y = np.asarray(y, dtype='float64')
+        triangle = self.locate(x, y)
+        inside = triangle >= 0
+        converted_x = np.full(len(x), np.nan)
+        converted_y = np.full(len(x), np.nan)
+        affine = self._affine[triangle[inside]]
+        local_x = x[inside] - self.source_origin[0]
+        local_y = y[inside] - self.source_origin[1]
+        converted_x[inside] = local_x * affine[:, 0, 0] + local_y * affine[:, 1, 0] + affine[:, 2, 0] + self.target_origin[0]
+        converted_y[inside] = local_x * affine[:, 0, 1] + local_y * affine[:, 1, 1] + affine[:, 2, 1] + self.target_origin[1]
+        return converted_x, converted_y, inside
@@ -0,0 +1,213 @@
+"""Delovni prostor: shranjeni nizi s preslikavo stolpcev in pretvorjenimi koordinatami
+
+Delovni prostor je ena datoteka Arrow IPC (brez stiskanja), zato se ob odpiranju
+preslika v pomnilnik (memory map): stolpci se ne preberejo in ne razčlenijo, ampak
+se podatki strani datoteke naložijo šele, ko jih aplikacija prebere. Vsaka vrstica
+datoteke je ena prebrana vrstica niza (vrstice niza so zaporedne, v izvornem vrstnem
+redu) z vsemi prebranimi stolpci kot besedilom; vrstice, ki so točke na zemljevidu,
+imajo še WGS84 in izvorne koordinate, stolpci s tipom številka ali datum pa še
+pretvorjene vrednosti točk. Nastavitve nizov (ime, koordinatni sistem,
+koordinatna stolpca, tipi in prikaz stolpcev) in aplikacije so v metapodatkih sheme.
+"""
+import json
+import os
+
+import numpy as np
+
+from point_store import PointStore, is_typed_column
+
+WORKSPACE_VERSION = 1
+# Ključ metapodatkov sheme z nastavitvami delovnega prostora
+WORKSPACE_METADATA_KEY = b'koordinator_workspace'
+# Predpona stolpcev s prebranimi podatki (loči jih od stolpcev točk)
+ATTRIBUTE_PREFIX = "atribut:"
+# Predpona stolpcev z vrednostmi atributov točk v tipu stolpca (številka, datum)
+TYPED_PREFIX = "tip:"
+# Nastavitve niza, ki se shranijo v metapodatke
+DATASET_SETTINGS = ['name', 'color', 'prefix', 'coord_system', 'from_epsg', 'x_col', 'y_col',
+                    'headers', 'column_mapping']
+# Koordinate točke v datoteki (imena polj PointStore)
+COORDINATE_FIELDS = ['lon', 'lat', 'source_x', 'source_y']
+
+def save_workspace(path, datasets, point_store, display_columns=None, settings=None):
+    """Shrani nize (slovarje iz vnosa) in njihove točke iz point_store v datoteko Arrow IPC
+
+    Koordinate se vzamejo iz shrambe točk (po predponi niza), zato se ob shranjevanju
+    nič ne pretvarja. Datoteka se zapiše v začasno datoteko in nato zamenja obstoječo.
+    """
+    import pyarrow as pa
+
+    codes = {dataset['prefix']: code for code, dataset in enumerate(point_store.datasets)}
+    all_headers = list(dict.fromkeys(header for dataset in datasets for header in dataset['headers']))
+    point_parts, other_parts, metadata = [], [], []
+    for code, dataset in enumerate(datasets):
+        data = dataset['data']
+        row_id = data['row_id'].to_numpy(dtype='int64')
+        point = np.zeros(len(data), dtype=bool)
+        positions = np.empty(0, dtype=np.int64)
+        if dataset['prefix'] in codes:
+            # Točke niza so v shrambi zaporedne in v enakem vrstnem redu kot vrstice podatkov
+            positions = np.flatnonzero(point_store.dataset == codes[dataset['prefix']])
+            point = np.isin(row_id, point_store.row_id[positions])
+        columns = {
+            'dataset': np.full(len(data), code, dtype='int16'),
+            'row_id': row_id,
+            **{name: np.full(len(data), np.nan) for name in COORDINATE_FIELDS},
+        }
+        for name in COORDINATE_FIELDS:
+            columns[name][point] = getattr(point_store, name)[positions]
+        for header in all_headers:
+            columns[ATTRIBUTE_PREFIX + header] = (
+                pa.nulls(len(data), pa.large_string()) if header not in data.columns
+                else pa.array(data[header], type=pa.large_string(), from_pandas=True)
+            )
+        point_parts.append({name: values[point] if isinstance(values, np.ndarray) else values.filter(point)
+                            for name, values in columns.items()})
+        other_parts.append({name: values[~point] if isinstance(values, np.ndarray) else values.filter(~point)
+                            for name, values in columns.items()})
+        metadata.append({
+            **{key: dataset[key] for key in DATASET_SETTINGS},
+            'display_columns': (display_columns or {}).get(dataset['name'], []),
+            'content_hash': data.attrs.get('content_hash'),
+            'rows': len(data),
+            'points': int(point.sum()),
+        })
+
+    # Najprej točke vseh nizov v vrstnem redu shrambe, nato vrstice brez veljavnih koordinat
+    parts = point_parts + other_parts
+    columns = {}
+    for name in ['dataset', 'row_id', *COORDINATE_FIELDS]:
+        columns[name] = pa.array(np.concatenate([part[name] for part in parts]) if parts else [])
+    for header in all_headers:
+        name = ATTRIBUTE_PREFIX + header
+        chunks = []
+        for part in parts:
+            values = part[name]
+            chunks.extend(values.chunks if isinstance(values, pa.ChunkedArray) else [values])
+        columns[name] = pa.chunked_array(chunks, pa.large_string()).combine_chunks()
+    n_points, n_rows = len(point_store), len(columns['row_id'])
+    for col in point_store.attributes.columns:
+        values = point_store.attributes[col]
+        if is_typed_column(values):
+            # Točke so na začetku datoteke v vrstnem redu shrambe, ostale vrstice so prazne
+            typed = pa.array(values.to_numpy(), from_pandas=True) if n_points else pa.array([], pa.float64())
+            columns[TYPED_PREFIX + col] = pa.concat_arrays([typed, pa.nulls(n_rows - n_points, typed.type)])
+    table = pa.table(columns).replace_schema_metadata({WORKSPACE_METADATA_KEY: json.dumps({
+        'version': WORKSPACE_VERSION,
+        'datasets': metadata,
+        'settings': settings or {},
+    }, ensure_ascii=False).encode('utf-8')})
+
+    # Ena skupina vrstic - vsak stolpec je ob odpiranju en zvezen kos v preslikani datoteki
+    temporary_path = f"{path}.tmp"
+    with pa.OSFile(temporary_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table, max_chunksize=max(len(table), 1))
+    os.replace(temporary_path, path)
+
+def _to_numpy(column):
+    """Stolpec tabele kot polje numpy - pri enem kosu je to pogled v preslikano datoteko"""
+    if column.num_chunks == 1:
+        return column.chunk(0).to_numpy()
+    return column.to_numpy()
+
+class Workspace:
+    """Odprt delovni prostor - tabela je preslikana iz datoteke, podatki nizov se sestavijo brez kopiranja"""
+
+    def __init__(self, path, table, datasets, settings):
+        self.path = path
+        self.table = table
+        self.datasets = datasets
+        self.settings = settings
+        points = np.array([dataset['points'] for dataset in datasets], dtype=np.int64)
+        others = np.array([dataset['rows'] for dataset in datasets], dtype=np.int64) - points
+        self.n_points = int(points.sum())
+        self._point_offsets = np.cumsum(points) - points
+        self._other_offsets = self.n_points + np.cumsum(others) - others
+
+    @classmethod
+    def open(cls, path):
+        """Odpre datoteko delovnega prostora s preslikavo v pomnilnik"""
+        import pyarrow as pa
+
+        table = pa.ipc.open_file(pa.memory_map(path, 'r')).read_all()
+        raw_metadata = (table.schema.metadata or {}).get(WORKSPACE_METADATA_KEY)
+        if raw_metadata is None:
+            raise ValueError(f"Datoteka {path} ni delovni prostor")
+        metadata = json.loads(raw_metadata)
+        if metadata.get('version') != WORKSPACE_VERSION:
+            raise ValueError(f"Nepodprta različica delovnega prostora: {metadata.get('version')}")
+        return cls(path, table, metadata['datasets'], metadata.get('settings', {}))
+
+    def __len__(self):
+        return len(self.datasets)
+
+    @property
+    def nbytes(self):
+        return self.table.nbytes
+
+    def _frame(self, rows, columns, names):
+        """Stolpci vrstic kot DataFrame - številski stolpci in besedilo ostanejo v preslikani datoteki"""
+        frame = rows.select(columns).to_pandas(split_blocks=True)
+        frame.columns = names
+        return frame
+
+    def dataset_frame(self, i):
+        """Prebrani podatki i-tega niza (row_id in stolpci kot besedilo) kot ob vnosu
+
+        Vrstice brez veljavnih koordinat so na koncu, sicer je vrstni red izvorni.
+        """
+        import pyarrow as pa
+
+        dataset = self.datasets[i]
+        rows = self.table.slice(self._point_offsets[i], dataset['points'])
+        if dataset['points'] < dataset['rows']:
+            rows = pa.concat_tables([
+                rows, self.table.slice(self._other_offsets[i], dataset['rows'] - dataset['points'])
+            ])
+        frame = self._frame(rows, ['row_id'] + [ATTRIBUTE_PREFIX + header for header in dataset['headers']],
+                            ['row_id'] + dataset['headers'])
+        frame.attrs['content_hash'] = dataset['content_hash']
+        return frame
+
+    def converted_frame(self, i):
+        """Pretvorjene vrstice i-tega niza v WGS84 kot pri convert_coordinates_from_data"""
+        dataset = self.datasets[i]
+        return self._frame(
+            self.table.slice(self._point_offsets[i], dataset['points']),
+            ['row_id'] + [ATTRIBUTE_PREFIX + header for header in dataset['headers']]
+            + ['source_x', 'source_y', 'lon', 'lat'],
+            ['row_id'] + dataset['headers'] + ['source_x', 'source_y', 'converted_x', 'converted_y']
+        )
+
+    def point_store(self):
+        """Shramba točk vseh nizov z vsaj eno točko - stolpci so pogledi v preslikano datoteko
+
+        Atributi s tipom številka ali datum se vzamejo iz pretvorjenih stolpcev, ostali so besedilo.
+        """
+        points = self.table.slice(0, self.n_points)
+        # Nizi brez točk se v shrambi izpustijo (kot v PointStore.from_frames)
+        kept = [i for i, dataset in enumerate(self.datasets) if dataset['points']]
+        datasets = [{
+            'name': self.datasets[i]['name'],
+            'color': self.datasets[i]['color'],
+            'prefix': self.datasets[i]['prefix'],
+            'source_epsg': self.datasets[i]['from_epsg'],
+            'columns': self.datasets[i]['headers'],
+        } for i in kept]
+        dataset_codes = _to_numpy(points.column('dataset'))
+        if len(kept) < len(self.datasets):
+            dataset_codes = np.searchsorted(kept, dataset_codes).astype('int16')
+        all_columns = list(dict.fromkeys(col for dataset in datasets for col in dataset['columns']))
+        names = set(self.table.column_names)
+        attribute_columns = [TYPED_PREFIX + col if TYPED_PREFIX + col in names else ATTRIBUTE_PREFIX + col
+                             for col in all_columns]
+        return PointStore(
+            lon=_to_numpy(points.column('lon')),
+            lat=_to_numpy(points.column('lat')),
+            source_x=_to_numpy(points.column('source_x')),
+            source_y=_to_numpy(points.column('source_y')),
+            dataset=dataset_codes,
+            row_id=_to_numpy(points.column('row_id')),
+            attributes=self._frame(points, attribute_columns, all_columns),
+            datasets=datasets,
+        )